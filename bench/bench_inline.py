@@ -0,0 +1,52 @@
+"""
+Micro-benchmark for the single-pass inline scanner.
+
+Times `text_to_textnodes` against `text_to_textnodes_reference`, the original
+six-pass pipeline, over paragraphs from the synthetic corpus and over plain
+text without any inline markup. Exits with status 1 if the scanner is slower
+than the reference on either.
+
+Usage: python3 bench/bench_inline.py [--count N] [--seed N]
+"""
+
+import os, sys, random, timeit, argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from corpus import CorpusWriter
+from utils import text_to_textnodes, text_to_textnodes_reference
+
+
+def time_all(function, texts: list):
+    # The best of several runs over every text, in seconds
+    return min(
+        timeit.repeat(lambda: [function(text) for text in texts], number=1, repeat=7)
+    )
+
+
+def report(label: str, texts: list):
+    for text in texts:
+        assert text_to_textnodes(text) == text_to_textnodes_reference(text)
+    before = time_all(text_to_textnodes_reference, texts)
+    after = time_all(text_to_textnodes, texts)
+    print(
+        f"{label:<12} {before * 1e3:>9.1f} ms {after * 1e3:>9.1f} ms"
+        f" {before / after:>7.2f}x"
+    )
+    return after < before
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    writer = CorpusWriter(random.Random(args.seed))
+    paragraphs = [writer.paragraph() for _ in range(args.count)]
+    plain = [writer.words(20, 60) for _ in range(args.count)]
+
+    print(f"{'':<12} {'reference':>12} {'scanner':>12} {'speedup':>8}")
+    faster = [report("paragraphs", paragraphs), report("plain text", plain)]
+    sys.exit(0 if all(faster) else 1)
@@ -0,0 +1,88 @@
+"""
+Measures per-node memory and construction time of the node classes.
+
+Builds a few hundred thousand inline nodes with the __slots__-based
+TextNode and LeafNode and the TextType-keyed converter table, and compares
+them with dict-backed copies of the classes converted through the previous
+TextType(...) enum lookup and match statement.
+
+Usage: python3 bench/bench_nodes.py [COUNT]
+"""
+
+import os, sys, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from textnode import TextNode, TextType
+from utils import text_node_to_html_node
+
+
+class DictTextNode:
+    def __init__(self, text, text_type, url=None):
+        self.text = text
+        self.text_type = text_type.value
+        self.url = url
+
+
+class DictLeafNode:
+    def __init__(self, tag, value, props=None):
+        self.tag = tag
+        self.value = value
+        self.children = None
+        self.props = props
+
+
+def dict_text_node_to_html_node(node):
+    match TextType(node.text_type):
+        case TextType.TEXT:
+            return DictLeafNode(None, node.text)
+        case TextType.BOLD:
+            return DictLeafNode("b", node.text)
+        case TextType.ITALIC:
+            return DictLeafNode("i", node.text)
+        case TextType.CODE:
+            return DictLeafNode("code", node.text)
+        case TextType.LINK:
+            return DictLeafNode("a", node.text, {"href": node.url})
+        case TextType.IMAGE:
+            return DictLeafNode("img", "", {"src": node.url, "alt": node.text})
+
+
+KINDS = [TextType.TEXT, TextType.BOLD, TextType.TEXT, TextType.ITALIC, TextType.CODE]
+
+
+def build(text_node_class, convert, count: int):
+    text_nodes = [
+        text_node_class("some words", KINDS[i % len(KINDS)]) for i in range(count)
+    ]
+    return text_nodes, [convert(node) for node in text_nodes]
+
+
+def measure(label: str, text_node_class, convert, count: int):
+    start = time.perf_counter()
+    build(text_node_class, convert, count)
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    nodes = build(text_node_class, convert, count)
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del nodes
+
+    per_node = (after - before) / count
+    print(f"{label:<12} {seconds / count * 1e9:>8.0f} ns/node {per_node:>8.1f} B/node")
+    return seconds, per_node
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    print(f"{count} TextNodes converted to LeafNodes")
+    dict_time, dict_bytes = measure(
+        "dict", DictTextNode, dict_text_node_to_html_node, count
+    )
+    slots_time, slots_bytes = measure("slots", TextNode, text_node_to_html_node, count)
+    print(
+        f"slots saves {1 - slots_time / dict_time:.0%} time and "
+        f"{1 - slots_bytes / dict_bytes:.0%} memory per node"
+    )
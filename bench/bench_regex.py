@@ -0,0 +1,68 @@
+"""
+Micro-benchmark for the precompiled inline regex registry.
+
+Times the inline parser helpers with their patterns compiled once at import,
+against the previous style of passing raw pattern strings to the `re` module
+functions (which pays for a cache lookup, and for `split_nodes_delimiter` a
+fresh escape and format, on every call).
+
+Usage: python3 bench/bench_regex.py
+"""
+
+import os, sys, re, timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from utils import (
+    delimiter_pattern,
+    IMAGE_ALT_PATTERN,
+    URL_PATTERN,
+    IMAGE_SPLIT_PATTERN,
+)
+
+TEXT = (
+    "Some **bold** words, an ![image](/images/rivendell.png) and "
+    "a [link](https://example.com) in a typical paragraph of text."
+)
+
+
+def split_per_call():
+    escaped = re.escape("**")
+    return re.split(f"(?<![{escaped}]){escaped}(?![{escaped}])", TEXT)
+
+
+def split_precompiled():
+    return delimiter_pattern("**").split(TEXT)
+
+
+def extract_per_call():
+    return re.findall(r"!\[(.*?)\]", TEXT), re.findall(r"\((.*?)\)", TEXT)
+
+
+def extract_precompiled():
+    return IMAGE_ALT_PATTERN.findall(TEXT), URL_PATTERN.findall(TEXT)
+
+
+def split_image_per_call():
+    return re.split(r"!\[(.*?\]\(.*?)\)", TEXT)
+
+
+def split_image_precompiled():
+    return IMAGE_SPLIT_PATTERN.split(TEXT)
+
+
+def report(label: str, per_call, precompiled, number: int = 200000):
+    assert per_call() == precompiled()
+    before = min(timeit.repeat(per_call, number=number, repeat=5)) / number
+    after = min(timeit.repeat(precompiled, number=number, repeat=5)) / number
+    print(
+        f"{label:<24} {before * 1e9:>9.0f} ns {after * 1e9:>9.0f} ns"
+        f" {(before - after) * 1e9:>9.0f} ns saved"
+    )
+
+
+if __name__ == "__main__":
+    print(f"{'':<24} {'per call':>12} {'precompiled':>12}")
+    report("split_nodes_delimiter", split_per_call, split_precompiled)
+    report("extract_markdown_images", extract_per_call, extract_precompiled)
+    report("split_nodes_image", split_image_per_call, split_image_precompiled)
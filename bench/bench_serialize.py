@@ -0,0 +1,83 @@
+"""
+Benchmarks HTMLNode serialization on large generated documents.
+
+Compares the streaming `write_html` serializer behind `to_html` against the
+previous implementation, which concatenated every child's string into its
+parent's. The per-node cost of the streaming serializer should stay flat as
+the documents grow.
+
+Usage: python3 bench/bench_serialize.py
+"""
+
+import os, sys, time, io
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from htmlnode import LeafNode, ParentNode
+
+
+def concat_to_html(node):
+    # The serializer that ParentNode.to_html used to implement
+    if isinstance(node, LeafNode):
+        return node.to_html()
+    rendered = f"<{node.tag}>"
+    for child in node.children:
+        rendered += concat_to_html(child)
+    rendered += f"</{node.tag}>"
+    return rendered
+
+
+def wide_document(blocks: int):
+    # One page of many blocks, each with a handful of inline nodes
+    children = []
+    for i in range(blocks):
+        paragraph = ParentNode(
+            "p",
+            [
+                LeafNode(None, f"Paragraph {i} with some "),
+                LeafNode("b", "bold"),
+                LeafNode(None, " text and a "),
+                LeafNode("a", "link", props={"href": f"/page/{i}"}),
+                LeafNode(None, "." * 40),
+            ],
+        )
+        children.append(ParentNode("div", [paragraph]))
+    return ParentNode("div", children)
+
+
+def deep_document(depth: int):
+    # Nested blocks, each level carrying a little text of its own
+    node = LeafNode(None, "leaf")
+    for i in range(depth):
+        node = ParentNode("div", [LeafNode("p", f"level {i} " + "x" * 40), node])
+    return node
+
+
+def best_of(function, repeat: int = 3):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(label: str, build, sizes):
+    print(f"{label}")
+    print(f"{'size':>10} {'stream (s)':>12} {'us/node':>9} {'concat (s)':>12} {'us/node':>9}")
+    for size in sizes:
+        document = build(size)
+        assert document.to_html() == concat_to_html(document)
+        stream = best_of(lambda: document.write_html(io.StringIO()))
+        concat = best_of(lambda: concat_to_html(document))
+        print(
+            f"{size:>10} {stream:>12.4f} {stream / size * 1e6:>9.2f}"
+            f" {concat:>12.4f} {concat / size * 1e6:>9.2f}"
+        )
+    print()
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(20000)
+    run("Wide documents (blocks)", wide_document, [1000, 10000, 100000])
+    run("Deep documents (levels)", deep_document, [500, 1000, 2000, 4000])
@@ -0,0 +1,69 @@
+"""
+Measures the peak memory of rendering one large page.
+
+Writes a synthetic page of the requested size and renders it with
+generate_page, which holds the whole document, its HTML and the filled
+template, and with generate_page_streaming, which holds one block at a time.
+
+Usage: python3 bench/bench_stream.py [MEGABYTES]
+"""
+
+import os, sys, time, random, tempfile, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+import utils
+from corpus import CorpusWriter, DEFAULT_WEIGHTS
+
+TEMPLATE = "<html><title>{{ Title }}</title><body>{{ Content }}</body></html>"
+
+
+def write_page(path: str, megabytes: float):
+    writer = CorpusWriter(random.Random(0))
+    size = 0
+    with open(path, "w") as f:
+        f.write("# A Very Large Page")
+        while size < megabytes * 1024 * 1024:
+            block = "\n\n" + writer.block(DEFAULT_WEIGHTS)
+            f.write(block)
+            size += len(block)
+
+
+def measure(label: str, render, source: str, template: str, dest: str):
+    tracemalloc.start()
+    start = time.perf_counter()
+    render(source, template, dest)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<10} {seconds:>8.2f} s {peak / 1024 / 1024:>10.1f} MiB peak")
+
+
+def whole(source: str, template: str, dest: str):
+    # generate_page, with streaming switched off
+    threshold = utils.STREAM_THRESHOLD
+    utils.STREAM_THRESHOLD = float("inf")
+    try:
+        utils.generate_page(source, template, dest)
+    finally:
+        utils.STREAM_THRESHOLD = threshold
+
+
+if __name__ == "__main__":
+    megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 20
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "page.md")
+        template = os.path.join(tmp, "template.html")
+        with open(template, "w") as f:
+            f.write(TEMPLATE)
+        write_page(source, megabytes)
+        print(f"{os.path.getsize(source) / 1024 / 1024:.1f} MiB page")
+        measure("whole", whole, source, template, os.path.join(tmp, "a.html"))
+        measure(
+            "streaming",
+            utils.generate_page_streaming,
+            source,
+            template,
+            os.path.join(tmp, "b.html"),
+        )
@@ -0,0 +1,158 @@
+"""
+Seeded generator for synthetic markdown corpora.
+
+The same seed and scale always produce the same files. The corpus mixes
+several page profiles:
+
+- many small pages
+- a few huge pages
+- list-heavy pages
+- link-heavy pages
+- pages in a deep directory tree
+
+Usage: python3 bench/corpus.py DEST [--seed N] [--scale X]
+"""
+
+import os, random, argparse
+
+WORDS = (
+    "the ring of power was forged in the fires of mount doom by sauron who "
+    "sought dominion over all the free peoples of middle earth elves dwarves "
+    "and men alike and hobbits of the shire in their quiet green country"
+).split()
+
+
+class CorpusWriter:
+    def __init__(self, rng: random.Random):
+        self.rng = rng
+
+    def words(self, low: int, high: int):
+        count = self.rng.randint(low, high)
+        return " ".join(self.rng.choice(WORDS) for _ in range(count))
+
+    def inline(self, low: int = 8, high: int = 30):
+        # A line of text with a sprinkling of inline elements
+        parts = []
+        for _ in range(self.rng.randint(2, 5)):
+            parts.append(self.words(low // 4 + 1, high // 4 + 1))
+            kind = self.rng.random()
+            if kind < 0.2:
+                parts.append(f"**{self.words(1, 3)}**")
+            elif kind < 0.4:
+                parts.append(f"*{self.words(1, 3)}*")
+            elif kind < 0.5:
+                parts.append(f"`{self.rng.choice(WORDS)}`")
+            elif kind < 0.6:
+                parts.append(self.link())
+        return " ".join(parts)
+
+    def link(self):
+        target = f"/{self.rng.choice(WORDS)}/{self.rng.randint(1, 999)}"
+        return f"[{self.words(1, 4)}]({target})"
+
+    def image(self):
+        return f"![{self.words(1, 4)}](/images/{self.rng.choice(WORDS)}.png)"
+
+    def paragraph(self):
+        return "\n".join(self.inline() for _ in range(self.rng.randint(1, 4)))
+
+    def unordered_list(self, low: int = 3, high: int = 8):
+        count = self.rng.randint(low, high)
+        return "\n".join(f"- {self.inline(4, 12)}" for _ in range(count))
+
+    def ordered_list(self, low: int = 3, high: int = 8):
+        count = self.rng.randint(low, high)
+        return "\n".join(f"{i}. {self.inline(4, 12)}" for i in range(1, count + 1))
+
+    def quote(self):
+        count = self.rng.randint(1, 4)
+        return "\n".join(f"> {self.words(5, 15)}" for _ in range(count))
+
+    def code(self):
+        lines = [f"    {self.words(2, 6)}" for _ in range(self.rng.randint(2, 10))]
+        return "```\n" + "\n".join(lines) + "\n```"
+
+    def block(self, weights: dict):
+        kinds = list(weights)
+        kind = self.rng.choices(kinds, weights=[weights[k] for k in kinds])[0]
+        if kind == "heading":
+            return f"{'#' * self.rng.randint(2, 6)} {self.words(2, 6)}"
+        elif kind == "links":
+            return " and ".join(self.link() for _ in range(self.rng.randint(3, 10)))
+        elif kind == "image":
+            return self.image()
+        return getattr(self, kind)()
+
+    def page(self, blocks: int, weights: dict):
+        body = [f"# {self.words(2, 6).title()}"]
+        body.extend(self.block(weights) for _ in range(blocks))
+        return "\n\n".join(body)
+
+
+DEFAULT_WEIGHTS = {
+    "heading": 2,
+    "paragraph": 6,
+    "unordered_list": 1,
+    "ordered_list": 1,
+    "quote": 1,
+    "code": 1,
+    "image": 1,
+}
+LIST_WEIGHTS = {"heading": 1, "unordered_list": 5, "ordered_list": 5, "paragraph": 1}
+LINK_WEIGHTS = {"heading": 1, "links": 6, "paragraph": 3}
+
+# name -> (page count, blocks per page, block weights, directory depth)
+PROFILES = {
+    "small": (200, 8, DEFAULT_WEIGHTS, 1),
+    "huge": (3, 3000, DEFAULT_WEIGHTS, 1),
+    "lists": (40, 40, LIST_WEIGHTS, 1),
+    "links": (40, 40, LINK_WEIGHTS, 1),
+    "deep": (60, 10, DEFAULT_WEIGHTS, 8),
+}
+
+
+def generate_corpus(dest: str, seed: int = 0, scale: float = 1.0):
+    """
+    Writes a synthetic content tree.
+
+    Parameters
+    ----------
+    dest : str
+        The directory to write the content tree to.
+    seed : int, optional
+        The random seed. The default is 0.
+    scale : float, optional
+        Multiplies the number of pages of every profile. The default is 1.0.
+
+    Returns
+    -------
+    dict
+        The number of pages and bytes written for each profile.
+    """
+    rng = random.Random(seed)
+    writer = CorpusWriter(rng)
+    stats = {}
+    for name, (count, blocks, weights, depth) in PROFILES.items():
+        pages = max(1, round(count * scale))
+        written = 0
+        for i in range(pages):
+            directory = os.path.join(dest, name)
+            for level in range(rng.randint(1, depth) if depth > 1 else 0):
+                directory = os.path.join(directory, f"level{level}-{rng.randint(0, 2)}")
+            os.makedirs(directory, exist_ok=True)
+            text = writer.page(blocks, weights)
+            with open(os.path.join(directory, f"page{i}.md"), "w") as f:
+                f.write(text)
+            written += len(text.encode())
+        stats[name] = {"pages": pages, "bytes": written}
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("dest")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=1.0)
+    args = parser.parse_args()
+    for name, stats in generate_corpus(args.dest, args.seed, args.scale).items():
+        print(f"{name:<8} {stats['pages']:>6} pages {stats['bytes']:>12} bytes")
@@ -0,0 +1,181 @@
+"""
+Benchmark suite for the markdown pipeline.
+
+`run` generates a seeded synthetic corpus (see corpus.py), times each stage of
+the pipeline over it and saves the results as a JSON baseline. `compare`
+flags every benchmark that got slower than a baseline by more than a
+threshold, and exits with status 1 if there are any.
+
+Usage:
+    python3 bench/run.py run [--output results.json] [--seed N] [--scale X]
+    python3 bench/run.py compare baseline.json results.json [--threshold 0.1]
+"""
+
+import os, sys, json, time, platform, tempfile, argparse, statistics
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+sys.path.insert(0, os.path.dirname(__file__))
+
+from corpus import generate_corpus
+from blocktypes import BlockType
+from utils import (
+    markdown_to_blocks,
+    block_to_blocktype,
+    scan_block,
+    text_to_textnodes,
+    markdown_to_html_node,
+    markdown_to_html,
+    generate_pages_recursive,
+)
+
+LIST_TYPES = (BlockType.UNORDERED_LIST, BlockType.ORDERED_LIST)
+TEMPLATE = "<html><title>{{ Title }}</title><body>{{ Content }}</body></html>"
+
+
+def load_corpus(root: str):
+    documents = []
+    for dirpath, _, filenames in os.walk(root):
+        for filename in sorted(filenames):
+            with open(os.path.join(dirpath, filename)) as f:
+                documents.append(f.read())
+    return documents
+
+
+def measure(function, repeat: int):
+    # Returns every run's wall time in seconds
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def run_suite(seed: int, scale: float, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        content = os.path.join(tmp, "content")
+        template = os.path.join(tmp, "template.html")
+        corpus = generate_corpus(content, seed, scale)
+        with open(template, "w") as f:
+            f.write(TEMPLATE)
+
+        documents = load_corpus(content)
+        blocks = [block for doc in documents for block in markdown_to_blocks(doc)]
+        # Inline parsing runs once per list item and once per other block
+        inline_texts = []
+        for block in blocks:
+            if block_to_blocktype(block) in LIST_TYPES:
+                inline_texts.extend(block.split("\n"))
+            else:
+                inline_texts.append(block)
+
+        benchmarks = {
+            "markdown_to_blocks": lambda: [markdown_to_blocks(d) for d in documents],
+            "block_to_blocktype": lambda: [block_to_blocktype(b) for b in blocks],
+            "scan_block": lambda: [scan_block(b) for b in blocks],
+            "text_to_textnodes": lambda: [text_to_textnodes(t) for t in inline_texts],
+            "markdown_to_html": lambda: [
+                markdown_to_html_node(d).to_html() for d in documents
+            ],
+            "markdown_to_html_direct": lambda: [markdown_to_html(d) for d in documents],
+            "generate_pages_recursive": lambda: generate_pages_recursive(
+                content, template, os.path.join(tmp, "public")
+            ),
+        }
+
+        results = {}
+        for name, function in benchmarks.items():
+            times = measure(function, repeat)
+            results[name] = {
+                "best": min(times),
+                "mean": statistics.mean(times),
+                "runs": len(times),
+            }
+            print(f"{name:<26} best {min(times) * 1000:>9.1f} ms")
+
+    return {
+        "meta": {
+            "seed": seed,
+            "scale": scale,
+            "repeat": repeat,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "corpus": corpus,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float):
+    """
+    Compares the best time of every benchmark against a baseline.
+
+    Returns
+    -------
+    list
+        The names of the benchmarks that regressed by more than the threshold.
+    """
+    regressions = []
+    for name, result in current["results"].items():
+        if name not in baseline["results"]:
+            print(f"{name:<26} (no baseline)")
+            continue
+        before = baseline["results"][name]["best"]
+        change = result["best"] / before - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            regressions.append(name)
+        print(
+            f"{name:<26} {before * 1000:>9.1f} ms -> {result['best'] * 1000:>9.1f} ms"
+            f" {change:>+8.1%}{flag}"
+        )
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the markdown pipeline.")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the suite and save the results")
+    run.add_argument("--output", "-o", default="bench_results.json")
+    run.add_argument("--seed", type=int, default=0)
+    run.add_argument("--scale", type=float, default=1.0)
+    run.add_argument("--repeat", type=int, default=5)
+
+    check = commands.add_parser("compare", help="compare results to a baseline")
+    check.add_argument("baseline")
+    check.add_argument("current")
+    check.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="the slowdown that counts as a regression (default: 0.10)",
+    )
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        results = run_suite(args.seed, args.scale, args.repeat)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved results to {args.output}")
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    if baseline["meta"]["seed"] != current["meta"]["seed"] or (
+        baseline["meta"]["scale"] != current["meta"]["scale"]
+    ):
+        print("Warning: the results were measured on different corpora")
+    regressions = compare(baseline, current, args.threshold)
+    if regressions:
+        print(f"{len(regressions)} regression(s) beyond {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
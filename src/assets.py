@@ -0,0 +1,275 @@
+import os, re, json, struct, hashlib, logging
+from urllib.parse import urlsplit
+from manifest import hash_file
+from sync import copy_file
+from template import Template
+from watch import snapshot
+
+# The number of hex digits of the content hash put into fingerprinted names
+HASH_LENGTH = 8
+# The site paths and fingerprinted URLs of a build, written into the output
+# directory for anything else that links to the assets
+ASSET_MANIFEST_NAME = "asset-manifest.json"
+# URL attributes in template text, which are rewritten like image sources and
+# link targets in pages
+TEMPLATE_URL_PATTERN = re.compile(r'(?P<attr>\b(?:href|src)=")(?P<url>[^"]*)"')
+
+
+def fingerprinted_name(path: str, digest: str):
+    # "images/rivendell.png" becomes "images/rivendell.3fa9c1d2.png"
+    stem, extension = os.path.splitext(path)
+    return f"{stem}.{digest[:HASH_LENGTH]}{extension}"
+
+
+def _jpeg_size(f):
+    # Walk the segments up to the first start-of-frame marker, which holds the
+    # dimensions. DHT, JPG and DAC share the SOF range but are not frames
+    f.seek(2)
+    while True:
+        marker = f.read(2)
+        if len(marker) < 2 or marker[0] != 0xFF:
+            return None
+        # Markers may be padded with any number of 0xFF bytes
+        while marker[1] == 0xFF:
+            marker = marker[1:] + f.read(1)
+            if len(marker) < 2:
+                return None
+        kind = marker[1]
+        if kind in (0xD8, 0x01) or 0xD0 <= kind <= 0xD7:
+            continue
+        header = f.read(2)
+        if len(header) < 2:
+            return None
+        (length,) = struct.unpack(">H", header)
+        if 0xC0 <= kind <= 0xCF and kind not in (0xC4, 0xC8, 0xCC):
+            frame = f.read(5)
+            if len(frame) < 5:
+                return None
+            height, width = struct.unpack(">xHH", frame)
+            return width, height
+        f.seek(length - 2, os.SEEK_CUR)
+
+
+def image_size(path: str):
+    """
+    Reads the width and height of a PNG, JPEG or GIF image from its header,
+    without decoding it.
+
+    Returns
+    -------
+    tuple
+        The width and height in pixels, or None if the file is not one of
+        those formats or its header is truncated.
+    """
+    with open(path, "rb") as f:
+        head = f.read(26)
+        if head.startswith(b"\x89PNG\r\n\x1a\n") and head[12:16] == b"IHDR":
+            return struct.unpack(">II", head[16:24])
+        if head[:6] in (b"GIF87a", b"GIF89a") and len(head) >= 10:
+            return struct.unpack("<HH", head[6:10])
+        if head.startswith(b"\xff\xd8"):
+            return _jpeg_size(f)
+    return None
+
+
+class AssetManifest:
+    def __init__(self, files: dict = None):
+        """
+        Initializes an AssetManifest, which maps the site paths of static
+        assets, such as "/images/rivendell.png", to their content-hashed
+        names, and knows the dimensions of the images among them.
+
+        Parameters
+        ----------
+        files : dict, optional
+            [mtime_ns, size, sha256, width, height] keyed by path relative to
+            the static directory. Width and height are None for files that are
+            not images. The default is None.
+        """
+        self.files = files if files is not None else {}
+        # The site paths whose fingerprinted name changed in this build
+        self.changed = []
+        self.fingerprinted = []
+        self.unchanged = []
+        self.removed = []
+        self._urls = {}
+        self._sizes = {}
+        for path, (_, _, digest, width, height) in self.files.items():
+            site_path = "/" + path.replace(os.sep, "/")
+            name = fingerprinted_name(path, digest)
+            self._urls[site_path] = "/" + name.replace(os.sep, "/")
+            if width is not None:
+                self._sizes[site_path] = (width, height)
+        self._templates = {}
+        # Identifies what the manifest rewrites, for the block cache keys of
+        # pages rendered with it
+        rewrites = json.dumps([self._urls, self._sizes], sort_keys=True)
+        self.digest = hashlib.blake2b(rewrites.encode(), digest_size=16).digest()
+
+    def __repr__(self):
+        return (
+            f"AssetManifest({len(self.files)} files, "
+            f"{len(self.fingerprinted)} fingerprinted, "
+            f"{len(self.unchanged)} unchanged, {len(self.removed)} removed)"
+        )
+
+    def url(self, url: str):
+        """
+        Rewrites a site-absolute URL of a static asset to its fingerprinted
+        name, keeping any query and fragment. Other URLs are returned as they
+        are: relative URLs would need the page they are on to be resolved.
+        """
+        parts = urlsplit(url)
+        if parts.scheme or parts.netloc:
+            return url
+        fingerprinted = self._urls.get(parts.path)
+        if fingerprinted is None:
+            return url
+        return fingerprinted + url[len(parts.path) :]
+
+    def size(self, url: str):
+        # The (width, height) of an image, or None
+        return self._sizes.get(urlsplit(url).path)
+
+    def template(self, template: Template):
+        """
+        Returns a copy of a template with the href and src attributes of its
+        static text rewritten, such as its stylesheet link. The copy is made
+        once per template.
+        """
+        rewritten = self._templates.get(id(template))
+        if rewritten is None or rewritten[0] is not template:
+            copy = template.map_static(self._rewrite_attributes)
+            rewritten = self._templates[id(template)] = (template, copy)
+        return rewritten[1]
+
+    def _rewrite_attributes(self, text: str):
+        return TEMPLATE_URL_PATTERN.sub(
+            lambda m: f'{m.group("attr")}{self.url(m.group("url"))}"', text
+        )
+
+    def references_changed(self, template_path: str):
+        # Whether a template's own URLs point at an asset whose fingerprinted
+        # name changed, which changes every page that uses the template
+        if not self.changed:
+            return False
+        with open(template_path, "r") as f:
+            text = f.read()
+        changed = set(self.changed)
+        return any(
+            urlsplit(m.group("url")).path in changed
+            for m in TEMPLATE_URL_PATTERN.finditer(text)
+        )
+
+    def to_json(self):
+        # The public form of the manifest: fingerprinted URLs by site path
+        return json.dumps(self._urls, indent=2, sort_keys=True)
+
+
+def scan_assets(static: str, previous: dict = None):
+    """
+    Hashes the static assets and reads the dimensions of the images among
+    them, without writing anything, reusing the results of a previous run for
+    files whose mtime and size are unchanged.
+
+    Returns
+    -------
+    AssetManifest
+        The fingerprinted URLs the assets have, or will have once
+        `fingerprint_assets` writes them.
+    """
+    previous = previous or {}
+    files = {}
+    for path, (mtime_ns, size) in snapshot(static).items():
+        relative = os.path.relpath(path, static)
+        last = previous.get(relative)
+        if last is not None and last[:2] == [mtime_ns, size]:
+            files[relative] = last
+            continue
+        try:
+            dimensions = image_size(path)
+        except OSError:
+            dimensions = None
+        width, height = dimensions if dimensions is not None else (None, None)
+        files[relative] = [mtime_ns, size, hash_file(path), width, height]
+    return AssetManifest(files)
+
+
+def fingerprint_assets(
+    static: str, output: str, previous: dict = None, link: bool = True
+):
+    """
+    Gives every static asset a content-hashed name in the output directory,
+    next to the copy under its own name that `sync_tree` made, and writes
+    ASSET_MANIFEST_NAME into the output directory.
+
+    Hashes and image dimensions are only computed again for files whose mtime
+    or size changed since the previous run, and fingerprinted names that no
+    longer belong to an asset are removed.
+
+    Parameters
+    ----------
+    static : str
+        The static asset directory.
+    output : str
+        The output directory, already synced with the static directory.
+    previous : dict, optional
+        The `files` of the previous run. The default is None.
+    link : bool, optional
+        Hardlink the fingerprinted names to the synced copies instead of
+        copying them. The default is True.
+
+    Returns
+    -------
+    AssetManifest
+        The manifest of this run.
+    """
+    previous = previous or {}
+    manifest = scan_assets(static, previous)
+    files = manifest.files
+    for relative, entry in sorted(files.items()):
+        name = fingerprinted_name(relative, entry[2])
+        target = os.path.join(output, name)
+        last = previous.get(relative)
+        if last is not None and fingerprinted_name(relative, last[2]) == name:
+            if os.path.exists(target):
+                manifest.unchanged.append(name)
+                continue
+        else:
+            manifest.changed.append("/" + relative.replace(os.sep, "/"))
+        copy_file(os.path.join(output, relative), target, link)
+        manifest.fingerprinted.append(name)
+
+    for relative in sorted(set(previous) - set(files)):
+        manifest.changed.append("/" + relative.replace(os.sep, "/"))
+    manifest.removed = remove_fingerprints(output, previous, files)
+
+    with open(os.path.join(output, ASSET_MANIFEST_NAME), "w") as f:
+        f.write(manifest.to_json())
+    return manifest
+
+
+def remove_fingerprints(output: str, previous: dict, keep: dict = None):
+    """
+    Removes the fingerprinted names of a previous `fingerprint_assets` run
+    from the output directory, other than those that are still current in
+    `keep`.
+
+    Returns
+    -------
+    list
+        The removed names, relative to the output directory.
+    """
+    keep = keep or {}
+    removed = []
+    for relative, entry in sorted(previous.items()):
+        name = fingerprinted_name(relative, entry[2])
+        current = keep.get(relative)
+        if current is not None and fingerprinted_name(relative, current[2]) == name:
+            continue
+        target = os.path.join(output, name)
+        if os.path.exists(target):
+            logging.info(f"Removing stale fingerprinted asset '{target}'")
+            os.remove(target)
+            removed.append(name)
+    return removed
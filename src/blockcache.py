@@ -0,0 +1,121 @@
+import hashlib, sys, threading
+from collections import OrderedDict
+
+
+class BlockCache:
+    def __init__(self, max_entries: int = 65536, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Initializes a BlockCache, a bounded LRU cache of rendered block HTML
+        shared across pages. It is safe to use from several threads.
+
+        Parameters
+        ----------
+        max_entries : int, optional
+            The most blocks to keep. The default is 65536.
+        max_bytes : int, optional
+            The most memory, in bytes, that the cached HTML may use. The
+            default is 64 MiB.
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(block: str, salt: bytes = b""):
+        # Key by a digest of the block text, so the cache never holds on to the
+        # (possibly large) markdown itself. A salt, such as the digest of the
+        # AssetManifest the block is rendered with, keeps blocks rendered with
+        # different settings apart
+        return hashlib.blake2b(block.encode(), digest_size=16, key=salt).digest()
+
+    def get(self, key: bytes):
+        """
+        Looks up the HTML of a block, counting a hit or a miss.
+
+        Returns
+        -------
+        str
+            The cached HTML, or None if the block is not cached.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: bytes, html: str, size: int = None):
+        """
+        Caches the HTML of a block, evicting the least recently used entries
+        beyond the limits.
+
+        Parameters
+        ----------
+        key : bytes
+            The key from `key`, or any other hashable key.
+        html : str
+            The value to cache. Values other than strings, such as the pages
+            cached by the content server, should come with their size.
+        size : int, optional
+            The memory the value takes up, in bytes. The default is its
+            `sys.getsizeof`.
+        """
+        if size is None:
+            size = sys.getsizeof(html)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= previous[1]
+            self._entries[key] = (html, size)
+            self._bytes += size
+            while (
+                len(self._entries) > self.max_entries or self._bytes > self.max_bytes
+            ):
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """
+        Returns
+        -------
+        dict
+            The cache's size, limits and hit/miss counters.
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+    def __getstate__(self):
+        # Locks cannot be pickled, so worker processes get an empty cache with the
+        # same limits
+        return {"max_entries": self.max_entries, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state):
+        self.__init__(state["max_entries"], state["max_bytes"])
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,203 @@
+import os, gzip, logging
+from concurrent.futures import ThreadPoolExecutor
+from output import write_bytes_if_changed
+from watch import snapshot
+
+# Outputs of these types are worth precompressing. Images and fonts are
+# compressed already
+COMPRESSIBLE_EXTENSIONS = {
+    ".html",
+    ".css",
+    ".js",
+    ".mjs",
+    ".json",
+    ".svg",
+    ".xml",
+    ".txt",
+    ".map",
+}
+# Files smaller than this fit in a packet or two anyway
+MIN_SIZE = 1024
+# A .gz sibling is only kept if it is at most this fraction of the original
+MAX_RATIO = 0.9
+
+
+class CompressResult:
+    def __init__(self):
+        """
+        Initializes a CompressResult object, which records what compress_tree
+        did.
+        """
+        # Every compressible file examined, as paths relative to the root,
+        # mapped to [mtime_ns, size, whether it has a .gz sibling]
+        self.files = {}
+        self.compressed = []
+        self.unchanged = []
+        self.skipped = []
+        self.removed = []
+
+    def __repr__(self):
+        return (
+            f"CompressResult({len(self.files)} files, "
+            f"{len(self.compressed)} compressed, {len(self.unchanged)} unchanged, "
+            f"{len(self.skipped)} skipped, {len(self.removed)} removed)"
+        )
+
+
+def _has_sibling(files: dict, relative: str):
+    # Whether a run recorded in files wrote the .gz sibling of a file
+    last = files.get(relative)
+    return last is not None and last[2]
+
+
+def is_compressible(path: str):
+    return os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+
+
+def compress_file(
+    path: str,
+    level: int = 9,
+    max_ratio: float = MAX_RATIO,
+    remove_sibling: bool = True,
+):
+    """
+    Writes a gzip sibling (path + ".gz") of a file, with the file's mtime, or
+    removes any existing sibling if the file does not compress well enough.
+
+    The gzip header carries no timestamp or name, so the same input always
+    gives the same bytes.
+
+    Parameters
+    ----------
+    path : str
+        The file to compress.
+    level : int, optional
+        The gzip compression level. The default is 9.
+    max_ratio : float, optional
+        The largest compressed-to-original size ratio worth keeping. The
+        default is MAX_RATIO.
+    remove_sibling : bool, optional
+        Remove an existing sibling when the file does not compress well
+        enough. Without it, such a sibling is left alone. The default is True.
+
+    Returns
+    -------
+    bool
+        True if the file has a .gz sibling written by this call afterwards.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    compressed = gzip.compress(data, compresslevel=level, mtime=0)
+    target = path + ".gz"
+    if len(compressed) > len(data) * max_ratio:
+        if remove_sibling and os.path.exists(target):
+            os.remove(target)
+        return False
+    write_bytes_if_changed(target, compressed)
+    stat = os.stat(path)
+    os.utime(target, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return True
+
+
+def compress_tree(
+    root: str,
+    previous: dict = None,
+    jobs: int = 8,
+    min_size: int = MIN_SIZE,
+    max_ratio: float = MAX_RATIO,
+    level: int = 9,
+):
+    """
+    Precompresses the compressible files of an output tree, so that a web
+    server can send the .gz siblings as they are.
+
+    Files whose mtime and size match the previous run are not compressed
+    again. Small files and files that compress poorly get no sibling, and
+    siblings of files that are gone are removed. Only siblings that an
+    earlier run recorded in `previous` are ever removed: other .gz files,
+    such as compressed archives among the static assets, are left alone.
+
+    Parameters
+    ----------
+    root : str
+        The output directory.
+    previous : dict, optional
+        The `files` of the previous run. The default is None.
+    jobs : int, optional
+        The number of threads to compress on. zlib releases the GIL while it
+        works, so they run in parallel. The default is 8.
+    min_size : int, optional
+        Files smaller than this many bytes are skipped. The default is MIN_SIZE.
+    max_ratio : float, optional
+        The largest compressed-to-original size ratio worth keeping. The
+        default is MAX_RATIO.
+    level : int, optional
+        The gzip compression level. The default is 9.
+
+    Returns
+    -------
+    CompressResult
+        What the run did.
+    """
+    previous = previous or {}
+    result = CompressResult()
+    files = snapshot(root)
+    to_compress = []
+    for path, (mtime_ns, size) in sorted(files.items()):
+        relative = os.path.relpath(path, root)
+        if path.endswith(".gz"):
+            if path[:-3] not in files and _has_sibling(previous, relative[:-3]):
+                logging.info(f"Removing '{path}', its original is gone")
+                os.remove(path)
+                result.removed.append(relative)
+            continue
+        if not is_compressible(path):
+            continue
+        last = previous.get(relative)
+        if size < min_size:
+            if path + ".gz" in files and _has_sibling(previous, relative):
+                os.remove(path + ".gz")
+                result.removed.append(relative + ".gz")
+            result.skipped.append(relative)
+            continue
+
+        if last is not None and last[:2] == [mtime_ns, size]:
+            # A sibling that was deleted since is written again
+            if not last[2] or path + ".gz" in files:
+                result.files[relative] = last
+                result.unchanged.append(relative)
+                continue
+        to_compress.append((relative, path, mtime_ns, size))
+
+    def compress(item):
+        relative, path, mtime_ns, size = item
+        remove = _has_sibling(previous, relative)
+        return item, compress_file(path, level, max_ratio, remove)
+
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        for (relative, _, mtime_ns, size), has_sibling in pool.map(
+            compress, to_compress
+        ):
+            result.files[relative] = [mtime_ns, size, has_sibling]
+            (result.compressed if has_sibling else result.skipped).append(relative)
+    return result
+
+
+def remove_siblings(root: str, previous: dict):
+    """
+    Removes the .gz siblings that a previous `compress_tree` run wrote, such
+    as when a build no longer precompresses its outputs.
+
+    Returns
+    -------
+    list
+        The removed siblings, relative to the root.
+    """
+    removed = []
+    for relative, (_, _, has_sibling) in sorted(previous.items()):
+        target = os.path.join(root, relative + ".gz")
+        if has_sibling and os.path.exists(target):
+            logging.info(f"Removing precompressed '{target}'")
+            os.remove(target)
+            removed.append(relative + ".gz")
+    return removed
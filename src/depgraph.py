@@ -0,0 +1,136 @@
+import os
+from urllib.parse import urlsplit, unquote
+
+# A page's dependency edges come from the (url, is_image) pairs of its images
+# and links that render_blocks collects while rendering it, so its markdown is
+# never scanned again for them
+
+
+def _site_path(url: str, source: str, content_root: str):
+    # The path of a URL within the site, or None for external URLs and links
+    # within the page. Relative URLs are relative to the page's own directory
+    parts = urlsplit(url.strip())
+    if parts.scheme or parts.netloc or not parts.path:
+        return None
+    path = unquote(parts.path)
+    if not path.startswith("/"):
+        directory = os.path.relpath(os.path.dirname(source), content_root)
+        path = os.path.join("/", directory, path)
+    path = os.path.normpath(path).lstrip("/")
+    # Paths above the site root don't belong to it
+    if path.startswith(".."):
+        return None
+    return path
+
+
+def _content_candidates(path: str, content_root: str):
+    # The sources that render to a site path: "/a", "/a.html" and "/a/" are
+    # all served by "a.md" or "a/index.md"
+    stem = os.path.splitext(path)[0] if path.endswith(".html") else path
+    if stem in ("", "."):
+        return [os.path.join(content_root, "index.md")]
+    return [
+        os.path.join(content_root, stem + ".md"),
+        os.path.join(content_root, stem, "index.md"),
+    ]
+
+
+def _reference_candidates(
+    url: str, source: str, content_root: str, static_root: str = None, image=False
+):
+    # The files that could be behind a URL, as (path, is_static) pairs in the
+    # order they are looked up: images among the static assets first, links
+    # among the content sources first. External URLs have none
+    path = _site_path(url, source, content_root)
+    if path is None:
+        return []
+    static = []
+    if static_root is not None:
+        static.append((os.path.join(static_root, path), True))
+    content = [(path, False) for path in _content_candidates(path, content_root)]
+    return static + content if image else content + static
+
+
+def resolve_reference(
+    url: str, source: str, content_root: str, static_root: str = None, image=False
+):
+    """
+    Maps an image or link URL of a page to the input file behind it.
+
+    Images are looked up among the static assets first, links among the
+    content sources first.
+
+    Parameters
+    ----------
+    url : str
+        The URL as written in the markdown.
+    source : str
+        The source of the page the URL is on.
+    content_root : str
+        The content directory.
+    static_root : str, optional
+        The static asset directory. The default is None.
+    image : bool, optional
+        Whether the URL is an image source. The default is False.
+
+    Returns
+    -------
+    str
+        The path of the file, or None if the URL is external or no file
+        matches it.
+    """
+    for candidate, _ in _reference_candidates(
+        url, source, content_root, static_root, image
+    ):
+        if os.path.isfile(candidate):
+            return candidate
+    return None
+
+
+def reference_dependencies(
+    references, source: str, content_root: str, static_root: str = None
+):
+    """
+    Lists the files a page's output depends on through its images and links,
+    besides its own source and template.
+
+    A reference depends on the file it resolves to, and on every file looked up
+    before it, which would take its place if created. A reference that doesn't
+    resolve yet depends on all of them, so that creating the file it means
+    rebuilds the page.
+
+    The HTML of a link never depends on the page it points to, only the
+    fingerprinted URL of an asset on the asset's content. So a page depends on
+    the content of static assets, and only on whether content sources exist.
+
+    Parameters
+    ----------
+    references : iterable
+        The (url, is_image) pairs of the page's images and links, such as
+        those `render_blocks` collects while rendering it.
+    source : str
+        The source of the page.
+    content_root : str
+        The content directory.
+    static_root : str, optional
+        The static asset directory. The default is None.
+
+    Returns
+    -------
+    dict
+        Whether the page depends on the content of each file, keyed by the
+        paths of the static assets and content sources it refers to, in sorted
+        order. Files that don't exist are included.
+    """
+    found = {}
+    for url, image in references:
+        for path, static in _reference_candidates(
+            url, source, content_root, static_root, image
+        ):
+            if path == source:
+                break
+            found[path] = static
+            if os.path.isfile(path):
+                break
+    return dict(sorted(found.items()))
+
@@ -0,0 +1,46 @@
+import unittest, os, tempfile
+
+# Shared fixtures for the tests that build trees of files. Kept out of the
+# test_*.py pattern so that test discovery doesn't collect it
+
+
+class TreeTestCase(unittest.TestCase):
+    """
+    A TestCase with a temporary directory, `self.root`, that is removed after
+    each test, and helpers to write and read files under it.
+    """
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = self.tmp.name
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, path: str, text, encoding: str = None):
+        # Write text, or bytes, creating any missing directories. Relative
+        # paths are under the root
+        path = os.path.join(self.root, path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if isinstance(text, bytes):
+            with open(path, "wb") as f:
+                f.write(text)
+        else:
+            with open(path, "w", encoding=encoding) as f:
+                f.write(text)
+        return path
+
+    def read(self, *parts):
+        with open(os.path.join(self.root, *parts)) as f:
+            return f.read()
+
+    @staticmethod
+    def read_tree(root: str):
+        # The bytes of every file under root, keyed by relative path
+        files = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                with open(path, "rb") as f:
+                    files[os.path.relpath(path, root)] = f.read()
+        return files
@@ -1,4 +1,35 @@
+import io, sys
+
+
+class TagTable(dict):
+    """
+    A table of rendered open or close tags, keyed by tag name. Tags missing
+    from the table are rendered once and then kept, with their names interned.
+    """
+
+    def __init__(self, template: str, tags: list):
+        super().__init__()
+        self.template = template
+        for tag in tags:
+            self[tag]
+
+    def __missing__(self, tag: str):
+        tag = sys.intern(tag)
+        rendered = self[tag] = self.template.format(tag)
+        return rendered
+
+
+# The tags the markdown renderer produces
+KNOWN_TAGS = "div p h1 h2 h3 h4 h5 h6 pre blockquote ul ol li b i code a img".split()
+OPEN_TAGS = TagTable("<{}>", KNOWN_TAGS)
+CLOSE_TAGS = TagTable("</{}>", KNOWN_TAGS)
+
+
 class HTMLNode:
+    # Nodes are created by the hundred thousand on large documents, so they
+    # carry no per-instance __dict__
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(
         self, tag: str = None, value: str = None, children=None, props: dict = None
     ):
@@ -37,6 +68,23 @@ class HTMLNode:
         """
         raise NotImplementedError
 
+    def write_html(self, sink):
+        """
+        Writes the HTML of the HTMLNode object to a sink, chunk by chunk, without
+        building the full string in memory.
+
+        Parameters
+        ----------
+        sink : file-like
+            Any object with a `write(str)` method, such as an open text file.
+
+        Raises
+        ------
+        NotImplementedError
+            If not implemented by subclass.
+        """
+        raise NotImplementedError
+
     def props_to_html(self):
         """
         Converts the properties of the HTMLNode object into a string of HTML.
@@ -61,6 +109,8 @@ class HTMLNode:
 
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag: str, value: str, props: dict = None):
         """
         Initializes a LeafNode object.
@@ -97,13 +147,26 @@ class LeafNode(HTMLNode):
             return self.value
 
         if self.props is None:
-            rendered = f"<{self.tag}>{self.value}</{self.tag}>"
+            rendered = OPEN_TAGS[self.tag] + self.value + CLOSE_TAGS[self.tag]
         else:
             rendered = f"<{self.tag}{self.props_to_html()}>{self.value}</{self.tag}>"
         return rendered
 
+    def write_html(self, sink):
+        """
+        Writes the LeafNode's HTML to a sink.
+
+        Parameters
+        ----------
+        sink : file-like
+            Any object with a `write(str)` method.
+        """
+        sink.write(self.to_html())
+
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag: str, children: list, props: dict = None):
         """
         Initializes a ParentNode object.
@@ -133,20 +196,40 @@ class ParentNode(HTMLNode):
         str
             A string representation of the HTML structure.
         """
+        buffer = io.StringIO()
+        self.write_html(buffer)
+        return buffer.getvalue()
+
+    def write_html(self, sink):
+        """
+        Writes the ParentNode and its children to a sink.
+
+        Every chunk is written once, straight to the sink, so the cost grows
+        linearly with the size of the tree no matter how deep or wide it is.
+
+        Parameters
+        ----------
+        sink : file-like
+            Any object with a `write(str)` method.
+
+        Raises
+        ------
+        ValueError
+            If the tag is None or if children are None.
+        """
         if self.tag is None:
             raise ValueError("ParentNode must have a tag.")
         if self.children is None or self.children == []:
             raise ValueError("ParentNode must have children.")
 
         if self.props is None:
-            rendered = f"<{self.tag}>"
+            sink.write(OPEN_TAGS[self.tag])
         else:
-            rendered = f"<{self.tag}{self.props_to_html()}>"
+            sink.write(f"<{self.tag}{self.props_to_html()}>")
 
         for child in self.children:
-            rendered += child.to_html()
-        rendered += f"</{self.tag}>"
-        return rendered
+            child.write_html(sink)
+        sink.write(CLOSE_TAGS[self.tag])
 
     def add_child(self, child: HTMLNode):
         self.children.append(child)
@@ -0,0 +1,159 @@
+import time, json, cProfile, tracemalloc, contextlib
+
+# The stages of rendering a page, in pipeline order. Pages are rendered without
+# an HTMLNode tree, so tree_build and serialize are only recorded by
+# markdown_to_html_node, and title_extraction only for streamed pages
+STAGES = [
+    "read",
+    "block_split",
+    "block_classification",
+    "inline_parse",
+    "tree_build",
+    "title_extraction",
+    "serialize",
+    "template_fill",
+    "minify",
+    "write",
+]
+
+
+class BuildStats:
+    def __init__(self):
+        """
+        Initializes a BuildStats object, which accumulates wall time and counts
+        for each stage of a build.
+
+        The renderers take an optional BuildStats and skip all timing when it is
+        None, so instrumentation costs nothing unless it is switched on.
+        """
+        self.stages = {}
+        self.block_types = {}
+        self.pages = {}
+        self.memory = None
+
+    @staticmethod
+    def start():
+        return time.perf_counter()
+
+    def stop(self, stage: str, start: float, count: int = 1):
+        """
+        Records the time since `start` against a stage.
+
+        Returns
+        -------
+        float
+            The current time, to use as the start of the next stage.
+        """
+        now = time.perf_counter()
+        self.add_stage(stage, now - start, count)
+        return now
+
+    def add_stage(self, stage: str, seconds: float, count: int = 1):
+        # Record time measured elsewhere, such as in a worker thread or process
+        total, calls = self.stages.get(stage, (0.0, 0))
+        self.stages[stage] = (total + seconds, calls + count)
+
+    def add_block(self, block_type: str, seconds: float):
+        total, count = self.block_types.get(block_type, (0.0, 0))
+        self.block_types[block_type] = (total + seconds, count + 1)
+
+    def add_page(self, source: str, seconds: float):
+        self.pages[source] = seconds
+
+    def merge(self, other: "BuildStats"):
+        # Combine the stats gathered by another process or thread into these
+        for stage, (seconds, count) in other.stages.items():
+            total, calls = self.stages.get(stage, (0.0, 0))
+            self.stages[stage] = (total + seconds, calls + count)
+        for block_type, (seconds, count) in other.block_types.items():
+            total, calls = self.block_types.get(block_type, (0.0, 0))
+            self.block_types[block_type] = (total + seconds, calls + count)
+        self.pages.update(other.pages)
+
+    def report(self, slowest: int = 10):
+        """
+        Summarizes the build.
+
+        Parameters
+        ----------
+        slowest : int, optional
+            The number of slowest pages to list. The default is 10.
+
+        Returns
+        -------
+        dict
+            A JSON-serializable report.
+        """
+        ordered = [stage for stage in STAGES if stage in self.stages]
+        ordered += sorted(stage for stage in self.stages if stage not in STAGES)
+        report = {
+            "pages": len(self.pages),
+            "page_seconds": sum(self.pages.values()),
+            "stages": {
+                stage: {"seconds": self.stages[stage][0], "count": self.stages[stage][1]}
+                for stage in ordered
+            },
+            "block_types": {
+                block_type: {
+                    "seconds": seconds,
+                    "count": count,
+                    "mean_seconds": seconds / count,
+                }
+                for block_type, (seconds, count) in sorted(
+                    self.block_types.items(), key=lambda item: -item[1][0]
+                )
+            },
+            "slowest_pages": [
+                {"source": source, "seconds": seconds}
+                for source, seconds in sorted(
+                    self.pages.items(), key=lambda item: -item[1]
+                )[:slowest]
+            ],
+        }
+        if self.memory is not None:
+            report["memory"] = self.memory
+        return report
+
+    def save(self, path: str, slowest: int = 10):
+        with open(path, "w") as f:
+            json.dump(self.report(slowest), f, indent=2)
+
+
+@contextlib.contextmanager
+def capture(stats: BuildStats = None, profile: str = None, trace_memory: bool = False):
+    """
+    Optionally profiles the code run inside the context.
+
+    Parameters
+    ----------
+    stats : BuildStats, optional
+        Receives the tracemalloc results, if any. The default is None.
+    profile : str, optional
+        Write cProfile statistics to this path. The default is None.
+    trace_memory : bool, optional
+        Record the peak traced memory and the top allocation sites with
+        tracemalloc. The default is False.
+    """
+    profiler = cProfile.Profile() if profile else None
+    if trace_memory:
+        tracemalloc.start()
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(profile)
+        if trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            if stats is not None:
+                stats.memory = {
+                    "peak_bytes": peak,
+                    "top_allocations": [
+                        {"site": str(stat.traceback), "bytes": stat.size}
+                        for stat in snapshot.statistics("lineno")[:20]
+                    ],
+                }
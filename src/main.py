@@ -1,67 +1,363 @@
 from textnode import TextType, TextNode
-import os, shutil, logging
-from utils import generate_pages_recursive
+import os, logging, argparse
+from utils import generate_pages_recursive, discover_work
+from utils import PARSER_VERSION
+from manifest import BuildManifest, MANIFEST_PATH
+from sync import sync_tree
+from watch import SiteWatcher, watch
+from instrument import BuildStats, capture
+from blockcache import BlockCache
+from server import ContentSite, serve_content
+from compress import compress_tree, remove_siblings
+from assets import AssetManifest, ASSET_MANIFEST_NAME
+from assets import fingerprint_assets, scan_assets, remove_fingerprints
+from minify import MinifyResult
+from shard import SHARD_DIR, parse_shard, shard_name
+from shard import write_shard_manifest, merge_shards, remove_stale_shards
 
-logging.basicConfig(
-    filename="main.log",
-    filemode="w",
-    level=logging.INFO,
-    format="%(asctime)s %(funcName)s: %(message)s",
-    datefmt="%Y-%m-%d %H:%M:%S",
-)
 
+def configure_logging():
+    # Only the command line sets up logging, so that importing any module
+    # leaves the embedding application's logging alone
+    logging.basicConfig(
+        filename="main.log",
+        filemode="w",
+        level=logging.INFO,
+        format="%(asctime)s %(funcName)s: %(message)s",
+        datefmt="%Y-%m-%d %H:%M:%S",
+    )
 
-def clear_directory_contents(target: str):
-    # delete the contents of the target directory
-    if not os.path.exists(target):
-        logging.error(f"Target directory '{target}' does not exist. Exiting.")
-        raise Exception("Target directory does not exist. Exiting.")
 
-    # This will also remove the directory, so let's recreate it
-    shutil.rmtree(target)
-    logging.info(f"Re-creating directory '{target}'")
-    os.mkdir(target)
-    return
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the static site.")
+    parser.add_argument(
+        "command",
+        nargs="?",
+        choices=["build", "watch", "serve", "why-rebuilt", "merge"],
+        default="build",
+        help="build the site once, build it and then serve it, rebuilding on "
+        "every change, serve pages rendered on request straight from content/, "
+        "explain why the last build rebuilt the given pages, or assemble the "
+        "shards of a --shard build into public/ (default: build)",
+    )
+    parser.add_argument(
+        "paths",
+        nargs="*",
+        help="for why-rebuilt: page sources, such as content/index.md, or inputs "
+        "such as templates and static assets",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only re-render pages whose inputs changed since the last build",
+    )
+    parser.add_argument(
+        "--jobs",
+        "-j",
+        type=int,
+        default=1,
+        metavar="N",
+        help="render pages on N worker processes (default: 1)",
+    )
+    parser.add_argument(
+        "--shard",
+        metavar="I/N",
+        help="render only the I-th of N shards of the pages, balanced by size, "
+        "into its own directory under --shard-dir",
+    )
+    parser.add_argument(
+        "--shard-dir",
+        default=SHARD_DIR,
+        metavar="DIR",
+        help=f"where --shard builds write and merge reads (default: {SHARD_DIR})",
+    )
+    parser.add_argument(
+        "--pipeline",
+        action="store_true",
+        help="overlap reading, rendering and writing pages on an asyncio pipeline",
+    )
+    parser.add_argument(
+        "--hardlink",
+        action="store_true",
+        help="hardlink static assets into public/ instead of copying them",
+    )
+    parser.add_argument(
+        "--fingerprint",
+        action="store_true",
+        help="give static assets content-hashed names, such as "
+        "images/rivendell.3fa9c1d2.png, and link pages to them",
+    )
+    parser.add_argument(
+        "--minify",
+        action="store_true",
+        help="collapse the whitespace between tags in the generated pages, "
+        "leaving <pre> and <code> content alone",
+    )
+    parser.add_argument(
+        "--drop-wrappers",
+        action="store_true",
+        help="with --minify, also drop the bare <div> wrappers around the "
+        "content and each block; only if the stylesheet doesn't select them",
+    )
+    parser.add_argument(
+        "--gzip",
+        action="store_true",
+        help="write precompressed .gz siblings of the compressible files in public/",
+    )
+    parser.add_argument(
+        "--stats",
+        metavar="PATH",
+        help="write a JSON report of per-stage build timings to PATH",
+    )
+    parser.add_argument(
+        "--profile",
+        metavar="PATH",
+        help="write cProfile statistics for page generation to PATH",
+    )
+    parser.add_argument(
+        "--trace-memory",
+        action="store_true",
+        help="record peak memory and top allocation sites in the --stats report",
+    )
+    parser.add_argument(
+        "--block-cache-mb",
+        type=float,
+        default=64,
+        metavar="MB",
+        help="memory limit of the cache of rendered blocks shared across pages; "
+        "0 disables it (default: 64)",
+    )
+    parser.add_argument(
+        "--warm",
+        action="store_true",
+        help="in serve mode, render every page into the cache before serving",
+    )
+    parser.add_argument(
+        "--page-cache-mb",
+        type=float,
+        default=256,
+        metavar="MB",
+        help="memory limit of the rendered page cache in serve mode (default: 256)",
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8888,
+        help="the port to serve the site on in watch and serve modes "
+        "(default: 8888)",
+    )
+    args = parser.parse_args(argv)
+    if args.shard is not None:
+        try:
+            args.shard = parse_shard(args.shard)
+        except ValueError as e:
+            parser.error(str(e))
+    return args
 
 
-def recursive_copy(source: str, destination: str):
-    # recursively copy from source to destination
-    logging.info(f"Start copy operation for '{source}' to '{destination}'")
+def parser_version(args):
+    # Fingerprinting and minifying change the pages, so builds with and
+    # without them don't share pages
+    version = PARSER_VERSION + ("+fingerprint" if args.fingerprint else "")
+    if args.minify:
+        version += "+minify-wrappers" if args.drop_wrappers else "+minify"
+    return version
 
-    if not os.path.exists(source):
-        logging.error(f"Source '{source}' does not exist. Exiting.")
-        raise Exception(f"Source {source} does not exist. Exiting.")
 
-    for item in os.listdir(source):
+def fingerprint(manifest: BuildManifest, args):
+    # Returns the AssetManifest of the build, or None without --fingerprint
+    if not args.fingerprint:
+        if manifest.fingerprints:
+            remove_fingerprints("public", manifest.fingerprints)
+            asset_manifest = os.path.join("public", ASSET_MANIFEST_NAME)
+            if os.path.exists(asset_manifest):
+                os.remove(asset_manifest)
+            manifest.fingerprints = {}
+        return None
 
-        logging.info(f"Processing item '{item}'")
+    logging.info("Fingerprinting static files...")
+    assets = fingerprint_assets("static", "public", previous=manifest.fingerprints)
+    logging.info(f"Fingerprinted static files: {assets}")
+    manifest.fingerprints = assets.files
+    # Pages depend on the assets they refer to through their dependency edges,
+    # but the URLs in templates, such as the stylesheet link, are not among them
+    templates = {
+        template for _, template, _, _ in discover_work("content", "", "template.html")
+    }
+    if any(assets.references_changed(template) for template in templates):
+        manifest.invalidate()
+    return assets
 
-        if os.path.isfile(os.path.join(source, item)):
-            target = os.path.join(destination, item)
-            logging.info(f"Copying '{os.path.join(source,item)}' to '{target}'")
-            shutil.copy(os.path.join(source, item), target)
 
-        elif os.path.isdir(os.path.join(source, item)):
-            target = os.path.join(destination, os.path.basename(item))
-            logging.info(f"Creating directory '{target}'")
-            os.mkdir(target)
+def sync_static(manifest: BuildManifest, args):
+    # Returns the AssetManifest of the build, or None without --fingerprint
+    os.makedirs("public", exist_ok=True)
+    logging.info("Syncing static files...")
+    synced = sync_tree("static", "public", previous=manifest.assets, link=args.hardlink)
+    logging.info(f"Synced static files: {synced}")
+    manifest.assets = synced.files
+    return fingerprint(manifest, args)
 
-            for nested_item in os.listdir(os.path.join(source, item)):
-                recursive_copy(os.path.join(source, item), target)
-    return
 
+def render_pages(args, dest: str, manifest=None, assets=None, shard=None):
+    # Returns the WriteResult of the pages rendered
+    logging.info("Generating pages...")
+    stats = BuildStats() if args.stats else None
+    cache = None
+    if args.block_cache_mb > 0:
+        cache = BlockCache(max_bytes=int(args.block_cache_mb * 1024 * 1024))
+    minify = MinifyResult(args.drop_wrappers) if args.minify else None
+    with capture(stats, profile=args.profile, trace_memory=args.trace_memory):
+        written = generate_pages_recursive(
+            "content",
+            "template.html",
+            dest,
+            manifest=manifest,
+            jobs=args.jobs,
+            stats=stats,
+            cache=cache,
+            pipeline=args.pipeline,
+            static_path="static",
+            assets=assets,
+            minify=minify,
+            shard=shard,
+        )
+    logging.info(f"Generated pages: {written}")
+    if minify is not None:
+        logging.info(f"Minified pages: {minify}")
+    if cache is not None:
+        # With --jobs each worker has a cache of its own, and these counters
+        # only cover pages rendered in this process
+        logging.info(f"Block cache: {cache.stats()}")
+    if stats is not None:
+        logging.info(f"Writing build report to '{args.stats}'")
+        stats.save(args.stats)
+    return written
 
-def main():
-    logging.info("Starting...")
 
-    logging.info("Clearing directory contents...")
-    clear_directory_contents("public")
+def compress_outputs(manifest: BuildManifest, args):
+    if args.gzip:
+        logging.info("Compressing outputs...")
+        compressed = compress_tree(
+            "public", previous=manifest.compressed, jobs=max(args.jobs, 4)
+        )
+        logging.info(f"Compressed outputs: {compressed}")
+        manifest.compressed = compressed.files
+    elif manifest.compressed:
+        # A build without --gzip after one with it: the siblings would go
+        # stale as soon as their pages change
+        removed = remove_siblings("public", manifest.compressed)
+        logging.info(f"Removed {len(removed)} precompressed outputs")
+        manifest.compressed = {}
 
-    logging.info("Copying files...")
-    recursive_copy("static", "public")
 
-    logging.info("Generating pages...")
-    generate_pages_recursive("content", "template.html", "public")
+def build(args):
+    # public/ is kept in place between builds. The manifest records what the
+    # previous build wrote, so that stale pages and assets can be pruned
+    logging.info("Loading build manifest...")
+    manifest = BuildManifest.load(MANIFEST_PATH, parser_version(args))
+    if not args.incremental:
+        manifest.invalidate()
+    assets = sync_static(manifest, args)
+    render_pages(args, "public", manifest=manifest, assets=assets)
+    manifest.prune()
+    compress_outputs(manifest, args)
+    manifest.save()
+    return manifest
+
+
+def build_shard(args):
+    # Render only this shard's pages, into a directory of its own, and record
+    # them in a shard manifest. Static files are left to merge, and so is
+    # precompression
+    index, count = args.shard
+    name = shard_name(index, count)
+    dest = os.path.join(args.shard_dir, name)
+    os.makedirs(dest, exist_ok=True)
+    # Shards of an earlier build with another number of shards can't be
+    # merged with this one
+    remove_stale_shards(args.shard_dir, count)
+    # Fingerprinted names depend only on the assets' content, so pages can
+    # link to them before merge writes them
+    assets = scan_assets("static") if args.fingerprint else None
+    written = render_pages(args, dest, assets=assets, shard=args.shard)
+    write_shard_manifest(
+        os.path.join(args.shard_dir, name + ".json"),
+        index,
+        count,
+        parser_version(args),
+        discover_work("content", dest, "template.html"),
+        "content",
+        dest,
+        written.written + written.unchanged,
+    )
+
+
+def merge(args):
+    # Assemble the shards' pages into public/, along with the static files
+    logging.info("Loading build manifest...")
+    manifest = BuildManifest.load(MANIFEST_PATH, parser_version(args))
+    sync_static(manifest, args)
+    merged = merge_shards(
+        args.shard_dir,
+        "public",
+        parser_version(args),
+        content_root="content",
+        link=args.hardlink,
+    )
+    logging.info(f"Merged shards: {merged}")
+    print(f"Merged {merged.shards} shards: {len(merged.pages)} pages")
+    compress_outputs(manifest, args)
+    manifest.save()
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_logging()
+    logging.info("Starting...")
+
+    if args.command == "why-rebuilt":
+        manifest = BuildManifest.load(MANIFEST_PATH, parser_version(args))
+        for path in args.paths:
+            print("\n".join(manifest.why_rebuilt(path)))
+    elif args.command == "serve":
+        block_cache = None
+        if args.block_cache_mb > 0:
+            block_cache = BlockCache(max_bytes=int(args.block_cache_mb * 1024 * 1024))
+        site = ContentSite(
+            "content",
+            "static",
+            "template.html",
+            cache_bytes=int(args.page_cache_mb * 1024 * 1024),
+            block_cache=block_cache,
+        )
+        serve_content(site, port=args.port, warm=args.warm)
+    elif args.command == "watch":
+        # Start from an incremental build, then keep it up to date
+        args.incremental = True
+        manifest = build(args)
+        assets = None
+        if args.fingerprint:
+            # Start from the assets as the first build fingerprinted them. The
+            # watcher fingerprints them again whenever a static file changes
+            assets = AssetManifest(manifest.fingerprints)
+        watcher = SiteWatcher(
+            "content",
+            "static",
+            "template.html",
+            "public",
+            manifest=manifest,
+            minify=MinifyResult(args.drop_wrappers) if args.minify else None,
+            gzip=args.gzip,
+            assets=assets,
+        )
+        watch(watcher, port=args.port)
+    elif args.command == "merge":
+        merge(args)
+    elif args.shard is not None:
+        build_shard(args)
+    else:
+        build(args)
 
     logging.info("Done.")
 
@@ -0,0 +1,326 @@
+import hashlib, json, os, logging
+
+MANIFEST_PATH = ".md2html-manifest.json"
+# The recorded state of a dependency that a page only needs to exist, such as a
+# page it links to, in place of its hash
+PRESENT = "present"
+
+
+def hash_file(path: str):
+    # Hash the file contents in fixed-size chunks so large sources are never fully loaded
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 16), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BuildManifest:
+    def __init__(
+        self,
+        path: str,
+        parser_version: str,
+        pages: dict = None,
+        assets: list = None,
+        last_rebuilt: dict = None,
+        compressed: dict = None,
+        fingerprints: dict = None,
+    ):
+        """
+        Initializes a BuildManifest object.
+
+        Parameters
+        ----------
+        path : str
+            The file the manifest is loaded from and saved to.
+        parser_version : str
+            The version of the markdown parser used for this build. Pages
+            rendered by a different parser version are always rebuilt.
+        pages : dict, optional
+            The recorded pages, keyed by source path. The default is None.
+        assets : list, optional
+            The static files copied into the output by the previous build, as
+            paths relative to the static directory. The default is None.
+        last_rebuilt : dict, optional
+            The reasons each page was rebuilt by the previous build, keyed by
+            source path. The default is None.
+        compressed : dict, optional
+            The files examined by the previous `compress_tree` run. The default
+            is None.
+        fingerprints : dict, optional
+            The assets fingerprinted by the previous `fingerprint_assets` run.
+            The default is None.
+
+        Each page entry also records the page's dependency edges: its template
+        and the static assets and content sources its images and links refer
+        to, with their hashes, so that a change to any of them rebuilds it.
+        Content sources are recorded as PRESENT instead, as only their
+        existence matters. Files they would refer to once created are recorded
+        as None.
+        """
+        self.path = path
+        self.parser_version = parser_version
+        self.pages = pages if pages is not None else {}
+        self.assets = assets if assets is not None else []
+        self.last_rebuilt = last_rebuilt if last_rebuilt is not None else {}
+        self.compressed = compressed if compressed is not None else {}
+        self.fingerprints = fingerprints if fingerprints is not None else {}
+        # The reasons each page was rebuilt in this build
+        self.rebuilt = {}
+        self._seen = set()
+        self._invalidated = False
+        self._hashes = {}
+
+    @classmethod
+    def load(cls, path: str, parser_version: str):
+        """
+        Loads the manifest written by a previous build.
+
+        A missing or unreadable manifest gives an empty manifest, so that the
+        next build renders every page.
+
+        Returns
+        -------
+        BuildManifest
+            The manifest of the previous build.
+        """
+        if not os.path.exists(path):
+            logging.info(f"No manifest found at '{path}', starting a full build")
+            return cls(path, parser_version)
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            logging.warning(f"Could not read manifest '{path}', starting a full build")
+            return cls(path, parser_version)
+        return cls(
+            path,
+            parser_version,
+            pages=data.get("pages", {}),
+            assets=data.get("assets", []),
+            last_rebuilt=data.get("rebuilt", {}),
+            compressed=data.get("compressed", {}),
+            fingerprints=data.get("fingerprints", {}),
+        )
+
+    def file_hash(self, path: str):
+        # Templates and assets are shared by many pages, so each input is only
+        # hashed once per build. Missing files hash to None
+        if path not in self._hashes:
+            try:
+                self._hashes[path] = hash_file(path)
+            except FileNotFoundError:
+                self._hashes[path] = None
+        return self._hashes[path]
+
+    def reset_hashes(self):
+        # For long-lived manifests, such as in watch mode, where inputs change
+        # between rebuilds
+        self._hashes = {}
+
+    def template_hash(self, template_path: str):
+        return self.file_hash(template_path)
+
+    def entry_for(self, source: str, template_path: str, output: str):
+        """
+        Builds the manifest entry describing the current inputs of a page, and
+        marks the page as seen in this build.
+
+        Returns
+        -------
+        dict
+            The entry to pass to `changes` and `record`.
+        """
+        self._seen.add(source)
+        entry = {
+            "source": source,
+            "source_hash": self.file_hash(source),
+            "template": template_path,
+            "template_hash": self.template_hash(template_path),
+            "parser_version": self.parser_version,
+            "output": output,
+            "dependencies": {},
+        }
+        # The dependencies of an unchanged source are those it had last build.
+        # A changed source is rebuilt anyway, and set_dependencies records its
+        # new ones afterwards
+        previous = self.pages.get(source)
+        if previous is not None and previous["source_hash"] == entry["source_hash"]:
+            # Missing files are taken to be hashed, which makes no difference:
+            # their state changes when they are created either way
+            dependencies = previous.get("dependencies", {})
+            self.set_dependencies(
+                entry, {path: state != PRESENT for path, state in dependencies.items()}
+            )
+        return entry
+
+    def dependency_state(self, path: str, content: bool = True):
+        # The hash of a dependency, or PRESENT for one whose content doesn't
+        # matter. Missing files are None
+        if content:
+            return self.file_hash(path)
+        return PRESENT if self.file_hash(path) is not None else None
+
+    def set_dependencies(self, entry: dict, dependencies: dict):
+        # dependencies holds whether the page depends on the content of each
+        # file, keyed by path, as `reference_dependencies` lists them
+        entry["dependencies"] = {
+            path: self.dependency_state(path, content)
+            for path, content in dependencies.items()
+        }
+
+    def invalidate(self):
+        # Treat every page as changed, while keeping the previous build's records
+        # so that stale outputs can still be pruned
+        self._invalidated = True
+
+    def changes(self, entry: dict):
+        """
+        Compares the inputs of a page with those of the previous build.
+
+        Returns
+        -------
+        list
+            The reasons the page must be rebuilt, or an empty list if it is
+            current: all of its inputs match the previous build and the
+            previous output is still on disk.
+        """
+        if self._invalidated:
+            return ["full build"]
+        previous = self.pages.get(entry["source"])
+        if previous is None:
+            return ["new page"]
+        reasons = []
+        if previous.get("parser_version") != entry["parser_version"]:
+            reasons.append("parser version changed")
+        if previous.get("source_hash") != entry["source_hash"]:
+            reasons.append("source changed")
+        if previous.get("template") != entry["template"]:
+            reasons.append(f"template changed to {entry['template']}")
+        elif previous.get("template_hash") != entry["template_hash"]:
+            reasons.append(f"template {entry['template']} changed")
+        for path, digest in entry["dependencies"].items():
+            if previous.get("dependencies", {}).get(path) != digest:
+                reasons.append(f"dependency {path} changed")
+        if previous.get("output") != entry["output"]:
+            reasons.append(f"output moved to {entry['output']}")
+        elif not os.path.exists(entry["output"]):
+            reasons.append("output missing")
+        return reasons
+
+    def record(self, entry: dict, reasons: list = None):
+        # Store a rendered page's entry, along with why it was rendered
+        self.pages[entry["source"]] = entry
+        if reasons:
+            self.rebuilt[entry["source"]] = reasons
+
+    def dependents(self, paths):
+        """
+        Finds the pages that depend on any of the given inputs, through their
+        template or their images and links.
+
+        Returns
+        -------
+        set
+            The source paths of the dependent pages.
+        """
+        paths = set(paths)
+        return {
+            source
+            for source, entry in self.pages.items()
+            if entry["template"] in paths
+            or not paths.isdisjoint(entry.get("dependencies", {}))
+        }
+
+    def outdated_dependents(self, paths):
+        """
+        Finds the pages that depend on any of the given inputs, through their
+        template, or through an image or link whose recorded state no longer
+        matches the file, such as a linked page that was created or removed.
+        Editing a linked page leaves the pages that link to it alone.
+
+        Returns
+        -------
+        set
+            The source paths of the outdated pages.
+        """
+        paths = set(paths)
+        outdated = set()
+        for source, entry in self.pages.items():
+            if entry["template"] in paths:
+                outdated.add(source)
+                continue
+            for path, state in entry.get("dependencies", {}).items():
+                if path not in paths:
+                    continue
+                if self.dependency_state(path, state != PRESENT) != state:
+                    outdated.add(source)
+                    break
+        return outdated
+
+    def forget(self, source: str):
+        # Drop a page whose source was removed, returning its recorded output
+        entry = self.pages.pop(source, None)
+        return entry["output"] if entry is not None else None
+
+    def prune(self):
+        """
+        Deletes the outputs of pages whose sources were not seen in this build.
+
+        Returns
+        -------
+        list
+            The paths of the deleted outputs.
+        """
+        removed = []
+        for source in sorted(set(self.pages) - self._seen):
+            output = self.pages.pop(source)["output"]
+            if os.path.exists(output):
+                logging.info(f"Removing '{output}', its source '{source}' is gone")
+                os.remove(output)
+                removed.append(output)
+        return removed
+
+    def why_rebuilt(self, path: str):
+        """
+        Explains what the previous build did with a page, or which pages depend
+        on an input file.
+
+        Returns
+        -------
+        list
+            Lines of explanation.
+        """
+        lines = []
+        if path in self.last_rebuilt:
+            lines.append(f"{path} was rebuilt because:")
+            lines.extend(f"  {reason}" for reason in self.last_rebuilt[path])
+        elif path in self.pages:
+            lines.append(f"{path} was up to date and not rebuilt")
+        dependents = sorted(self.dependents([path]))
+        if dependents:
+            lines.append(f"{len(dependents)} page(s) depend on {path}:")
+            lines.extend(f"  {source}" for source in dependents)
+        entry = self.pages.get(path)
+        if entry is not None:
+            lines.append(f"{path} depends on:")
+            lines.append(f"  {entry['template']} (template)")
+            lines.extend(f"  {dependency}" for dependency in entry["dependencies"])
+        if not lines:
+            lines.append(f"{path} is not a page or input of the previous build")
+        return lines
+
+    def save(self):
+        with open(self.path, "w") as f:
+            json.dump(
+                {
+                    "pages": self.pages,
+                    "assets": self.assets,
+                    "rebuilt": self.rebuilt,
+                    "compressed": self.compressed,
+                    "fingerprints": self.fingerprints,
+                },
+                f,
+                indent=2,
+                sort_keys=True,
+            )
@@ -0,0 +1,251 @@
+import re, time
+
+# The content of these elements is passed through exactly as it is
+PRESERVE_ELEMENTS = {"pre", "code", "textarea", "script", "style"}
+# Whitespace next to the tags of these elements is never rendered, so it is
+# dropped. Between other tags it may separate words, and is kept as one space
+BLOCK_ELEMENTS = {
+    "!doctype",
+    "article",
+    "aside",
+    "blockquote",
+    "body",
+    "div",
+    "footer",
+    "h1",
+    "h2",
+    "h3",
+    "h4",
+    "h5",
+    "h6",
+    "head",
+    "header",
+    "hr",
+    "html",
+    "li",
+    "link",
+    "main",
+    "meta",
+    "nav",
+    "ol",
+    "p",
+    "pre",
+    "script",
+    "section",
+    "style",
+    "table",
+    "tbody",
+    "td",
+    "th",
+    "thead",
+    "title",
+    "tr",
+    "ul",
+}
+TAG_NAME_PATTERN = re.compile(r"<(/?)(!?[A-Za-z][A-Za-z0-9]*)")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+
+class MinifyResult:
+    def __init__(self, drop_wrappers: bool = False):
+        """
+        Initializes a MinifyResult object, which holds the minification
+        settings of a build and adds up what minifying its pages saved.
+
+        Parameters
+        ----------
+        drop_wrappers : bool, optional
+            Drop the attribute-less <div> wrappers that the renderer puts
+            around the content and every block. They carry no styling hook
+            unless a stylesheet selects bare divs. The default is False.
+        """
+        self.drop_wrappers = drop_wrappers
+        self.pages = 0
+        self.chars_in = 0
+        self.chars_out = 0
+        self.seconds = 0.0
+
+    def add(self, minifier: "HTMLMinifier"):
+        self.pages += 1
+        self.chars_in += minifier.chars_in
+        self.chars_out += minifier.chars_out
+        self.seconds += minifier.seconds
+
+    def merge(self, other: "MinifyResult"):
+        self.pages += other.pages
+        self.chars_in += other.chars_in
+        self.chars_out += other.chars_out
+        self.seconds += other.seconds
+
+    def __repr__(self):
+        saved = self.chars_in - self.chars_out
+        share = saved / self.chars_in if self.chars_in else 0.0
+        return (
+            f"MinifyResult({self.pages} pages, {self.chars_in} -> "
+            f"{self.chars_out} characters, {share:.1%} saved, "
+            f"{self.seconds * 1000:.1f} ms)"
+        )
+
+
+def _tag_end(text: str, start: int):
+    # The index just past the ">" closing the tag at start, or -1 if the tag
+    # is incomplete. A ">" inside a quoted attribute value doesn't close it
+    end = text.find(">", start)
+    if end == -1:
+        return -1
+    if '"' not in text[start:end] and "'" not in text[start:end]:
+        return end + 1
+    quote = None
+    for i in range(start + 1, len(text)):
+        char = text[i]
+        if quote is not None:
+            if char == quote:
+                quote = None
+        elif char == '"' or char == "'":
+            quote = char
+        elif char == ">":
+            return i + 1
+    return -1
+
+
+class HTMLMinifier:
+    def __init__(self, sink, drop_wrappers: bool = False):
+        """
+        Initializes an HTMLMinifier, a sink that minifies the HTML written to
+        it as it arrives and passes it on to another sink, so that a page is
+        minified without being assembled first. It can be given to
+        `Template.render_to` in place of the output file.
+
+        Runs of whitespace in text become one space, and whitespace next to
+        block-level tags is dropped. The content of <pre>, <code> and the
+        other PRESERVE_ELEMENTS is passed through untouched. A tag or text run
+        that is split across writes is held back until it is complete, so
+        call `finish` after the last write.
+
+        Parameters
+        ----------
+        sink : file-like
+            Any object with `write(str)` and `writelines(iterable)` methods.
+        drop_wrappers : bool, optional
+            Drop attribute-less <div> tags along with their closing tags. The
+            default is False.
+        """
+        self.sink = sink
+        self.drop_wrappers = drop_wrappers
+        self.chars_in = 0
+        self.chars_out = 0
+        self.seconds = 0.0
+        self._pending = ""
+        # The name of the last tag, or None after text
+        self._last = "html"
+        # The element whose content is being passed through, if any
+        self._preserve = None
+        # For each open <div>, whether its tags are dropped
+        self._divs = []
+
+    def write(self, text: str):
+        start = time.perf_counter()
+        self.chars_in += len(text)
+        self._pending += text
+        self._process(final=False)
+        self.seconds += time.perf_counter() - start
+
+    def writelines(self, lines):
+        self.write("".join(lines))
+
+    def finish(self):
+        # Flush whatever was held back at the end of the input
+        start = time.perf_counter()
+        self._process(final=True)
+        self.seconds += time.perf_counter() - start
+
+    def _text(self, text: str, next_tag: str):
+        if not text:
+            return ""
+        last, self._last = self._last, None
+        if not text.isspace():
+            text = WHITESPACE_PATTERN.sub(" ", text)
+            if last in BLOCK_ELEMENTS:
+                text = text.lstrip()
+            if next_tag in BLOCK_ELEMENTS:
+                text = text.rstrip()
+            return text
+        if last in BLOCK_ELEMENTS or next_tag in BLOCK_ELEMENTS:
+            return ""
+        return " "
+
+    def _tag(self, tag: str, closing: bool, name: str):
+        # The tag as written to the output, or "" if it is dropped
+        self._last = name
+        if name == "div" and self.drop_wrappers:
+            if closing:
+                return "" if self._divs and self._divs.pop() else tag
+            bare = tag.lower() == "<div>"
+            self._divs.append(bare)
+            return "" if bare else tag
+        if not closing and name in PRESERVE_ELEMENTS and not tag.endswith("/>"):
+            self._preserve = re.compile("</" + name, re.IGNORECASE)
+        return tag
+
+    def _process(self, final: bool):
+        buffer = self._pending
+        pos = 0
+        out = []
+        while pos < len(buffer):
+            if self._preserve is not None:
+                match = self._preserve.search(buffer, pos)
+                if match is None:
+                    # Hold back from the last "<", which may start the
+                    # closing tag
+                    end = len(buffer) if final else buffer.rfind("<", pos)
+                    end = len(buffer) if end == -1 else end
+                    out.append(buffer[pos:end])
+                    pos = end
+                    break
+                out.append(buffer[pos : match.start()])
+                pos = match.start()
+                self._preserve = None
+                self._last = None
+                continue
+
+            lt = buffer.find("<", pos)
+            if lt == -1:
+                text = buffer[pos:]
+                if final:
+                    out.append(self._text(text, None))
+                    pos = len(buffer)
+                    break
+                # Trailing whitespace may turn out to be next to a block tag
+                complete = text.rstrip()
+                out.append(self._text(complete, None))
+                pos += len(complete)
+                break
+
+            if buffer.startswith("<!--", lt):
+                end = buffer.find("-->", lt + 4)
+                end = -1 if end == -1 else end + 3
+            else:
+                end = _tag_end(buffer, lt)
+            if end == -1:
+                if final:
+                    out.append(self._text(buffer[pos:lt], None))
+                    out.append(buffer[lt:])
+                    pos = len(buffer)
+                break
+
+            tag = buffer[lt:end]
+            match = TAG_NAME_PATTERN.match(tag)
+            if match is None:
+                # A comment, or a "<" that doesn't start a tag
+                out.append(self._text(buffer[pos:lt], None))
+                out.append(tag)
+            else:
+                closing, name = match.group(1) == "/", match.group(2).lower()
+                out.append(self._text(buffer[pos:lt], name))
+                out.append(self._tag(tag, closing, name))
+            pos = end
+
+        self._pending = buffer[pos:]
+        for piece in out:
+            self.chars_out += len(piece)
+        self.sink.writelines(out)
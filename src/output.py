@@ -0,0 +1,137 @@
+import os, threading
+
+
+class WriteResult:
+    def __init__(self):
+        """
+        Initializes a WriteResult object, which records which output files a
+        build wrote and which it left alone because their content was unchanged.
+        """
+        self.written = []
+        self.unchanged = []
+
+    def add(self, path: str, written: bool):
+        (self.written if written else self.unchanged).append(path)
+
+    def merge(self, other: "WriteResult"):
+        self.written.extend(other.written)
+        self.unchanged.extend(other.unchanged)
+
+    def __repr__(self):
+        return (
+            f"WriteResult({len(self.written)} written, "
+            f"{len(self.unchanged)} unchanged)"
+        )
+
+
+def _temp_path(dest: str):
+    # Unique per process and thread, and in the same directory as dest so that
+    # os.replace never crosses a filesystem
+    return f"{dest}.{os.getpid()}.{threading.get_ident()}.tmp"
+
+
+def _same_content(path: str, data: bytes):
+    # A different size is caught by the stat alone. Otherwise the bytes are
+    # compared directly, which is cheaper than hashing both sides
+    try:
+        if os.stat(path).st_size != len(data):
+            return False
+        with open(path, "rb") as f:
+            return f.read() == data
+    except FileNotFoundError:
+        return False
+
+
+def _open_creating_parent(path: str, mode: str, **kwargs):
+    # Builds create every output directory up front, so the parent almost
+    # always exists: try the open first and only create the directory when it
+    # fails, instead of checking on every write
+    try:
+        return open(path, mode, **kwargs)
+    except FileNotFoundError:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return open(path, mode, **kwargs)
+
+
+def _same_file(path: str, other: str, chunk_size: int = 1024 * 1024):
+    try:
+        if os.stat(path).st_size != os.stat(other).st_size:
+            return False
+    except FileNotFoundError:
+        return False
+    with open(path, "rb") as f, open(other, "rb") as g:
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk != g.read(chunk_size):
+                return False
+            if not chunk:
+                return True
+
+
+def write_if_changed(dest: str, text: str):
+    """
+    Writes text to a file as UTF-8, unless the file already holds exactly
+    those bytes, in which case it is left alone along with its mtime.
+
+    The new content is written to a temporary file next to the destination
+    and moved into place with `os.replace`, so readers only ever see the old
+    or the new file, never a half-written one. A missing parent directory is
+    created.
+
+    Returns
+    -------
+    bool
+        True if the file was written, False if it was unchanged.
+    """
+    return write_bytes_if_changed(dest, text.encode("utf-8"))
+
+
+def write_bytes_if_changed(dest: str, data: bytes):
+    # The same as write_if_changed, for content that is already encoded
+    if _same_content(dest, data):
+        return False
+    temp = _temp_path(dest)
+    try:
+        with _open_creating_parent(temp, "wb") as f:
+            f.write(data)
+        os.replace(temp, dest)
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    return True
+
+
+class AtomicOutput:
+    def __init__(self, dest: str):
+        """
+        Initializes an AtomicOutput, a context manager for output that is
+        streamed rather than built in memory first. It gives a UTF-8 text file
+        to write to, and on a clean exit replaces the destination with it,
+        unless the content is unchanged. On an error the destination is left
+        as it was.
+
+        After the block, `written` tells whether the destination was replaced.
+
+        Parameters
+        ----------
+        dest : str
+            The path of the output file.
+        """
+        self.dest = dest
+        self.temp = _temp_path(dest)
+        self.written = False
+        self._file = None
+
+    def __enter__(self):
+        self._file = _open_creating_parent(self.temp, "w", encoding="utf-8")
+        return self._file
+
+    def __exit__(self, exc_type, exc, tb):
+        self._file.close()
+        if exc_type is not None or _same_file(self.temp, self.dest):
+            os.remove(self.temp)
+        else:
+            os.replace(self.temp, self.dest)
+            self.written = True
+        return False
@@ -0,0 +1,138 @@
+import gc, logging, multiprocessing, traceback
+from utils import generate_page
+from instrument import BuildStats
+from output import WriteResult
+from minify import MinifyResult
+
+
+# The BlockCache, AssetManifest and loaded templates of a worker process, set up
+# by _init_worker
+_worker_cache = None
+_worker_assets = None
+_worker_templates = None
+
+
+def _init_worker(cache, assets=None, templates=None):
+    global _worker_cache, _worker_assets, _worker_templates
+    _worker_cache = cache
+    _worker_assets = assets
+    _worker_templates = templates
+
+
+def _generate_page_task(page: tuple):
+    # Runs in a worker process. Errors are returned rather than raised, so that
+    # one broken page does not abort the rest of the build. The page's stats,
+    # when instrumented, its minification savings and its links and images,
+    # when collected, are sent back to be merged in the parent. drop_wrappers
+    # is None when not minifying
+    source, template_path, dest, size, instrumented, drop_wrappers, collect = page
+    stats = BuildStats() if instrumented else None
+    minify = MinifyResult(drop_wrappers) if drop_wrappers is not None else None
+    references = [] if collect else None
+    try:
+        written = generate_page(
+            source,
+            template_path,
+            dest,
+            stats=stats,
+            cache=_worker_cache,
+            minify=minify,
+            references=references,
+            size=size,
+            templates=_worker_templates,
+            assets=_worker_assets,
+        )
+    except Exception:
+        return source, dest, traceback.format_exc(), stats, minify, False, None
+    return source, dest, None, stats, minify, written, references
+
+
+def generate_pages_parallel(
+    pages: list,
+    jobs: int,
+    stats: BuildStats = None,
+    cache=None,
+    result: WriteResult = None,
+    assets=None,
+    minify: MinifyResult = None,
+    references: dict = None,
+    templates: dict = None,
+):
+    """
+    Renders pages on a pool of worker processes.
+
+    Parameters
+    ----------
+    pages : list
+        A list of (source, template_path, dest, size) tuples, as listed by
+        `discover_work`.
+    jobs : int
+        The number of worker processes.
+    stats : BuildStats, optional
+        Receives the merged stage timings of all workers. The default is None.
+    cache : BlockCache, optional
+        Every worker gets its own empty cache with the same limits. The default
+        is None.
+    result : WriteResult, optional
+        Records which pages were written and which were unchanged. The default
+        is None.
+    assets : AssetManifest, optional
+        Makes pages link to fingerprinted assets, in every worker. The default
+        is None.
+    minify : MinifyResult, optional
+        Minifies the pages with its settings, and receives the savings of all
+        workers. The default is None.
+    references : dict, optional
+        Receives the (url, is_image) pairs of the links and images of every
+        page that rendered, keyed by source path. The default is None.
+    templates : dict, optional
+        The templates loaded for the build (see `load_template`), which the
+        workers use without checking the files again. The default is None.
+
+    Returns
+    -------
+    dict
+        The formatted traceback of every page that failed, keyed by source path.
+    """
+    failures = {}
+    if not pages:
+        return failures
+
+    # Forked workers inherit the already-imported parser modules. Freezing the
+    # heap first keeps the garbage collector from touching (and so copying) the
+    # memory pages the workers share with the parent
+    try:
+        context = multiprocessing.get_context("fork")
+    except ValueError:
+        context = multiprocessing.get_context()
+    chunksize = max(1, len(pages) // (jobs * 4))
+    drop_wrappers = minify.drop_wrappers if minify is not None else None
+    collect = references is not None
+    tasks = [page + (stats is not None, drop_wrappers, collect) for page in pages]
+
+    gc.freeze()
+    try:
+        with context.Pool(
+            processes=jobs,
+            initializer=_init_worker,
+            initargs=(cache, assets, templates),
+        ) as pool:
+            for item in pool.imap_unordered(
+                _generate_page_task, tasks, chunksize=chunksize
+            ):
+                source, dest, error, page_stats, page_minify, written, found = item
+                if page_stats is not None:
+                    stats.merge(page_stats)
+                if page_minify is not None:
+                    minify.merge(page_minify)
+                if error is not None:
+                    logging.error(f"Failed to generate page {source}:\n{error}")
+                    failures[source] = error
+                    continue
+                if result is not None:
+                    result.add(dest, written)
+                if collect:
+                    references[source] = found
+    finally:
+        gc.unfreeze()
+    return failures
@@ -0,0 +1,280 @@
+import asyncio, logging, multiprocessing, time, traceback
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import utils
+from utils import render_markdown, page_template
+from instrument import BuildStats
+from output import WriteResult, write_if_changed
+from minify import MinifyResult
+
+# The BlockCache, AssetManifest and loaded templates of a rendering process, set
+# up by _init_renderer
+_renderer_cache = None
+_renderer_assets = None
+_renderer_templates = None
+
+
+def _init_renderer(cache, assets=None, templates=None):
+    global _renderer_cache, _renderer_assets, _renderer_templates
+    _renderer_cache = cache
+    _renderer_assets = assets
+    _renderer_templates = templates
+
+
+def _read(source: str, size: int):
+    # Returns the markdown and the time taken, or None for pages large enough to
+    # be streamed, which are rendered straight from the file instead
+    if size >= utils.STREAM_THRESHOLD:
+        return None, 0.0
+    start = time.perf_counter()
+    with open(source, "r") as f:
+        markdown = f.read()
+    return markdown, time.perf_counter() - start
+
+
+def _minify_result(drop_wrappers):
+    # A fresh MinifyResult for one page, or None when not minifying. Each page
+    # gets its own, as the renderers may run in other processes
+    return MinifyResult(drop_wrappers) if drop_wrappers is not None else None
+
+
+def _render(
+    markdown: str, template_path: str, drop_wrappers=None, collect: bool = False
+):
+    # With collect, the page's links and images are returned too
+    start = time.perf_counter()
+    minify = _minify_result(drop_wrappers)
+    references = [] if collect else None
+    html, title = render_markdown(
+        markdown, _renderer_cache, references, _renderer_assets
+    )
+    template = page_template(template_path, _renderer_templates, _renderer_assets)
+    page = utils.fill_template(template, {"Title": title, "Content": html}, minify)
+    return page, time.perf_counter() - start, minify, references
+
+
+def _stream(
+    source: str,
+    template_path: str,
+    dest: str,
+    drop_wrappers=None,
+    collect: bool = False,
+):
+    start = time.perf_counter()
+    minify = _minify_result(drop_wrappers)
+    references = [] if collect else None
+    written = utils.generate_page_streaming(
+        source,
+        template_path,
+        dest,
+        cache=_renderer_cache,
+        minify=minify,
+        references=references,
+        templates=_renderer_templates,
+        assets=_renderer_assets,
+    )
+    return written, time.perf_counter() - start, minify, references
+
+
+def _write(dest: str, page: str):
+    start = time.perf_counter()
+    written = write_if_changed(dest, page)
+    return written, time.perf_counter() - start
+
+
+class _Pipeline:
+    def __init__(
+        self, io, renderer, prefetch, queue_size, stats, result, minify, references
+    ):
+        self.io = io
+        self.renderer = renderer
+        self.stats = stats
+        self.result = result
+        self.minify = minify
+        self.references = references
+        self.collect = references is not None
+        self.drop_wrappers = minify.drop_wrappers if minify is not None else None
+        self.failures = {}
+        # Pages read but not yet handed to a writer. Together with the write
+        # queue this bounds how many pages are held in memory at once
+        self.window = asyncio.Semaphore(prefetch)
+        self.writes = asyncio.Queue(maxsize=queue_size)
+
+    def fail(self, source: str, error: str):
+        logging.error(f"Failed to generate page {source}:\n{error}")
+        self.failures[source] = error
+
+    def record(self, stage: str, seconds: float):
+        # Only the event loop thread touches the stats
+        if self.stats is not None:
+            self.stats.add_stage(stage, seconds)
+
+    def record_minify(self, minify: MinifyResult):
+        if minify is not None:
+            self.minify.merge(minify)
+            self.record("minify", minify.seconds)
+
+    async def produce(self, source: str, template_path: str, dest: str, size: int):
+        loop = asyncio.get_running_loop()
+        try:
+            markdown, read = await loop.run_in_executor(self.io, _read, source, size)
+            self.record("read", read)
+            if markdown is None:
+                written, seconds, minify, found = await loop.run_in_executor(
+                    self.renderer,
+                    _stream,
+                    source,
+                    template_path,
+                    dest,
+                    self.drop_wrappers,
+                    self.collect,
+                )
+                self.record("render", seconds)
+                self.record_minify(minify)
+                self.result.add(dest, written)
+                if self.collect:
+                    self.references[source] = found
+                if self.stats is not None:
+                    self.stats.add_page(source, read + seconds)
+                return
+            page, seconds, minify, found = await loop.run_in_executor(
+                self.renderer,
+                _render,
+                markdown,
+                template_path,
+                self.drop_wrappers,
+                self.collect,
+            )
+            self.record("render", seconds)
+            self.record_minify(minify)
+            del markdown
+            # Waits while the write queue is full, which in turn holds back
+            # reading further pages
+            await self.writes.put((source, dest, page, read + seconds, found))
+        except Exception:
+            self.fail(source, traceback.format_exc())
+        finally:
+            self.window.release()
+
+    async def consume(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            item = await self.writes.get()
+            if item is None:
+                return
+            source, dest, page, elapsed, found = item
+            try:
+                written, seconds = await loop.run_in_executor(
+                    self.io, _write, dest, page
+                )
+                self.record("write", seconds)
+                self.result.add(dest, written)
+                if self.collect:
+                    self.references[source] = found
+                if self.stats is not None:
+                    self.stats.add_page(source, elapsed + seconds)
+            except Exception:
+                self.fail(source, traceback.format_exc())
+
+    async def run(self, pages: list, writers: int):
+        consumers = [asyncio.create_task(self.consume()) for _ in range(writers)]
+        producers = set()
+        for source, template_path, dest, size in pages:
+            await self.window.acquire()
+            task = asyncio.create_task(
+                self.produce(source, template_path, dest, size)
+            )
+            producers.add(task)
+            task.add_done_callback(producers.discard)
+        await asyncio.gather(*producers)
+        for _ in consumers:
+            await self.writes.put(None)
+        await asyncio.gather(*consumers)
+
+
+def generate_pages_pipelined(
+    pages: list,
+    jobs: int = 1,
+    prefetch: int = 16,
+    queue_size: int = 8,
+    stats: BuildStats = None,
+    cache=None,
+    result: WriteResult = None,
+    assets=None,
+    minify: MinifyResult = None,
+    references: dict = None,
+    templates: dict = None,
+):
+    """
+    Renders pages with an asyncio pipeline that overlaps reading, rendering and
+    writing: upcoming source files are read ahead on a thread pool, rendering
+    runs on an executor, and finished pages go through a bounded write queue.
+
+    Parameters
+    ----------
+    pages : list
+        A list of (source, template_path, dest, size) tuples, as listed by
+        `discover_work`.
+    jobs : int, optional
+        With more than one job, pages are rendered on that many worker processes
+        rather than a single thread. The default is 1.
+    prefetch : int, optional
+        The most pages read ahead of the writers. The default is 16.
+    queue_size : int, optional
+        The most rendered pages waiting to be written. When the queue is full,
+        reading and rendering wait for the writers. The default is 8.
+    stats : BuildStats, optional
+        Receives the read, render and write times. The default is None.
+    cache : BlockCache, optional
+        With worker processes, every worker gets its own empty cache with the
+        same limits. The default is None.
+    result : WriteResult, optional
+        Records which pages were written and which were unchanged. The default
+        is None.
+    assets : AssetManifest, optional
+        Makes pages link to fingerprinted assets, in every worker. The default
+        is None.
+    minify : MinifyResult, optional
+        Minifies the pages with its settings, and receives the savings. The
+        default is None.
+    references : dict, optional
+        Receives the (url, is_image) pairs of the links and images of every
+        page that rendered, keyed by source path. The default is None.
+    templates : dict, optional
+        The templates loaded for the build (see `load_template`), which the
+        renderers use without checking the files again. The default is None.
+
+    Returns
+    -------
+    dict
+        The formatted traceback of every page that failed, keyed by source path.
+    """
+    if not pages:
+        return {}
+
+    if jobs > 1:
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError:
+            context = multiprocessing.get_context()
+        renderer = ProcessPoolExecutor(
+            jobs,
+            mp_context=context,
+            initializer=_init_renderer,
+            initargs=(cache, assets, templates),
+        )
+    else:
+        renderer = ThreadPoolExecutor(
+            1, initializer=_init_renderer, initargs=(cache, assets, templates)
+        )
+    io = ThreadPoolExecutor(prefetch + 2)
+    if result is None:
+        result = WriteResult()
+    pipeline = _Pipeline(
+        io, renderer, prefetch, queue_size, stats, result, minify, references
+    )
+    try:
+        asyncio.run(pipeline.run(pages, writers=2))
+    finally:
+        renderer.shutdown()
+        io.shutdown()
+    return pipeline.failures
@@ -0,0 +1,84 @@
+from template import Template
+from blockcache import BlockCache
+from utils import markdown_to_html, render_markdown
+
+# Used by Renderer when it is given no template
+DEFAULT_TEMPLATE = "<!DOCTYPE html>\n<title>{{ Title }}</title>\n{{ Content }}\n"
+
+
+class Renderer:
+    def __init__(self, template=None, cache_bytes: int = 64 * 1024 * 1024):
+        """
+        Initializes a Renderer, a long-lived markdown renderer for embedding,
+        such as in a web service.
+
+        It holds the parsed page template and a cache of rendered blocks, and
+        the inline and block patterns it uses are compiled once at import, so
+        each call costs only the parse and render. Nothing reads the disk or
+        touches the logging configuration. A Renderer may be shared between
+        threads.
+
+        Parameters
+        ----------
+        template : str or Template, optional
+            The page template used by `render_page`, with "{{ Title }}" and
+            "{{ Content }}" slots. The default is DEFAULT_TEMPLATE.
+        cache_bytes : int, optional
+            The memory limit of the block cache. 0 disables the cache. The
+            default is 64 MiB.
+        """
+        if template is None:
+            template = DEFAULT_TEMPLATE
+        if isinstance(template, str):
+            template = Template(template)
+        self.template = template
+        self.cache = BlockCache(max_bytes=cache_bytes) if cache_bytes > 0 else None
+
+    @classmethod
+    def from_template_file(cls, path: str, cache_bytes: int = 64 * 1024 * 1024):
+        # Read the template once, when the Renderer is created
+        with open(path, "r") as f:
+            return cls(f.read(), cache_bytes)
+
+    def render(self, markdown: str):
+        """
+        Renders markdown to HTML, the same as `markdown_to_html`.
+
+        Returns
+        -------
+        str
+            The HTML of the document body.
+        """
+        return markdown_to_html(markdown, self.cache)
+
+    def render_page(self, markdown: str):
+        """
+        Renders markdown to a full page with the template, the same as
+        `generate_page` without the file I/O.
+
+        Returns
+        -------
+        str
+            The filled template.
+
+        Raises
+        ------
+        Exception
+            If the markdown has no H1 title.
+        """
+        html, title = render_markdown(markdown, self.cache)
+        return self.template.render({"Title": title, "Content": html})
+
+    def cache_stats(self):
+        """
+        Returns
+        -------
+        dict
+            The block cache's size, limits and hit/miss counters, or None if
+            the cache is disabled.
+        """
+        return self.cache.stats() if self.cache is not None else None
+
+    def clear_cache(self):
+        if self.cache is not None:
+            self.cache.clear()
@@ -0,0 +1,321 @@
+import os, time, hashlib, logging, mimetypes, threading, collections
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
+from blockcache import BlockCache
+from depgraph import resolve_reference
+from template import load_template, find_template
+from utils import render_markdown, discover_work
+
+# The render latency percentiles reported by /metrics, over the most recent
+# LATENCY_WINDOW renders
+LATENCY_QUANTILES = (0.5, 0.9, 0.99)
+LATENCY_WINDOW = 4096
+
+
+class ServerMetrics:
+    def __init__(self):
+        """
+        Initializes a ServerMetrics object, which counts requests and records
+        render latencies for the /metrics endpoint. It is safe to update from
+        several request threads.
+        """
+        self.requests = collections.Counter()
+        self.not_modified = 0
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def count_request(self, status: int):
+        with self._lock:
+            self.requests[status] += 1
+            if status == 304:
+                self.not_modified += 1
+
+    def observe_render(self, seconds: float):
+        with self._lock:
+            self.renders += 1
+            self.render_seconds += seconds
+            self.latencies.append(seconds)
+
+    def quantiles(self):
+        # Nearest-rank percentiles of the recent render latencies
+        with self._lock:
+            latencies = sorted(self.latencies)
+        if not latencies:
+            return {q: 0.0 for q in LATENCY_QUANTILES}
+        return {
+            q: latencies[min(len(latencies) - 1, int(q * len(latencies)))]
+            for q in LATENCY_QUANTILES
+        }
+
+    def to_prometheus(self, cache_stats: dict):
+        """
+        Formats the metrics in the Prometheus text exposition format.
+
+        Parameters
+        ----------
+        cache_stats : dict
+            The page cache statistics, from `BlockCache.stats`.
+
+        Returns
+        -------
+        str
+            The metrics text.
+        """
+        quantiles = self.quantiles()
+        with self._lock:
+            requests = sorted(self.requests.items())
+            renders, render_seconds = self.renders, self.render_seconds
+        lines = [
+            "# HELP md2html_requests_total HTTP requests by status code.",
+            "# TYPE md2html_requests_total counter",
+        ]
+        lines += [f'md2html_requests_total{{code="{s}"}} {n}' for s, n in requests]
+        lines += [
+            "# HELP md2html_page_cache_hits_total Pages served from the cache.",
+            "# TYPE md2html_page_cache_hits_total counter",
+            f"md2html_page_cache_hits_total {cache_stats['hits']}",
+            "# HELP md2html_page_cache_misses_total Pages that had to be rendered.",
+            "# TYPE md2html_page_cache_misses_total counter",
+            f"md2html_page_cache_misses_total {cache_stats['misses']}",
+            "# HELP md2html_page_cache_hit_ratio Share of page lookups that hit.",
+            "# TYPE md2html_page_cache_hit_ratio gauge",
+            f"md2html_page_cache_hit_ratio {cache_stats['hit_rate']}",
+            "# HELP md2html_page_cache_bytes Memory held by cached pages.",
+            "# TYPE md2html_page_cache_bytes gauge",
+            f"md2html_page_cache_bytes {cache_stats['bytes']}",
+            "# HELP md2html_render_seconds Time to render a page.",
+            "# TYPE md2html_render_seconds summary",
+        ]
+        lines += [
+            f'md2html_render_seconds{{quantile="{q}"}} {seconds}'
+            for q, seconds in quantiles.items()
+        ]
+        lines += [
+            f"md2html_render_seconds_sum {render_seconds}",
+            f"md2html_render_seconds_count {renders}",
+        ]
+        return "\n".join(lines) + "\n"
+
+
+class ContentSite:
+    def __init__(
+        self,
+        content: str,
+        static: str,
+        template: str,
+        cache_bytes: int = 64 * 1024 * 1024,
+        block_cache: BlockCache = None,
+    ):
+        """
+        Initializes a ContentSite, which renders pages straight from the
+        content directory on request and keeps them in an LRU cache.
+
+        Cached pages are keyed by source path, modification time and size, and
+        by the template's, so an edited page or template, or a per-directory
+        template that was added or removed, is simply rendered again on its
+        next request.
+
+        Parameters
+        ----------
+        content : str
+            The content directory.
+        static : str
+            The static asset directory, served as is.
+        template : str
+            The default template. Per-directory templates in the content tree
+            are honored as in a build.
+        cache_bytes : int, optional
+            The memory limit of the page cache. The default is 64 MiB.
+        block_cache : BlockCache, optional
+            A cache of rendered blocks shared by all pages. The default is None.
+        """
+        self.content = content
+        self.static = static
+        self.template = template
+        self.pages = BlockCache(max_bytes=cache_bytes)
+        self.block_cache = block_cache
+        self.metrics = ServerMetrics()
+        # Site paths are resolved like the targets of links on the home page
+        self._root_page = os.path.join(content, "index.md")
+
+    def resolve(self, url_path: str):
+        # The source or asset behind a request path, or None
+        return resolve_reference(url_path, self._root_page, self.content, self.static)
+
+    def _template_for(self, source: str):
+        # Looked up on every request rather than cached, as a per-directory
+        # template may be added or removed while serving. It costs one isfile
+        # per directory up to the nearest template, next to the stat calls of
+        # the page cache key
+        return find_template(os.path.dirname(source), self.content, self.template)
+
+    def page(self, source: str):
+        """
+        Renders a page, or takes it from the cache.
+
+        Returns
+        -------
+        tuple
+            The strong ETag and the UTF-8 encoded page.
+        """
+        template_path = self._template_for(source)
+        stat = os.stat(source)
+        template_stat = os.stat(template_path)
+        key = (
+            source,
+            stat.st_mtime_ns,
+            stat.st_size,
+            template_path,
+            template_stat.st_mtime_ns,
+            template_stat.st_size,
+        )
+        cached = self.pages.get(key)
+        if cached is not None:
+            return cached
+
+        start = time.perf_counter()
+        with open(source, "r") as f:
+            markdown = f.read()
+        html, title = render_markdown(markdown, self.block_cache)
+        template = load_template(template_path)
+        body = template.render({"Title": title, "Content": html}).encode("utf-8")
+        self.metrics.observe_render(time.perf_counter() - start)
+
+        etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+        self.pages.put(key, (etag, body), size=len(body) + len(etag))
+        return etag, body
+
+    def warm(self, jobs: int = 4):
+        """
+        Renders every page of the content tree into the cache, skipping pages
+        that fail to render.
+
+        Returns
+        -------
+        int
+            The number of pages rendered.
+        """
+
+        def render(source: str):
+            try:
+                self.page(source)
+                return True
+            except Exception as e:
+                logging.warning(f"Could not warm {source}: {e}")
+                return False
+
+        sources = [
+            source
+            for source, _, _, _ in discover_work(self.content, "", self.template)
+        ]
+        with ThreadPoolExecutor(jobs) as pool:
+            return sum(pool.map(render, sources))
+
+
+def _etag_matches(header: str, etag: str):
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class ContentRequestHandler(BaseHTTPRequestHandler):
+    # Serves rendered pages, static assets and /metrics from a ContentSite,
+    # available as self.server.site
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self._respond(send_body=True)
+
+    def do_HEAD(self):
+        self._respond(send_body=False)
+
+    def _respond(self, send_body: bool):
+        site = self.server.site
+        path = urlsplit(self.path).path
+        if path == "/metrics":
+            body = site.metrics.to_prometheus(site.pages.stats()).encode("utf-8")
+            return self._send(200, body, "text/plain; version=0.0.4", None, send_body)
+
+        target = site.resolve(path)
+        if target is None:
+            return self._send(404, b"Not found\n", "text/plain", None, send_body)
+        try:
+            if target.endswith(".md"):
+                etag, body = site.page(target)
+                content_type = "text/html; charset=utf-8"
+            else:
+                etag, body = self._asset(target)
+                content_type = mimetypes.guess_type(target)[0]
+        except Exception as e:
+            logging.error(f"Failed to serve {path}: {e}")
+            return self._send(500, f"{e}\n".encode(), "text/plain", None, send_body)
+
+        if _etag_matches(self.headers.get("If-None-Match", ""), etag):
+            return self._send(304, b"", None, etag, False)
+        self._send(200, body, content_type, etag, send_body)
+
+    @staticmethod
+    def _asset(path: str):
+        # Static files are read as they are. Their ETag changes whenever their
+        # modification time or size does
+        stat = os.stat(path)
+        with open(path, "rb") as f:
+            body = f.read()
+        return f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"', body
+
+    def _send(self, status, body, content_type, etag, send_body):
+        self.server.site.metrics.count_request(status)
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header("Content-Type", content_type)
+        if etag is not None:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        if status != 304:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logging.info(format % args)
+
+
+def make_server(site: ContentSite, port: int, host: str = ""):
+    """
+    Creates an HTTP server for a ContentSite that handles each request on its
+    own thread. Call `serve_forever()` to start it.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        The server.
+    """
+    server = ThreadingHTTPServer((host, port), ContentRequestHandler)
+    server.daemon_threads = True
+    server.site = site
+    return server
+
+
+def serve_content(site: ContentSite, port: int = 8888, warm: bool = False):
+    """
+    Serves a ContentSite until interrupted, optionally rendering every page
+    into the cache first.
+    """
+    if warm:
+        start = time.perf_counter()
+        count = site.warm()
+        print(f"Warmed {count} pages in {time.perf_counter() - start:.2f} s")
+    server = make_server(site, port)
+    print(f"Serving {site.content} at http://localhost:{server.server_address[1]}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,341 @@
+import os, re, glob, json, shutil, heapq, hashlib, logging
+from manifest import hash_file
+from sync import copy_file
+
+# Shard builds write their pages to SHARD_DIR/<i>-of-<N>/ and their shard
+# manifest to SHARD_DIR/<i>-of-<N>.json
+SHARD_DIR = "shards"
+# The file name of a shard manifest, such as "2-of-4.json"
+SHARD_MANIFEST_PATTERN = re.compile(r"(?P<index>\d+)-of-(?P<count>\d+)\.json")
+
+
+def parse_shard(spec: str):
+    """
+    Parses a shard specification such as "2/4", the second of four shards.
+
+    Returns
+    -------
+    tuple
+        The 1-based shard index and the number of shards.
+
+    Raises
+    ------
+    ValueError
+        If the specification is not of the form i/N with 1 <= i <= N.
+    """
+    try:
+        index, count = (int(part) for part in spec.split("/"))
+    except ValueError:
+        raise ValueError(f"Invalid shard '{spec}', expected i/N") from None
+    if not 1 <= index <= count:
+        raise ValueError(f"Invalid shard '{spec}', expected 1 <= i <= N")
+    return index, count
+
+
+def shard_name(index: int, count: int):
+    return f"{index}-of-{count}"
+
+
+def _relative(path: str, root: str):
+    # The same on every machine, whatever the checkout's location
+    return os.path.relpath(path, root).replace(os.sep, "/")
+
+
+def _path_hash(path: str):
+    # Python's own str hash is salted per process, so it can't be used to
+    # agree on an order across machines
+    return hashlib.blake2b(path.encode("utf-8"), digest_size=8).digest()
+
+
+def assign_shards(sizes: dict, count: int):
+    """
+    Partitions pages between shards so that each renders about the same
+    number of bytes, with the greedy longest-processing-time rule: the
+    largest remaining page goes to the least loaded shard.
+
+    The result depends only on the paths and sizes: pages of equal size are
+    taken in order of their path hash, and equally loaded shards in index
+    order, so every machine computes the same partition.
+
+    Parameters
+    ----------
+    sizes : dict
+        The source size in bytes of each page, keyed by its path relative to
+        the content directory.
+    count : int
+        The number of shards.
+
+    Returns
+    -------
+    dict
+        The 1-based shard index of each page, keyed by path.
+    """
+    loads = [(0, index) for index in range(1, count + 1)]
+    assignment = {}
+    for path in sorted(sizes, key=lambda path: (-sizes[path], _path_hash(path))):
+        load, index = heapq.heappop(loads)
+        assignment[path] = index
+        # Every page costs something to render, however small its source
+        heapq.heappush(loads, (load + sizes[path] + 1, index))
+    return assignment
+
+
+def page_set_digest(sources):
+    # Identifies the full set of pages, so that shards built from different
+    # content trees are never merged together
+    digest = hashlib.sha256()
+    for source in sorted(sources):
+        digest.update(source.encode("utf-8") + b"\0")
+    return digest.hexdigest()
+
+
+def select_shard(work: list, content_root: str, index: int, count: int):
+    """
+    Keeps the pages of one shard.
+
+    Parameters
+    ----------
+    work : list
+        Every page of the site, as (source, template, dest, size) tuples from
+        `discover_work`.
+    content_root : str
+        The content directory.
+    index : int
+        The 1-based index of the shard.
+    count : int
+        The number of shards.
+
+    Returns
+    -------
+    list
+        The tuples of the pages that the shard renders, in their original
+        order.
+    """
+    sizes = {_relative(source, content_root): size for source, _, _, size in work}
+    assignment = assign_shards(sizes, count)
+    return [
+        page
+        for page in work
+        if assignment[_relative(page[0], content_root)] == index
+    ]
+
+
+def write_shard_manifest(
+    path: str,
+    index: int,
+    count: int,
+    parser_version: str,
+    work: list,
+    content_root: str,
+    output: str,
+    outputs: list,
+):
+    """
+    Records what a shard build rendered, for `merge_shards`.
+
+    Parameters
+    ----------
+    path : str
+        The shard manifest to write.
+    index : int
+        The 1-based index of the shard.
+    count : int
+        The number of shards.
+    parser_version : str
+        The parser version of the build, including the options that change
+        pages.
+    work : list
+        Every page of the site, as (source, template, dest, size) tuples.
+    content_root : str
+        The content directory.
+    output : str
+        The shard's output directory.
+    outputs : list
+        The pages the shard rendered, as paths within `output`.
+    """
+    data = {
+        "shard": index,
+        "count": count,
+        "parser_version": parser_version,
+        "total": len(work),
+        "page_set": page_set_digest(_relative(page[0], content_root) for page in work),
+        "pages": {_relative(page, output): hash_file(page) for page in outputs},
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+
+
+class MergeResult:
+    def __init__(self):
+        """
+        Initializes a MergeResult object, which records what a merge did.
+        """
+        self.shards = 0
+        self.pages = []
+        self.copied = []
+        self.unchanged = []
+
+    def __repr__(self):
+        return (
+            f"MergeResult({self.shards} shards, {len(self.pages)} pages, "
+            f"{len(self.copied)} copied, {len(self.unchanged)} unchanged)"
+        )
+
+
+def _shard_manifest_paths(shard_dir: str):
+    # The shard manifests in the directory, keyed by (index, count)
+    paths = {}
+    for path in glob.glob(os.path.join(shard_dir, "*-of-*.json")):
+        match = SHARD_MANIFEST_PATTERN.fullmatch(os.path.basename(path))
+        if match:
+            paths[int(match.group("index")), int(match.group("count"))] = path
+    return paths
+
+
+def load_shard_manifests(shard_dir: str, count: int = None):
+    # The shard manifests of one sharded build, keyed by shard index. Without
+    # a count, the build is the one whose manifest was written last: manifests
+    # left from builds with another number of shards are ignored
+    paths = _shard_manifest_paths(shard_dir)
+    if count is None and paths:
+        latest = max(paths, key=lambda key: os.path.getmtime(paths[key]))
+        count = latest[1]
+    stale = sorted({key[1] for key in paths} - {count})
+    if stale:
+        logging.warning(
+            f"Ignoring the shards of builds with {stale} shards in '{shard_dir}'"
+        )
+    manifests = {}
+    for key, path in sorted(paths.items()):
+        if key[1] != count:
+            continue
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data["shard"] in manifests:
+            raise Exception(f"Shard {data['shard']} appears twice in {shard_dir}")
+        manifests[data["shard"]] = data
+    return manifests
+
+
+def remove_stale_shards(shard_dir: str, count: int):
+    """
+    Removes the shard manifests and pages of builds with another number of
+    shards from the shard directory, so that they are never merged with the
+    shards of this one.
+
+    Returns
+    -------
+    list
+        The names of the removed shards, such as "1-of-2".
+    """
+    removed = []
+    for (index, other), path in sorted(_shard_manifest_paths(shard_dir).items()):
+        if other == count:
+            continue
+        name = shard_name(index, other)
+        logging.info(f"Removing stale shard '{name}' from '{shard_dir}'")
+        os.remove(path)
+        shutil.rmtree(os.path.join(shard_dir, name), ignore_errors=True)
+        removed.append(name)
+    return removed
+
+
+def _check_complete(manifests: dict, shard_dir: str, parser_version: str):
+    # Raise unless the shards are all the shards of one build of one site
+    if not manifests:
+        raise Exception(f"No shard manifests found in '{shard_dir}'")
+    first = next(iter(manifests.values()))
+    for data in manifests.values():
+        for key in ["count", "total", "page_set"]:
+            if data[key] != first[key]:
+                raise Exception(f"Shards disagree on their {key}, not merging")
+        if data["parser_version"] != parser_version:
+            raise Exception(
+                f"Shard {data['shard']} was built with parser version "
+                f"'{data['parser_version']}', not '{parser_version}'"
+            )
+    missing = sorted(set(range(1, first["count"] + 1)) - set(manifests))
+    if missing:
+        raise Exception(f"Missing shard(s) {missing} of {first['count']}")
+    pages = [page for data in manifests.values() for page in data["pages"]]
+    if len(set(pages)) != len(pages):
+        raise Exception("A page was rendered by more than one shard")
+    if len(pages) != first["total"]:
+        raise Exception(f"The shards hold {len(pages)} of {first['total']} pages")
+
+
+def merge_shards(
+    shard_dir: str,
+    output: str,
+    parser_version: str,
+    content_root: str = None,
+    link: bool = False,
+    count: int = None,
+):
+    """
+    Assembles the pages of a sharded build into the output directory, after
+    checking that the shards are complete: every shard of the build is
+    present, all were built from the same set of pages with the same parser
+    version, and together they hold every page exactly once.
+
+    Pages whose output already holds the same content are left alone, and
+    every copied page is checked against the hash its shard recorded.
+
+    Parameters
+    ----------
+    shard_dir : str
+        The directory the shard builds wrote to.
+    output : str
+        The output directory.
+    parser_version : str
+        The parser version the shards must have been built with.
+    content_root : str, optional
+        The content directory. If given, the shards must cover exactly the
+        pages it holds. The default is None.
+    link : bool, optional
+        Hardlink pages instead of copying them. The default is False.
+    count : int, optional
+        The number of shards of the build to merge. The default is None, the
+        number of the most recently written shard manifest.
+
+    Returns
+    -------
+    MergeResult
+        What the merge did.
+
+    Raises
+    ------
+    Exception
+        If the shards are incomplete or inconsistent, or a page does not
+        match its recorded hash.
+    """
+    manifests = load_shard_manifests(shard_dir, count)
+    _check_complete(manifests, shard_dir, parser_version)
+    if content_root is not None:
+        from utils import discover_work
+
+        work = discover_work(content_root, output, "")
+        digest = page_set_digest(_relative(page[0], content_root) for page in work)
+        if digest != next(iter(manifests.values()))["page_set"]:
+            raise Exception(f"The shards were not built from '{content_root}'")
+
+    result = MergeResult()
+    result.shards = len(manifests)
+    for index, data in sorted(manifests.items()):
+        source_root = os.path.join(shard_dir, shard_name(index, data["count"]))
+        for page, expected in sorted(data["pages"].items()):
+            source = os.path.join(source_root, page)
+            dest = os.path.join(output, page)
+            result.pages.append(page)
+            if os.path.exists(dest) and hash_file(dest) == expected:
+                result.unchanged.append(page)
+                continue
+            if not os.path.exists(source) or hash_file(source) != expected:
+                raise Exception(
+                    f"'{source}' is missing or does not match shard {index}"
+                )
+            logging.info(f"Copying '{source}'")
+            os.makedirs(os.path.dirname(dest), exist_ok=True)
+            copy_file(source, dest, link)
+            result.copied.append(page)
+    return result
@@ -0,0 +1,187 @@
+import os, shutil, logging
+from concurrent.futures import ThreadPoolExecutor
+from manifest import hash_file
+
+# Asset trees with fewer files to copy than this are copied on the calling thread
+PARALLEL_COPY_THRESHOLD = 16
+
+
+class SyncResult:
+    def __init__(self):
+        """
+        Initializes a SyncResult object, which records what a sync did.
+        """
+        # Every file in the source tree, as paths relative to the source root
+        self.files = []
+        self.copied = []
+        self.unchanged = []
+        self.pruned = []
+
+    def __repr__(self):
+        return (
+            f"SyncResult({len(self.files)} files, {len(self.copied)} copied, "
+            f"{len(self.unchanged)} unchanged, {len(self.pruned)} pruned)"
+        )
+
+
+def _scan_files(root: str, relative: str = ""):
+    # Yield (relative path, stat) for every file below root
+    with os.scandir(os.path.join(root, relative)) as entries:
+        for entry in entries:
+            path = os.path.join(relative, entry.name)
+            if entry.is_dir():
+                yield from _scan_files(root, path)
+            elif entry.is_file():
+                yield path, entry.stat()
+
+
+def _is_unchanged(source: str, source_stat: os.stat_result, dest: str):
+    # Same size and mtime means unchanged. When only the mtime differs, fall back
+    # to comparing content hashes, and carry the mtime over if they match
+    try:
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        return False
+    if dest_stat.st_size != source_stat.st_size:
+        return False
+    if dest_stat.st_mtime_ns == source_stat.st_mtime_ns:
+        return True
+    if hash_file(source) != hash_file(dest):
+        return False
+    os.utime(dest, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+    return True
+
+
+def copy_file(source: str, dest: str, link: bool = False):
+    """
+    Copies a single file, preserving its modification time.
+
+    With `link`, the destination is hardlinked to the source where possible.
+    Otherwise the data is copied in the kernel with `os.copy_file_range`, or
+    with `shutil.copyfile` (which uses `sendfile` where available).
+
+    Parameters
+    ----------
+    source : str
+        The file to copy.
+    dest : str
+        The path to copy it to. Its parent directory must exist.
+    link : bool, optional
+        Hardlink instead of copying. The default is False.
+    """
+    if os.path.lexists(dest):
+        os.remove(dest)
+
+    if link:
+        try:
+            os.link(source, dest)
+            return
+        except OSError:
+            logging.info(f"Could not hardlink '{source}', copying instead")
+
+    copied = False
+    if hasattr(os, "copy_file_range"):
+        with open(source, "rb") as fsrc, open(dest, "wb") as fdst:
+            remaining = os.fstat(fsrc.fileno()).st_size
+            try:
+                while remaining > 0:
+                    count = os.copy_file_range(fsrc.fileno(), fdst.fileno(), remaining)
+                    if count == 0:
+                        break
+                    remaining -= count
+                copied = remaining == 0
+            except OSError:
+                copied = False
+    if not copied:
+        shutil.copyfile(source, dest)
+
+    source_stat = os.stat(source)
+    os.utime(dest, ns=(source_stat.st_atime_ns, source_stat.st_mtime_ns))
+
+
+def sync_tree(
+    source: str,
+    destination: str,
+    previous: list = None,
+    link: bool = False,
+    jobs: int = 8,
+):
+    """
+    Brings a destination tree in line with a source tree, copying only the
+    files that changed.
+
+    Files are compared by size and modification time, and by content hash when
+    only the modification time differs. Files that the previous sync copied
+    but which are no longer in the source are pruned, so that other files in
+    the destination (such as generated pages) are left alone.
+
+    Parameters
+    ----------
+    source : str
+        The source directory.
+    destination : str
+        The destination directory. It is created if needed.
+    previous : list, optional
+        The `files` of the previous sync, used for pruning. The default is None.
+    link : bool, optional
+        Hardlink files instead of copying them. The default is False.
+    jobs : int, optional
+        The number of threads used to copy large trees. The default is 8.
+
+    Returns
+    -------
+    SyncResult
+        What the sync did.
+    """
+    if not os.path.exists(source):
+        logging.error(f"Source '{source}' does not exist. Exiting.")
+        raise Exception(f"Source {source} does not exist. Exiting.")
+
+    result = SyncResult()
+    to_copy = []
+    created = set()
+    for path, source_stat in _scan_files(source):
+        result.files.append(path)
+        dest = os.path.join(destination, path)
+        if _is_unchanged(os.path.join(source, path), source_stat, dest):
+            result.unchanged.append(path)
+            continue
+
+        dest_dir = os.path.dirname(dest)
+        if dest_dir not in created:
+            os.makedirs(dest_dir, exist_ok=True)
+            created.add(dest_dir)
+        to_copy.append(path)
+
+    def copy(path):
+        logging.info(f"Copying '{os.path.join(source, path)}'")
+        copy_file(os.path.join(source, path), os.path.join(destination, path), link)
+
+    if jobs > 1 and len(to_copy) >= PARALLEL_COPY_THRESHOLD:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            list(pool.map(copy, to_copy))
+    else:
+        for path in to_copy:
+            copy(path)
+    result.copied = to_copy
+
+    for path in sorted(set(previous or []) - set(result.files)):
+        dest = os.path.join(destination, path)
+        if os.path.exists(dest):
+            logging.info(f"Pruning stale asset '{dest}'")
+            os.remove(dest)
+            result.pruned.append(path)
+            _remove_empty_parents(os.path.dirname(dest), destination)
+
+    return result
+
+
+def _remove_empty_parents(directory: str, root: str):
+    # Remove directories emptied by pruning, stopping at the root
+    root = os.path.normpath(root)
+    directory = os.path.normpath(directory)
+    while directory != root and directory.startswith(root + os.sep):
+        if os.listdir(directory):
+            return
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
@@ -0,0 +1,170 @@
+import io, os, re, threading
+
+# Placeholders look like "{{ Title }}"
+SLOT_PATTERN = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+# A template with this name in a content directory is used for every page in
+# that directory and below it, instead of the default template
+TEMPLATE_NAME = "template.html"
+
+
+class Template:
+    def __init__(self, text: str):
+        """
+        Parses template text into static segments and named slots.
+
+        Parameters
+        ----------
+        text : str
+            The template text, with placeholders such as "{{ Title }}".
+        """
+        # self.parts alternates static text and slot names, starting and ending
+        # with static text: [static, slot, static, slot, ..., static]
+        self.parts = SLOT_PATTERN.split(text)
+        self.slots = set(self.parts[1::2])
+        self._placeholders = {
+            match.group(1): match.group(0) for match in SLOT_PATTERN.finditer(text)
+        }
+
+    def map_static(self, function):
+        """
+        Returns a new Template whose static segments are those of this one
+        passed through a function, with the same slots.
+        """
+        copy = Template("")
+        copy.parts = [
+            part if i % 2 else function(part) for i, part in enumerate(self.parts)
+        ]
+        copy.slots = self.slots
+        copy._placeholders = self._placeholders
+        return copy
+
+    def render_to(self, sink, values: dict):
+        """
+        Writes the filled template to a sink.
+
+        Static segments and string values are handed to the sink with
+        `writelines`, without joining them first. A callable value is called
+        with the sink instead, so that it can stream its own output, such as
+        `HTMLNode.write_html`. Slots without a value are written unchanged.
+
+        Parameters
+        ----------
+        sink : file-like
+            Any object with `write(str)` and `writelines(iterable)` methods.
+        values : dict
+            The value of each slot, keyed by slot name.
+        """
+        pending = [self.parts[0]]
+        for i in range(1, len(self.parts), 2):
+            name = self.parts[i]
+            value = values.get(name, self._placeholders[name])
+            if callable(value):
+                sink.writelines(pending)
+                pending = []
+                value(sink)
+            else:
+                pending.append(value)
+            pending.append(self.parts[i + 1])
+        sink.writelines(pending)
+
+    def render(self, values: dict):
+        """
+        Fills the template.
+
+        Returns
+        -------
+        str
+            The filled template.
+        """
+        buffer = io.StringIO()
+        self.render_to(buffer, values)
+        return buffer.getvalue()
+
+
+_cache = {}
+_cache_lock = threading.Lock()
+
+
+def load_template(path: str, loaded: dict = None):
+    """
+    Loads and parses a template file, reusing the parsed template for as long
+    as the file's modification time and size are unchanged.
+
+    Parameters
+    ----------
+    path : str
+        The template file.
+    loaded : dict, optional
+        The templates already loaded in this build, keyed by path, so that
+        each template file is only checked once per build rather than once
+        per page. The default is None.
+
+    Returns
+    -------
+    Template
+        The parsed template.
+    """
+    if loaded is not None and path in loaded:
+        return loaded[path]
+    template = _load_template(path)
+    if loaded is not None:
+        loaded[path] = template
+    return template
+
+
+def _load_template(path: str):
+    stat = os.stat(path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+
+    with open(path, "r") as f:
+        template = Template(f.read())
+    with _cache_lock:
+        _cache[path] = (key, template)
+    return template
+
+
+def find_template(directory: str, content_root: str, default: str, found: dict = None):
+    """
+    Finds the template for the pages in a content directory: the nearest
+    TEMPLATE_NAME file in the directory or one of its parents up to the content
+    root, or the default template if there is none.
+
+    Parameters
+    ----------
+    directory : str
+        The content directory of the page.
+    content_root : str
+        The root of the content tree. Parents above it are not searched.
+    default : str
+        The template to use when no directory provides one.
+    found : dict, optional
+        Results of earlier lookups in this build, keyed by directory, so that
+        each directory is only checked once. The default is None.
+
+    Returns
+    -------
+    str
+        The path of the template.
+    """
+    if found is not None and directory in found:
+        return found[directory]
+
+    candidate = os.path.join(directory, TEMPLATE_NAME)
+    if os.path.isfile(candidate):
+        template = candidate
+    elif os.path.normpath(directory) == os.path.normpath(content_root) or (
+        os.path.dirname(directory) == directory
+    ):
+        template = default
+    else:
+        template = find_template(
+            os.path.dirname(directory), content_root, default, found
+        )
+
+    if found is not None:
+        found[directory] = template
+    return template
@@ -0,0 +1,158 @@
+import unittest, os, json, struct, zlib
+from assets import (
+    AssetManifest,
+    ASSET_MANIFEST_NAME,
+    fingerprint_assets,
+    fingerprinted_name,
+    image_size,
+)
+from template import Template
+from blockcache import BlockCache
+from fixtures import TreeTestCase
+from utils import markdown_to_html, markdown_to_html_node
+
+PNG = (
+    b"\x89PNG\r\n\x1a\n"
+    + struct.pack(">I", 13)
+    + b"IHDR"
+    + struct.pack(">IIBBBBB", 640, 480, 8, 2, 0, 0, 0)
+    + struct.pack(">I", zlib.crc32(b"IHDR"))
+)
+GIF = b"GIF89a" + struct.pack("<HH", 32, 16) + b"\x00" * 16
+# SOI, an APP0 segment and a baseline SOF0 frame of 300x200
+JPEG = (
+    b"\xff\xd8"
+    + b"\xff\xe0"
+    + struct.pack(">H", 16)
+    + b"JFIF\x00"
+    + b"\x00" * 9
+    + b"\xff\xc0"
+    + struct.pack(">HBHHB", 11, 8, 200, 300, 1)
+    + b"\x01\x11\x00"
+)
+
+DIGEST = "3fa9c1d2" + "0" * 56
+FILES = {
+    os.path.join("images", "rivendell.png"): [0, 10, DIGEST, 1344, 896],
+    "index.css": [0, 10, "a" * 64, None, None],
+}
+
+
+class TestImageSize(TreeTestCase):
+    def size_of(self, data: bytes):
+        return image_size(self.write("image", data))
+
+    def test_png(self):
+        self.assertEqual((640, 480), self.size_of(PNG))
+
+    def test_gif(self):
+        self.assertEqual((32, 16), self.size_of(GIF))
+
+    def test_jpeg(self):
+        self.assertEqual((300, 200), self.size_of(JPEG))
+
+    def test_not_an_image(self):
+        self.assertIsNone(self.size_of(b"body { color: red; }"))
+        self.assertIsNone(self.size_of(JPEG[:20]))
+
+
+class TestAssetManifest(unittest.TestCase):
+    def setUp(self):
+        self.assets = AssetManifest(FILES)
+
+    def test_fingerprinted_name(self):
+        self.assertEqual(
+            os.path.join("images", "rivendell.3fa9c1d2.png"),
+            fingerprinted_name(os.path.join("images", "rivendell.png"), DIGEST),
+        )
+
+    def test_url(self):
+        self.assertEqual(
+            "/images/rivendell.3fa9c1d2.png", self.assets.url("/images/rivendell.png")
+        )
+        self.assertEqual("/index.aaaaaaaa.css?v=1", self.assets.url("/index.css?v=1"))
+        for url in ["/other.png", "images/rivendell.png", "https://x.org/index.css"]:
+            self.assertEqual(url, self.assets.url(url))
+
+    def test_template(self):
+        template = Template('<link href="/index.css" rel="stylesheet" />{{ Content }}')
+        rewritten = self.assets.template(template)
+        self.assertIs(rewritten, self.assets.template(template))
+        self.assertEqual(
+            '<link href="/index.aaaaaaaa.css" rel="stylesheet" /><p>x</p>',
+            rewritten.render({"Content": "<p>x</p>"}),
+        )
+
+    def test_rendering(self):
+        markdown = "![Rivendell](/images/rivendell.png) and [style](/index.css)"
+        expected = (
+            '<div><div><p><img src="/images/rivendell.3fa9c1d2.png" alt="Rivendell" '
+            'width="1344" height="896"></img> and '
+            '<a href="/index.aaaaaaaa.css">style</a></p></div></div>'
+        )
+        self.assertEqual(expected, markdown_to_html(markdown, assets=self.assets))
+        node = markdown_to_html_node(markdown, assets=self.assets)
+        self.assertEqual(expected, node.to_html())
+        self.assertIn('src="/images/rivendell.png"', markdown_to_html(markdown))
+
+    def test_shared_block_cache(self):
+        # Blocks rendered with a manifest are cached apart from plain ones
+        markdown = "![Rivendell](/images/rivendell.png)"
+        cache = BlockCache()
+        fingerprinted = markdown_to_html(markdown, cache, assets=self.assets)
+        self.assertIn("rivendell.3fa9c1d2.png", fingerprinted)
+        self.assertIn('src="/images/rivendell.png"', markdown_to_html(markdown, cache))
+        self.assertEqual(
+            fingerprinted, markdown_to_html(markdown, cache, assets=self.assets)
+        )
+
+
+class TestFingerprintAssets(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.static = os.path.join(self.root, "static")
+        self.output = os.path.join(self.root, "public")
+        self.write(os.path.join("images", "a.png"), PNG)
+        self.write("index.css", b"body {}")
+
+    def write(self, path: str, data: bytes):
+        # Each file is written to the static tree and synced to the output
+        for root in [self.static, self.output]:
+            super().write(os.path.join(root, path), data)
+
+    def test_fingerprint_assets(self):
+        first = fingerprint_assets(self.static, self.output)
+        png = os.path.join("images", "a.png")
+        name = fingerprinted_name(png, first.files[png][2])
+        with open(os.path.join(self.output, name), "rb") as f:
+            self.assertEqual(PNG, f.read())
+        self.assertEqual((640, 480), first.size("/images/a.png"))
+        with open(os.path.join(self.output, ASSET_MANIFEST_NAME)) as f:
+            self.assertEqual("/" + name, json.load(f)["/images/a.png"])
+
+        second = fingerprint_assets(self.static, self.output, previous=first.files)
+        self.assertEqual([], second.fingerprinted)
+        self.assertEqual([], second.changed)
+
+        self.write("index.css", b"body { color: red; }")
+        third = fingerprint_assets(self.static, self.output, previous=second.files)
+        self.assertEqual(["/index.css"], third.changed)
+        self.assertEqual(
+            [fingerprinted_name("index.css", first.files["index.css"][2])],
+            third.removed,
+        )
+        self.assertTrue(os.path.exists(os.path.join(self.output, name)))
+
+    def test_references_changed(self):
+        template = os.path.join(self.root, "template.html")
+        with open(template, "w") as f:
+            f.write('<link href="/index.css" rel="stylesheet" />{{ Content }}')
+        first = fingerprint_assets(self.static, self.output)
+        self.assertTrue(first.references_changed(template))
+        self.write(os.path.join("images", "a.png"), GIF)
+        second = fingerprint_assets(self.static, self.output, previous=first.files)
+        self.assertFalse(second.references_changed(template))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,112 @@
+import unittest, pickle, threading
+from blockcache import BlockCache
+from utils import markdown_to_html, markdown_to_html_node, render_markdown
+
+MARKDOWN = """# Title
+
+This is **bold** and _italic_ with a [link](https://example.com)
+
+- one
+- two
+
+```
+code
+```
+
+This is **bold** and _italic_ with a [link](https://example.com)"""
+
+
+class TestBlockCache(unittest.TestCase):
+    def test_hit_and_miss(self):
+        cache = BlockCache()
+        key = cache.key("a block")
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "<p>a block</p>")
+        self.assertEqual(cache.get(key), "<p>a block</p>")
+        stats = cache.stats()
+        self.assertEqual((stats["hits"], stats["misses"]), (1, 1))
+        self.assertEqual(stats["hit_rate"], 0.5)
+
+    def test_key_depends_on_text(self):
+        self.assertEqual(BlockCache.key("same"), BlockCache.key("same"))
+        self.assertNotEqual(BlockCache.key("same"), BlockCache.key("other"))
+
+    def test_evicts_least_recently_used_entry(self):
+        cache = BlockCache(max_entries=2)
+        cache.put(b"a", "A")
+        cache.put(b"b", "B")
+        cache.get(b"a")
+        cache.put(b"c", "C")
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get(b"b"))
+        self.assertEqual(cache.get(b"a"), "A")
+        self.assertEqual(cache.stats()["evictions"], 1)
+
+    def test_evicts_on_byte_limit(self):
+        html = "x" * 1000
+        cache = BlockCache(max_bytes=2500)
+        for i in range(5):
+            cache.put(bytes([i]), html)
+        self.assertEqual(len(cache), 2)
+        self.assertLessEqual(cache.stats()["bytes"], 2500)
+
+    def test_skips_entries_larger_than_the_limit(self):
+        cache = BlockCache(max_bytes=100)
+        cache.put(b"big", "x" * 1000)
+        self.assertEqual(len(cache), 0)
+
+    def test_threads(self):
+        cache = BlockCache(max_entries=50)
+
+        def work(offset):
+            for i in range(1000):
+                key = cache.key(str((i + offset) % 100))
+                if cache.get(key) is None:
+                    cache.put(key, str(i))
+
+        threads = [threading.Thread(target=work, args=(n,)) for n in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = cache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 8000)
+        self.assertLessEqual(len(cache), 50)
+
+    def test_pickle_keeps_limits_only(self):
+        cache = BlockCache(max_entries=10, max_bytes=1000)
+        cache.put(b"a", "A")
+        copy = pickle.loads(pickle.dumps(cache))
+        self.assertEqual((copy.max_entries, copy.max_bytes), (10, 1000))
+        self.assertEqual(len(copy), 0)
+
+    def test_markdown_to_html_same_output(self):
+        cache = BlockCache()
+        expected = markdown_to_html(MARKDOWN)
+        self.assertEqual(markdown_to_html(MARKDOWN, cache), expected)
+        self.assertEqual(markdown_to_html(MARKDOWN, cache), expected)
+        # The repeated paragraph hits on the first page, every block on the second
+        self.assertEqual(cache.stats()["hits"], 6)
+
+    def test_markdown_to_html_node_same_output(self):
+        cache = BlockCache()
+        expected = markdown_to_html_node(MARKDOWN).to_html()
+        for _ in range(2):
+            node = markdown_to_html_node(MARKDOWN, cache=cache)
+            self.assertEqual(node.to_html(), expected)
+        self.assertEqual(cache.stats()["hits"], 6)
+
+
+    def test_shared_with_render_markdown(self):
+        # Blocks cached by markdown_to_html_node keep their references
+        cache = BlockCache()
+        markdown_to_html_node(MARKDOWN, cache=cache)
+        references = []
+        html, _ = render_markdown(MARKDOWN, cache, references)
+        self.assertEqual(markdown_to_html(MARKDOWN), html)
+        self.assertEqual([("https://example.com", False)] * 2, references)
+        self.assertEqual(cache.stats()["misses"], 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+import unittest, os, gzip
+from compress import compress_tree, compress_file, is_compressible, remove_siblings
+from fixtures import TreeTestCase
+
+HTML = "<html>" + "<p>All that is gold does not glitter</p>" * 100 + "</html>"
+
+
+class TestCompress(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.write("index.html", HTML)
+        self.write(os.path.join("blog", "post.html"), HTML)
+        self.write("small.css", "body {}")
+        self.write("image.png", HTML)
+        # Random bytes don't compress
+        self.write("random.txt", os.urandom(4096).decode("latin-1"))
+
+    def write(self, path: str, text: str):
+        return super().write(path, text, encoding="latin-1")
+
+    def exists(self, path: str):
+        return os.path.exists(os.path.join(self.root, path))
+
+    def test_is_compressible(self):
+        self.assertTrue(is_compressible("a/b.HTML"))
+        self.assertFalse(is_compressible("a/b.png"))
+
+    def test_compress_tree(self):
+        result = compress_tree(self.root, jobs=2)
+        post = os.path.join("blog", "post.html")
+        self.assertEqual([post, "index.html"], sorted(result.compressed))
+        self.assertEqual(["random.txt", "small.css"], sorted(result.skipped))
+        with gzip.open(os.path.join(self.root, post + ".gz"), "rt") as f:
+            self.assertEqual(HTML, f.read())
+        self.assertEqual(
+            os.stat(os.path.join(self.root, post)).st_mtime_ns,
+            os.stat(os.path.join(self.root, post + ".gz")).st_mtime_ns,
+        )
+        for path in ["small.css.gz", "image.png.gz", "random.txt.gz"]:
+            self.assertFalse(self.exists(path))
+
+    def test_only_changed_files_are_recompressed(self):
+        first = compress_tree(self.root)
+        self.write("index.html", HTML + "<!-- edited -->")
+        os.remove(os.path.join(self.root, "blog", "post.html.gz"))
+        second = compress_tree(self.root, previous=first.files)
+        post = os.path.join("blog", "post.html")
+        self.assertEqual([post, "index.html"], sorted(second.compressed))
+        third = compress_tree(self.root, previous=second.files)
+        self.assertEqual([], third.compressed)
+        # random.txt was tried and rejected before, and isn't tried again
+        self.assertEqual(3, len(third.unchanged))
+
+    def test_stale_siblings_are_removed(self):
+        first = compress_tree(self.root)
+        os.remove(os.path.join(self.root, "index.html"))
+        self.write(os.path.join("blog", "post.html"), "tiny")
+        result = compress_tree(self.root, previous=first.files)
+        post = os.path.join("blog", "post.html.gz")
+        self.assertEqual([post, "index.html.gz"], sorted(result.removed))
+        self.assertFalse(self.exists("index.html.gz"))
+        self.assertFalse(self.exists(os.path.join("blog", "post.html.gz")))
+
+    def test_other_gz_files_are_kept(self):
+        # Compressed assets that compress_tree didn't write, with or without
+        # an original next to them
+        self.write("archive.tar.gz", "not ours")
+        self.write("small.css.gz", "not ours either")
+        first = compress_tree(self.root)
+        second = compress_tree(self.root, previous=first.files)
+        self.assertEqual([], first.removed + second.removed)
+        self.assertTrue(self.exists("archive.tar.gz"))
+        self.assertTrue(self.exists("small.css.gz"))
+
+    def test_remove_siblings(self):
+        self.write("archive.tar.gz", "not ours")
+        result = compress_tree(self.root)
+        removed = remove_siblings(self.root, result.files)
+        self.assertEqual(
+            [os.path.join("blog", "post.html.gz"), "index.html.gz"], sorted(removed)
+        )
+        self.assertFalse(self.exists("index.html.gz"))
+        self.assertTrue(self.exists("archive.tar.gz"))
+
+    def test_deterministic(self):
+        path = os.path.join(self.root, "index.html")
+        compress_file(path)
+        with open(path + ".gz", "rb") as f:
+            first = f.read()
+        os.utime(path, ns=(0, 0))
+        compress_file(path)
+        with open(path + ".gz", "rb") as f:
+            self.assertEqual(first, f.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
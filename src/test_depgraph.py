@@ -0,0 +1,101 @@
+import unittest, os
+from depgraph import resolve_reference, reference_dependencies
+from blockcache import BlockCache
+from utils import render_markdown
+from fixtures import TreeTestCase
+
+
+class TestResolveReference(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.static = os.path.join(self.root, "static")
+        for path in [
+            os.path.join(self.content, "index.md"),
+            os.path.join(self.content, "about.md"),
+            os.path.join(self.content, "blog", "index.md"),
+            os.path.join(self.content, "blog", "post.md"),
+            os.path.join(self.static, "images", "ring.png"),
+            os.path.join(self.static, "blog", "map.png"),
+        ]:
+            self.write(path, "# Page\n\n[home](/) ![ring](/images/ring.png)")
+        self.page = os.path.join(self.content, "blog", "post.md")
+
+    def resolve(self, url: str, image: bool = False):
+        return resolve_reference(url, self.page, self.content, self.static, image)
+
+    def test_site_paths(self):
+        self.assertEqual(os.path.join(self.content, "index.md"), self.resolve("/"))
+        self.assertEqual(os.path.join(self.content, "about.md"), self.resolve("/about"))
+        self.assertEqual(
+            os.path.join(self.content, "about.md"), self.resolve("/about.html#team")
+        )
+        self.assertEqual(
+            os.path.join(self.content, "blog", "index.md"), self.resolve("/blog/")
+        )
+        self.assertEqual(
+            os.path.join(self.static, "images", "ring.png"),
+            self.resolve("/images/ring.png", image=True),
+        )
+
+    def test_relative_paths(self):
+        self.assertEqual(
+            os.path.join(self.static, "blog", "map.png"),
+            self.resolve("map.png", image=True),
+        )
+        self.assertEqual(
+            os.path.join(self.content, "about.md"), self.resolve("../about")
+        )
+
+    def test_unresolved(self):
+        for url in ["https://example.com/", "#top", "/missing", "../../../etc/passwd"]:
+            self.assertIsNone(self.resolve(url))
+
+    def test_reference_dependencies(self):
+        references = [("/", False), ("/images/ring.png", True)]
+        # Only the content of static assets matters
+        self.assertEqual(
+            {
+                os.path.join(self.content, "index.md"): False,
+                os.path.join(self.static, "images", "ring.png"): True,
+            },
+            reference_dependencies(references, self.page, self.content, self.static),
+        )
+        # A page's own source is not a dependency
+        home = os.path.join(self.content, "index.md")
+        self.assertEqual(
+            {os.path.join(self.static, "images", "ring.png"): True},
+            reference_dependencies(references, home, self.content, self.static),
+        )
+
+    def test_unresolved_references(self):
+        references = [
+            ("/images/new.png", True),
+            ("/new", False),
+            ("https://example.com/", False),
+        ]
+        # Every file that would resolve them once created
+        self.assertEqual(
+            {
+                os.path.join(self.static, "images", "new.png"): True,
+                os.path.join(self.content, "images", "new.png.md"): False,
+                os.path.join(self.content, "images", "new.png", "index.md"): False,
+                os.path.join(self.content, "new.md"): False,
+                os.path.join(self.content, "new", "index.md"): False,
+                os.path.join(self.static, "new"): True,
+            },
+            reference_dependencies(references, self.page, self.content, self.static),
+        )
+
+    def test_rendering_collects_references(self):
+        markdown = "# Page\n\n[home](/) ![ring](/images/ring.png)\n\n`[no](/about)`"
+        cache = BlockCache()
+        for _ in range(2):
+            # The second render takes every block from the cache
+            references = []
+            render_markdown(markdown, cache, references)
+            self.assertEqual([("/", False), ("/images/ring.png", True)], references)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,5 +1,5 @@
-import unittest
-from htmlnode import HTMLNode, LeafNode, ParentNode
+import unittest, io
+from htmlnode import HTMLNode, LeafNode, ParentNode, OPEN_TAGS, CLOSE_TAGS
 
 
 class TestHTMLNode(unittest.TestCase):
@@ -116,6 +116,54 @@ class TestHTMLNode(unittest.TestCase):
             '<p><b><i>italic text</i><i>more italic text</i></b><b class="my-class">Bold text</b><p class="my-class">Normal text</p></p>',
         )
 
+    def test_write_html_matches_to_html(self):
+        node = ParentNode(
+            "p",
+            [
+                ParentNode("b", [LeafNode("i", "italic text")]),
+                LeafNode(None, "Normal text"),
+                LeafNode("a", "link", props={"href": "https://www.boot.dev"}),
+            ],
+        )
+        sink = io.StringIO()
+        node.write_html(sink)
+        self.assertEqual(node.to_html(), sink.getvalue())
+
+    def test_write_html_writes_chunks(self):
+        chunks = []
+
+        class ListSink:
+            def write(self, chunk):
+                chunks.append(chunk)
+
+        ParentNode("p", [LeafNode("b", "Bold"), LeafNode(None, "text")]).write_html(
+            ListSink()
+        )
+        self.assertEqual(["<p>", "<b>Bold</b>", "text", "</p>"], chunks)
+
+    def test_deep_tree_to_html(self):
+        node = LeafNode(None, "x")
+        for _ in range(200):
+            node = ParentNode("span", [node])
+        self.assertEqual("<span>" * 200 + "x" + "</span>" * 200, node.to_html())
+
+    def test_nodes_have_no_instance_dict(self):
+        for node in [
+            HTMLNode("div"),
+            LeafNode("b", "Bold"),
+            ParentNode("p", [LeafNode(None, "text")]),
+        ]:
+            self.assertFalse(hasattr(node, "__dict__"))
+
+    def test_tag_tables(self):
+        self.assertEqual("<li>", OPEN_TAGS["li"])
+        self.assertEqual("</custom-tag>", CLOSE_TAGS["custom-tag"])
+        self.assertIn("custom-tag", CLOSE_TAGS)
+        node = ParentNode("custom-tag", [LeafNode("custom-leaf", "x")])
+        self.assertEqual(
+            "<custom-tag><custom-leaf>x</custom-leaf></custom-tag>", node.to_html()
+        )
+
 
 if __name__ == "__main__":
     unittest.main()
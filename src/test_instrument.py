@@ -0,0 +1,92 @@
+import unittest, os
+from unittest import mock
+from instrument import BuildStats, capture, STAGES
+from utils import generate_page, markdown_to_html_node
+from fixtures import TreeTestCase
+
+MARKDOWN = """# Title
+
+Some **bold** text.
+
+- one
+- two
+
+```
+code
+```"""
+
+
+class TestBuildStats(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = self.write("index.md", MARKDOWN)
+        self.template = self.write(
+            "template.html", "<title>{{ Title }}</title>{{ Content }}"
+        )
+
+    def test_instrumented_output_matches(self):
+        plain = os.path.join(self.root, "plain.html")
+        instrumented = os.path.join(self.root, "instrumented.html")
+        generate_page(self.source, self.template, plain)
+        generate_page(self.source, self.template, instrumented, stats=BuildStats())
+        self.assertEqual(self.read(plain), self.read(instrumented))
+        self.assertEqual(
+            markdown_to_html_node(MARKDOWN).to_html(),
+            markdown_to_html_node(MARKDOWN, BuildStats()).to_html(),
+        )
+
+    def test_every_stage_is_recorded(self):
+        stats = BuildStats()
+        generate_page(self.source, self.template, self.source + ".html", stats=stats)
+        report = stats.report()
+        # The stages of the tree-free path that builds render pages with
+        self.assertEqual(
+            ["read", "block_split", "block_classification", "inline_parse"]
+            + ["template_fill", "write"],
+            list(report["stages"]),
+        )
+        self.assertTrue(set(report["stages"]) <= set(STAGES))
+        self.assertEqual(4, report["stages"]["block_classification"]["count"])
+        # One inline parse per list item, one for every other block
+        self.assertEqual(5, report["stages"]["inline_parse"]["count"])
+        self.assertEqual(
+            {"h1", "paragraph", "unordered_list", "code"}, set(report["block_types"])
+        )
+        self.assertEqual(self.source, report["slowest_pages"][0]["source"])
+
+    def test_large_pages_stream(self):
+        stats = BuildStats()
+        plain = os.path.join(self.root, "plain.html")
+        streamed = os.path.join(self.root, "streamed.html")
+        generate_page(self.source, self.template, plain)
+        with mock.patch("utils.STREAM_THRESHOLD", 0):
+            generate_page(self.source, self.template, streamed, stats=stats)
+        self.assertEqual(self.read(plain), self.read(streamed))
+        report = stats.report()
+        self.assertNotIn("read", report["stages"])
+        self.assertEqual(4, report["stages"]["block_classification"]["count"])
+        self.assertEqual(1, report["pages"])
+
+    def test_merge(self):
+        first, second = BuildStats(), BuildStats()
+        first.stop("read", first.start())
+        second.stop("read", second.start(), count=2)
+        first.add_page("a.md", 1.0)
+        second.add_page("b.md", 2.0)
+        first.merge(second)
+        self.assertEqual(3, first.stages["read"][1])
+        self.assertEqual(
+            ["b.md", "a.md"], [p["source"] for p in first.report()["slowest_pages"]]
+        )
+
+    def test_capture(self):
+        stats = BuildStats()
+        profile = os.path.join(self.root, "build.prof")
+        with capture(stats, profile=profile, trace_memory=True):
+            generate_page(self.source, self.template, self.source + ".html")
+        self.assertTrue(os.path.exists(profile))
+        self.assertGreater(stats.report()["memory"]["peak_bytes"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,207 @@
+import unittest, os
+from manifest import BuildManifest, PRESENT, hash_file
+from utils import generate_pages_recursive
+from fixtures import TreeTestCase
+
+
+class ManifestTestCase(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.public = os.path.join(self.root, "public")
+        self.template = os.path.join(self.root, "template.html")
+        self.static = os.path.join(self.root, "static")
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+        os.makedirs(os.path.join(self.content, "nested"))
+        os.makedirs(os.path.join(self.static, "images"))
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "nested", "index.md"), "# Nested")
+
+    def build(self):
+        manifest = BuildManifest.load(self.manifest_path, "test")
+        generate_pages_recursive(
+            self.content,
+            self.template,
+            self.public,
+            manifest=manifest,
+            static_path=self.static,
+        )
+        removed = manifest.prune()
+        manifest.save()
+        return manifest, removed
+
+
+class TestBuildManifest(ManifestTestCase):
+    def output_mtimes(self):
+        return {
+            path: os.stat(os.path.join(self.public, path)).st_mtime_ns
+            for path in ["index.html", os.path.join("nested", "index.html")]
+        }
+
+    def test_hash_file(self):
+        self.assertEqual(hash_file(self.template), hash_file(self.template))
+        self.assertNotEqual(
+            hash_file(self.template),
+            hash_file(os.path.join(self.content, "index.md")),
+        )
+
+    def test_first_build_records_every_page(self):
+        manifest, _ = self.build()
+        self.assertEqual(2, len(manifest.pages))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+
+    def test_unchanged_pages_are_skipped(self):
+        self.build()
+        os.remove(os.path.join(self.public, "index.html"))
+        self.write(os.path.join(self.public, "index.html"), "sentinel")
+        before = self.output_mtimes()
+        self.build()
+        self.assertEqual(before, self.output_mtimes())
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertEqual("sentinel", f.read())
+
+    def test_changed_source_is_rebuilt(self):
+        self.build()
+        self.write(os.path.join(self.content, "index.md"), "# Changed")
+        self.build()
+        with open(os.path.join(self.public, "index.html")) as f:
+            self.assertIn("Changed", f.read())
+
+    def test_template_change_rebuilds_every_page(self):
+        self.build()
+        self.write(self.template, "<h1>{{ Title }}</h1>{{ Content }}")
+        self.build()
+        for path in ["index.html", os.path.join("nested", "index.html")]:
+            with open(os.path.join(self.public, path)) as f:
+                self.assertTrue(f.read().startswith("<h1>"))
+
+    def test_missing_output_is_rebuilt(self):
+        self.build()
+        os.remove(os.path.join(self.public, "index.html"))
+        self.build()
+        self.assertTrue(os.path.exists(os.path.join(self.public, "index.html")))
+
+    def test_removed_source_output_is_deleted(self):
+        self.build()
+        os.remove(os.path.join(self.content, "nested", "index.md"))
+        manifest, removed = self.build()
+        output = os.path.join(self.public, "nested", "index.html")
+        self.assertEqual([output], removed)
+        self.assertFalse(os.path.exists(output))
+        self.assertEqual(1, len(manifest.pages))
+
+    def test_invalidate_rebuilds_and_still_prunes(self):
+        self.build()
+        os.remove(os.path.join(self.content, "nested", "index.md"))
+        manifest = BuildManifest.load(self.manifest_path, "test")
+        manifest.invalidate()
+        generate_pages_recursive(
+            self.content, self.template, self.public, manifest=manifest
+        )
+        self.assertEqual(
+            [os.path.join(self.public, "nested", "index.html")], manifest.prune()
+        )
+
+    def test_parser_version_change_rebuilds(self):
+        self.build()
+        manifest = BuildManifest.load(self.manifest_path, "other")
+        entry = manifest.entry_for(
+            os.path.join(self.content, "index.md"),
+            self.template,
+            os.path.join(self.public, "index.html"),
+        )
+        self.assertEqual(["parser version changed"], manifest.changes(entry))
+
+
+class TestDependencyInvalidation(ManifestTestCase):
+    def setUp(self):
+        super().setUp()
+        self.image = os.path.join(self.static, "images", "ring.png")
+        self.write(self.image, "one ring")
+        self.write(
+            os.path.join(self.content, "index.md"),
+            "# Home\n\n![The ring](/images/ring.png) and [more](/nested)",
+        )
+        self.write(os.path.join(self.content, "other.md"), "# Other")
+
+    def test_dependencies_are_recorded(self):
+        manifest, _ = self.build()
+        entry = manifest.pages[os.path.join(self.content, "index.md")]
+        # "nested.md" would serve /nested in place of "nested/index.md"
+        self.assertEqual(
+            sorted(entry["dependencies"]),
+            [
+                os.path.join(self.content, "nested.md"),
+                os.path.join(self.content, "nested", "index.md"),
+                self.image,
+            ],
+        )
+        self.assertIsNone(
+            entry["dependencies"][os.path.join(self.content, "nested.md")]
+        )
+        self.assertEqual(
+            PRESENT,
+            entry["dependencies"][os.path.join(self.content, "nested", "index.md")],
+        )
+        self.assertEqual(
+            {os.path.join(self.content, "index.md")}, manifest.dependents([self.image])
+        )
+
+    def test_asset_change_rebuilds_only_dependent_pages(self):
+        self.build()
+        self.write(self.image, "two rings")
+        manifest, _ = self.build()
+        index = os.path.join(self.content, "index.md")
+        self.assertEqual(
+            {index: [f"dependency {self.image} changed"]}, manifest.rebuilt
+        )
+
+    def test_missing_asset_rebuilds_once_added(self):
+        other = os.path.join(self.content, "other.md")
+        self.write(other, "# Other\n\n![new](/images/new.png)")
+        self.build()
+        new = os.path.join(self.static, "images", "new.png")
+        self.write(new, "new")
+        manifest, _ = self.build()
+        self.assertEqual({other: [f"dependency {new} changed"]}, manifest.rebuilt)
+
+    def test_linked_page_edit_leaves_linking_page(self):
+        self.build()
+        nested = os.path.join(self.content, "nested", "index.md")
+        self.write(nested, "# Nested, edited")
+        manifest, _ = self.build()
+        self.assertEqual({nested}, set(manifest.rebuilt))
+        self.assertEqual(set(), manifest.outdated_dependents([nested]))
+
+    def test_linked_page_removal_rebuilds_linking_page(self):
+        self.build()
+        nested = os.path.join(self.content, "nested", "index.md")
+        index = os.path.join(self.content, "index.md")
+        os.remove(nested)
+        manifest = BuildManifest.load(self.manifest_path, "test")
+        self.assertEqual({index}, manifest.outdated_dependents([nested]))
+        manifest, _ = self.build()
+        self.assertEqual({index: [f"dependency {nested} changed"]}, manifest.rebuilt)
+
+    def test_why_rebuilt(self):
+        self.build()
+        self.write(self.image, "two rings")
+        self.build()
+        manifest = BuildManifest.load(self.manifest_path, "test")
+        index = os.path.join(self.content, "index.md")
+        lines = manifest.why_rebuilt(index)
+        self.assertEqual(f"{index} was rebuilt because:", lines[0])
+        self.assertIn(f"  dependency {self.image} changed", lines)
+        other = os.path.join(self.content, "other.md")
+        self.assertEqual(
+            f"{other} was up to date and not rebuilt", manifest.why_rebuilt(other)[0]
+        )
+        self.assertEqual(
+            [f"1 page(s) depend on {self.image}:", f"  {index}"],
+            manifest.why_rebuilt(self.image),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest, io, os
+from minify import HTMLMinifier, MinifyResult
+from utils import generate_page, generate_page_streaming
+from fixtures import TreeTestCase
+
+PAGE = """<!DOCTYPE html>
+<html>
+  <head>
+    <title>  The   Title </title>
+    <link href="/index.css" rel="stylesheet" />
+  </head>
+  <body>
+    <article><div><div><p>Some   <b>bold</b>
+<i>words</i></p></div><div><pre><code>def f():
+    return  1
+</code></pre></div>
+    <div class="note"><p>Inline <code>a  =  b</code></p></div></div></article>
+  </body>
+</html>
+"""
+MINIFIED = (
+    '<!DOCTYPE html><html><head><title>The Title</title><link href="/index.css" '
+    'rel="stylesheet" /></head><body><article><div><div><p>Some <b>bold</b> '
+    "<i>words</i></p></div><div><pre><code>def f():\n    return  1\n</code></pre>"
+    '</div><div class="note"><p>Inline <code>a  =  b</code></p></div></div>'
+    "</article></body></html>"
+)
+
+
+def minify(text: str, chunk_size: int = None, drop_wrappers: bool = False):
+    buffer = io.StringIO()
+    minifier = HTMLMinifier(buffer, drop_wrappers)
+    chunk_size = chunk_size or len(text)
+    for i in range(0, len(text), chunk_size):
+        minifier.write(text[i : i + chunk_size])
+    minifier.finish()
+    return buffer.getvalue(), minifier
+
+
+class TestHTMLMinifier(unittest.TestCase):
+    def test_minify(self):
+        self.assertEqual(MINIFIED, minify(PAGE)[0])
+
+    def test_any_chunking(self):
+        for chunk_size in [1, 2, 3, 7, 64]:
+            self.assertEqual(MINIFIED, minify(PAGE, chunk_size)[0], chunk_size)
+
+    def test_drop_wrappers(self):
+        html, _ = minify(PAGE, drop_wrappers=True)
+        self.assertIn("<article><p>Some", html)
+        self.assertIn('</pre><div class="note"><p>Inline', html)
+        self.assertIn("</p></div></article>", html)
+
+    def test_quoted_angle_bracket(self):
+        html = '<p>  <img src="a.png" alt="a > b"></img>  x </p>'
+        expected = '<p><img src="a.png" alt="a > b"></img> x</p>'
+        self.assertEqual(expected, minify(html)[0])
+
+    def test_counts(self):
+        html, minifier = minify(PAGE, 5)
+        self.assertEqual(len(PAGE), minifier.chars_in)
+        self.assertEqual(len(html), minifier.chars_out)
+        result = MinifyResult()
+        result.add(minifier)
+        result.merge(result)
+        self.assertEqual((2, 2 * len(html)), (result.pages, result.chars_out))
+
+
+class TestGenerateMinifiedPage(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.template = self.write(
+            "template.html",
+            "<html>\n  <title>{{ Title }}</title>\n  {{ Content }}\n</html>\n",
+        )
+        self.source = self.write(
+            "page.md", "# The Title\n\nSome *words*\n\n```\n  code\n```"
+        )
+
+    def test_streaming_matches(self):
+        plain = os.path.join(self.root, "plain.html")
+        streamed = os.path.join(self.root, "streamed.html")
+        result = MinifyResult(drop_wrappers=True)
+        generate_page(self.source, self.template, plain, minify=result)
+        generate_page_streaming(self.source, self.template, streamed, minify=result)
+        self.assertEqual(self.read(plain), self.read(streamed))
+        self.assertTrue(self.read(plain).startswith("<html><title>The Title</title>"))
+        self.assertIn("<pre><code>\n  code\n</code></pre>", self.read(plain))
+        self.assertEqual(2, result.pages)
+        self.assertLess(result.chars_out, result.chars_in)
+
+
+if __name__ == "__main__":
+    unittest.main()
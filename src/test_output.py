@@ -0,0 +1,126 @@
+import unittest, os, tempfile
+from output import WriteResult, AtomicOutput, write_if_changed
+from utils import generate_pages_recursive
+
+
+class TestWriteIfChanged(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "page.html")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def test_writes_new_file_as_utf8(self):
+        self.assertTrue(write_if_changed(self.path, "<p>Éowyn</p>"))
+        self.assertEqual(self.read(), "<p>Éowyn</p>".encode("utf-8"))
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+
+    def test_skips_unchanged_file(self):
+        write_if_changed(self.path, "<p>same</p>")
+        os.utime(self.path, ns=(1, 1))
+        self.assertFalse(write_if_changed(self.path, "<p>same</p>"))
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 1)
+
+    def test_replaces_changed_file(self):
+        write_if_changed(self.path, "<p>old</p>")
+        inode = os.stat(self.path).st_ino
+        self.assertTrue(write_if_changed(self.path, "<p>new</p>"))
+        self.assertEqual(self.read(), b"<p>new</p>")
+        # A new file was moved into place, rather than the old one rewritten
+        self.assertNotEqual(os.stat(self.path).st_ino, inode)
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+
+    def test_same_size_different_content(self):
+        write_if_changed(self.path, "<p>abc</p>")
+        self.assertTrue(write_if_changed(self.path, "<p>abd</p>"))
+        self.assertEqual(self.read(), b"<p>abd</p>")
+
+
+class TestAtomicOutput(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp.name, "page.html")
+        write_if_changed(self.path, "<p>old</p>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def read(self):
+        with open(self.path) as f:
+            return f.read()
+
+    def test_replaces_changed_file(self):
+        output = AtomicOutput(self.path)
+        with output as f:
+            f.write("<p>")
+            f.write("new</p>")
+        self.assertTrue(output.written)
+        self.assertEqual(self.read(), "<p>new</p>")
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+
+    def test_keeps_unchanged_file(self):
+        os.utime(self.path, ns=(1, 1))
+        output = AtomicOutput(self.path)
+        with output as f:
+            f.write("<p>old</p>")
+        self.assertFalse(output.written)
+        self.assertEqual(os.stat(self.path).st_mtime_ns, 1)
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+
+    def test_error_keeps_previous_file(self):
+        with self.assertRaises(ValueError):
+            with AtomicOutput(self.path) as f:
+                f.write("<p>half")
+                raise ValueError("broken block")
+        self.assertEqual(self.read(), "<p>old</p>")
+        self.assertEqual(os.listdir(self.tmp.name), ["page.html"])
+
+
+class TestBuildWriteCounts(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = os.path.join(self.tmp.name, "content")
+        self.public = os.path.join(self.tmp.name, "public")
+        self.template = os.path.join(self.tmp.name, "template.html")
+        os.makedirs(self.content)
+        with open(self.template, "w") as f:
+            f.write("<title>{{ Title }}</title>{{ Content }}")
+        for i in range(6):
+            self.write_page(i, f"# Page {i}\n\nText")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write_page(self, i: int, text: str):
+        with open(os.path.join(self.content, f"page{i}.md"), "w") as f:
+            f.write(text)
+
+    def test_counts(self):
+        drivers = {"serial": {}, "parallel": {"jobs": 2}, "pipeline": {"pipeline": True}}
+        for name, options in drivers.items():
+            public = os.path.join(self.public, name)
+            result = generate_pages_recursive(
+                self.content, self.template, public, **options
+            )
+            self.assertEqual((len(result.written), len(result.unchanged)), (6, 0))
+            self.write_page(0, "# Page 0\n\nChanged")
+            result = generate_pages_recursive(
+                self.content, self.template, public, **options
+            )
+            self.assertEqual((len(result.written), len(result.unchanged)), (1, 5))
+            self.write_page(0, "# Page 0\n\nText")
+
+    def test_repr(self):
+        result = WriteResult()
+        result.add("a.html", True)
+        result.add("b.html", False)
+        self.assertEqual(repr(result), "WriteResult(1 written, 1 unchanged)")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest, os
+from fixtures import TreeTestCase
+from utils import discover_work, generate_pages_recursive
+from parallel import generate_pages_parallel
+
+
+class TestParallelGeneration(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.template = os.path.join(self.root, "template.html")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        for i in range(12):
+            self.write(
+                os.path.join(self.content, f"section{i % 3}", f"page{i}.md"),
+                f"# Page {i}\n\nSome **bold** text and a [link](/page{i}).",
+            )
+
+    def test_discover_work(self):
+        pages = [
+            (source, dest)
+            for source, _, dest, _ in discover_work(self.content, "public", None)
+        ]
+        self.assertEqual(12, len(pages))
+        self.assertIn(
+            (
+                os.path.join(self.content, "section1", "page4.md"),
+                os.path.join("public", "section1", "page4.html"),
+            ),
+            pages,
+        )
+
+    def test_parallel_output_matches_serial(self):
+        serial = os.path.join(self.root, "serial")
+        parallel = os.path.join(self.root, "parallel")
+        generate_pages_recursive(self.content, self.template, serial)
+        generate_pages_recursive(self.content, self.template, parallel, jobs=4)
+        self.assertEqual(self.read_tree(serial), self.read_tree(parallel))
+
+    def test_errors_are_reported_per_page(self):
+        broken = os.path.join(self.content, "broken.md")
+        self.write(broken, "No title in this page")
+        public = os.path.join(self.root, "public")
+        pages = discover_work(self.content, public, self.template)
+        failures = generate_pages_parallel(pages, 4)
+        self.assertEqual([broken], list(failures))
+        self.assertIn("No title found", failures[broken])
+        self.assertEqual(12, len(self.read_tree(public)))
+
+    def test_errors_raise_after_build(self):
+        self.write(os.path.join(self.content, "broken.md"), "No title in this page")
+        public = os.path.join(self.root, "public")
+        self.assertRaises(
+            Exception,
+            generate_pages_recursive,
+            self.content,
+            self.template,
+            public,
+            jobs=2,
+        )
+        self.assertEqual(12, len(self.read_tree(public)))
+
+
+if __name__ == "__main__":
+    unittest.main()
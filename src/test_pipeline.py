@@ -0,0 +1,71 @@
+import unittest, os
+from unittest import mock
+import utils
+from utils import discover_work, generate_pages_recursive
+from pipeline import generate_pages_pipelined
+from instrument import BuildStats
+from blockcache import BlockCache
+from fixtures import TreeTestCase
+
+
+class TestPipelinedGeneration(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.template = os.path.join(self.root, "template.html")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        for i in range(30):
+            self.write(
+                os.path.join(self.content, f"section{i % 3}", f"page{i}.md"),
+                f"# Page {i}\n\nSome **bold** text and a [link](/page{i}).",
+            )
+
+    def pages(self, public: str):
+        return discover_work(self.content, public, self.template)
+
+    def test_output_matches_serial(self):
+        serial = os.path.join(self.root, "serial")
+        generate_pages_recursive(self.content, self.template, serial)
+        for jobs in (1, 3):
+            pipelined = os.path.join(self.root, f"pipelined{jobs}")
+            generate_pages_recursive(
+                self.content, self.template, pipelined, jobs=jobs, pipeline=True
+            )
+            self.assertEqual(self.read_tree(serial), self.read_tree(pipelined))
+
+    def test_small_queues(self):
+        public = os.path.join(self.root, "public")
+        failures = generate_pages_pipelined(
+            self.pages(public), prefetch=1, queue_size=1, cache=BlockCache()
+        )
+        self.assertEqual({}, failures)
+        self.assertEqual(30, len(self.read_tree(public)))
+
+    def test_large_pages_stream(self):
+        serial = os.path.join(self.root, "serial")
+        generate_pages_recursive(self.content, self.template, serial)
+        public = os.path.join(self.root, "public")
+        with mock.patch.object(utils, "STREAM_THRESHOLD", 0):
+            generate_pages_pipelined(self.pages(public))
+        self.assertEqual(self.read_tree(serial), self.read_tree(public))
+
+    def test_stats(self):
+        stats = BuildStats()
+        public = os.path.join(self.root, "public")
+        generate_pages_pipelined(self.pages(public), stats=stats)
+        self.assertEqual(30, len(stats.pages))
+        for stage in ("read", "render", "write"):
+            self.assertEqual(30, stats.stages[stage][1])
+
+    def test_errors_are_reported_per_page(self):
+        broken = os.path.join(self.content, "broken.md")
+        self.write(broken, "No title in this page")
+        public = os.path.join(self.root, "public")
+        failures = generate_pages_pipelined(self.pages(public))
+        self.assertEqual([broken], list(failures))
+        self.assertIn("No title found", failures[broken])
+        self.assertEqual(30, len(self.read_tree(public)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import unittest, os, sys, subprocess, tempfile
+from concurrent.futures import ThreadPoolExecutor
+from renderer import Renderer
+from template import Template
+from utils import markdown_to_html
+
+PAGE = "# Title\n\nSome **bold** text\n\n- one\n- two"
+
+
+class TestRenderer(unittest.TestCase):
+    def test_render(self):
+        renderer = Renderer()
+        self.assertEqual(markdown_to_html(PAGE), renderer.render(PAGE))
+
+    def test_render_page(self):
+        renderer = Renderer("<h1>{{ Title }}</h1>{{ Content }}")
+        self.assertEqual(
+            "<h1>Title</h1>" + markdown_to_html(PAGE), renderer.render_page(PAGE)
+        )
+        self.assertRaises(Exception, renderer.render_page, "No title")
+
+    def test_template_object_and_file(self):
+        renderer = Renderer(Template("{{ Content }}"))
+        self.assertEqual(markdown_to_html(PAGE), renderer.render_page(PAGE))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "template.html")
+            with open(path, "w") as f:
+                f.write("{{ Title }}|{{ Content }}")
+            renderer = Renderer.from_template_file(path)
+        self.assertEqual(f"Title|{markdown_to_html(PAGE)}", renderer.render_page(PAGE))
+
+    def test_cache_stats(self):
+        renderer = Renderer()
+        renderer.render(PAGE)
+        renderer.render(PAGE)
+        stats = renderer.cache_stats()
+        self.assertEqual((3, 3), (stats["hits"], stats["misses"]))
+        renderer.clear_cache()
+        self.assertEqual(0, renderer.cache_stats()["entries"])
+        self.assertIsNone(Renderer(cache_bytes=0).cache_stats())
+
+    def test_shared_between_threads(self):
+        renderer = Renderer()
+        documents = [f"# Page {i % 7}\n\nText *{i % 5}*\n\n{PAGE}" for i in range(200)]
+        expected = [Renderer(cache_bytes=0).render_page(d) for d in documents]
+        with ThreadPoolExecutor(8) as pool:
+            self.assertEqual(expected, list(pool.map(renderer.render_page, documents)))
+
+    def test_import_leaves_logging_and_disk_alone(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            code = (
+                "import logging, renderer, main\n"
+                "assert not logging.getLogger().handlers\n"
+                "renderer.Renderer().render_page('# Title')\n"
+            )
+            env = dict(os.environ, PYTHONPATH=os.path.dirname(__file__))
+            subprocess.run([sys.executable, "-c", code], cwd=tmp, env=env, check=True)
+            self.assertEqual([], os.listdir(tmp))
+
+
+if __name__ == "__main__":
+    unittest.main()
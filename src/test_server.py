@@ -0,0 +1,128 @@
+import unittest, os, threading, urllib.request, urllib.error
+from server import ContentSite, ServerMetrics, make_server, _etag_matches
+from utils import generate_pages_recursive
+from fixtures import TreeTestCase
+
+
+class TestContentServer(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.root
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.template = os.path.join(root, "template.html")
+        self.write(self.template, "<title>{{ Title }}</title>{{ Content }}")
+        self.write(
+            os.path.join(self.content, "index.md"), "# Home\n\n[post](/blog/post)"
+        )
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post\n\n*hi*")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+
+        self.site = ContentSite(self.content, self.static, self.template)
+        self.server = make_server(self.site, 0, "127.0.0.1")
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base = f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        super().tearDown()
+
+    def get(self, path: str, headers: dict = None):
+        request = urllib.request.Request(self.base + path, headers=headers or {})
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, dict(response.headers), response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, dict(e.headers), e.read()
+
+    def test_pages_match_a_build(self):
+        public = os.path.join(self.root, "public")
+        generate_pages_recursive(self.content, self.template, public)
+        for path, output in [("/", "index.html"), ("/blog/post", "blog/post.html")]:
+            status, headers, body = self.get(path)
+            self.assertEqual(200, status)
+            self.assertEqual("text/html; charset=utf-8", headers["Content-Type"])
+            with open(os.path.join(public, output), "rb") as f:
+                self.assertEqual(f.read(), body)
+
+    def test_static_and_missing(self):
+        status, headers, body = self.get("/index.css")
+        self.assertEqual((200, b"body {}"), (status, body))
+        self.assertEqual("text/css", headers["Content-Type"])
+        self.assertEqual(404, self.get("/nope")[0])
+        self.assertEqual(404, self.get("/../template.html")[0])
+
+    def test_cache_and_etags(self):
+        _, headers, first = self.get("/blog/post")
+        etag = headers["ETag"]
+        _, headers, second = self.get("/blog/post")
+        self.assertEqual((first, etag), (second, headers["ETag"]))
+        self.assertEqual(1, self.site.metrics.renders)
+
+        status, headers, body = self.get("/blog/post", {"If-None-Match": etag})
+        self.assertEqual((304, b""), (status, body))
+        self.assertEqual(etag, headers["ETag"])
+
+    def test_edit_invalidates(self):
+        _, headers, _ = self.get("/blog/post")
+        path = os.path.join(self.content, "blog", "post.md")
+        self.write(path, "# Edited")
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+        status, new_headers, body = self.get(
+            "/blog/post", {"If-None-Match": headers["ETag"]}
+        )
+        self.assertEqual(200, status)
+        self.assertIn(b"<h1>Edited</h1>", body)
+        self.assertNotEqual(headers["ETag"], new_headers["ETag"])
+
+    def test_directory_template_added_and_removed(self):
+        self.assertIn(b"<title>Post</title>", self.get("/blog/post")[2])
+        blog_template = os.path.join(self.content, "blog", "template.html")
+        self.write(blog_template, "<h2>{{ Title }}</h2>")
+        self.assertEqual(b"<h2>Post</h2>", self.get("/blog/post")[2])
+        os.remove(blog_template)
+        self.assertIn(b"<title>Post</title>", self.get("/blog/post")[2])
+
+    def test_render_error(self):
+        self.write(os.path.join(self.content, "broken.md"), "No title")
+        self.assertEqual(500, self.get("/broken")[0])
+
+    def test_warm(self):
+        self.assertEqual(2, self.site.warm())
+        self.get("/")
+        self.assertEqual(2, self.site.metrics.renders)
+        self.assertEqual(1, self.site.pages.stats()["hits"])
+
+    def test_metrics(self):
+        self.get("/")
+        self.get("/")
+        self.get("/nope")
+        status, _, body = self.get("/metrics")
+        text = body.decode()
+        self.assertEqual(200, status)
+        self.assertIn('md2html_requests_total{code="200"} 2', text)
+        self.assertIn('md2html_requests_total{code="404"} 1', text)
+        self.assertIn("md2html_page_cache_hit_ratio 0.5", text)
+        self.assertIn('md2html_render_seconds{quantile="0.99"}', text)
+        self.assertIn("md2html_render_seconds_count 1", text)
+
+
+class TestServerHelpers(unittest.TestCase):
+    def test_etag_matches(self):
+        self.assertTrue(_etag_matches('"a", "b"', '"b"'))
+        self.assertTrue(_etag_matches('W/"a"', '"a"'))
+        self.assertTrue(_etag_matches("*", '"a"'))
+        self.assertFalse(_etag_matches("", '"a"'))
+        self.assertFalse(_etag_matches('"ab"', '"a"'))
+
+    def test_quantiles(self):
+        metrics = ServerMetrics()
+        for i in range(1, 101):
+            metrics.observe_render(i / 1000)
+        self.assertEqual({0.5: 0.051, 0.9: 0.091, 0.99: 0.1}, metrics.quantiles())
+
+
+if __name__ == "__main__":
+    unittest.main()
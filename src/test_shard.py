@@ -0,0 +1,144 @@
+import unittest, os
+from shard import (
+    assign_shards,
+    merge_shards,
+    parse_shard,
+    remove_stale_shards,
+    select_shard,
+    shard_name,
+    write_shard_manifest,
+)
+from utils import discover_work, generate_pages_recursive
+from fixtures import TreeTestCase
+
+
+class TestAssignShards(unittest.TestCase):
+    def test_parse_shard(self):
+        self.assertEqual((2, 4), parse_shard("2/4"))
+        for spec in ["0/4", "5/4", "2", "a/b"]:
+            with self.assertRaises(ValueError):
+                parse_shard(spec)
+
+    def test_balanced(self):
+        sizes = {"a.md": 50, "b.md": 40, "c.md": 30, "d.md": 20, "e.md": 10}
+        assignment = assign_shards(sizes, 2)
+        loads = [0, 0]
+        for path, index in assignment.items():
+            loads[index - 1] += sizes[path]
+        self.assertEqual([70, 80], sorted(loads))
+
+    def test_deterministic(self):
+        sizes = {f"page{i}.md": 10 for i in range(20)}
+        first = assign_shards(sizes, 3)
+        self.assertEqual(first, assign_shards(dict(reversed(sizes.items())), 3))
+        self.assertEqual({1, 2, 3}, set(first.values()))
+        counts = [list(first.values()).count(index) for index in [1, 2, 3]]
+        self.assertEqual([7, 7, 6], counts)
+
+
+class TestShardedBuild(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.content = os.path.join(self.root, "content")
+        self.shards = os.path.join(self.root, "shards")
+        self.output = os.path.join(self.root, "public")
+        self.template = os.path.join(self.root, "template.html")
+        with open(self.template, "w") as f:
+            f.write("<title>{{ Title }}</title>{{ Content }}")
+        for i, path in enumerate(["index.md", "a.md", "blog/b.md", "blog/c.md"]):
+            text = f"# Page {i}\n\n" + "Text\n\n" * (i * 10)
+            self.write(os.path.join(self.content, path), text)
+
+    def build_shard(self, index: int, count: int, version: str = "1"):
+        dest = os.path.join(self.shards, shard_name(index, count))
+        written = generate_pages_recursive(
+            self.content, self.template, dest, shard=(index, count)
+        )
+        write_shard_manifest(
+            os.path.join(self.shards, shard_name(index, count) + ".json"),
+            index,
+            count,
+            version,
+            discover_work(self.content, dest, self.template),
+            self.content,
+            dest,
+            written.written + written.unchanged,
+        )
+        return written
+
+    def test_shards_partition_pages(self):
+        work = discover_work(self.content, self.output, self.template)
+        shards = [select_shard(work, self.content, index, 3) for index in [1, 2, 3]]
+        self.assertEqual(sorted(work), sorted(sum(shards, [])))
+
+    def test_merge(self):
+        for index in [1, 2]:
+            self.build_shard(index, 2)
+        result = merge_shards(self.shards, self.output, "1", self.content)
+        self.assertEqual(2, result.shards)
+        self.assertEqual(4, len(result.copied))
+        generate_pages_recursive(self.content, self.template, self.root + "/full")
+        for page in ["index.html", "a.html", "blog/b.html", "blog/c.html"]:
+            with open(os.path.join(self.output, page)) as f:
+                merged = f.read()
+            with open(os.path.join(self.root, "full", page)) as f:
+                self.assertEqual(f.read(), merged)
+
+        again = merge_shards(self.shards, self.output, "1", self.content)
+        self.assertEqual(4, len(again.unchanged))
+
+    def test_incomplete(self):
+        self.build_shard(1, 2)
+        with self.assertRaisesRegex(Exception, "Missing shard"):
+            merge_shards(self.shards, self.output, "1")
+
+    def test_parser_version_mismatch(self):
+        self.build_shard(1, 2)
+        self.build_shard(2, 2, version="2")
+        with self.assertRaisesRegex(Exception, "parser version"):
+            merge_shards(self.shards, self.output, "1")
+
+    def test_content_changed(self):
+        for index in [1, 2]:
+            self.build_shard(index, 2)
+        self.write(os.path.join(self.content, "new.md"), "# New")
+        with self.assertRaisesRegex(Exception, "not built from"):
+            merge_shards(self.shards, self.output, "1", self.content)
+
+    def test_stale_shard_count(self):
+        # An earlier build with two shards is left in the shard directory
+        for index in [1, 2]:
+            self.build_shard(index, 2)
+        stale = os.path.join(self.shards, shard_name(1, 2) + ".json")
+        os.utime(stale, (0, 0))
+        for index in [1, 2, 3]:
+            self.build_shard(index, 3)
+        result = merge_shards(self.shards, self.output, "1", self.content)
+        self.assertEqual(3, result.shards)
+        self.assertEqual(4, len(result.pages))
+        with self.assertRaisesRegex(Exception, "No shard manifests"):
+            merge_shards(self.shards, self.output, "1", count=4)
+
+        self.assertEqual(["1-of-2", "2-of-2"], remove_stale_shards(self.shards, 3))
+        self.assertEqual(
+            ["1-of-3", "1-of-3.json", "2-of-3", "2-of-3.json", "3-of-3", "3-of-3.json"],
+            sorted(os.listdir(self.shards)),
+        )
+
+    def test_damaged_page(self):
+        for index in [1, 2]:
+            self.build_shard(index, 2)
+        dest = os.path.join(self.shards, shard_name(1, 2))
+        page = next(
+            os.path.join(root, name)
+            for root, _, names in os.walk(dest)
+            for name in names
+        )
+        with open(page, "a") as f:
+            f.write("damaged")
+        with self.assertRaisesRegex(Exception, "does not match"):
+            merge_shards(self.shards, self.output, "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
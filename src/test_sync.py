@@ -0,0 +1,87 @@
+import unittest, os
+import sync
+from sync import sync_tree, copy_file
+from fixtures import TreeTestCase
+
+
+class TestSyncTree(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.source = os.path.join(self.root, "static")
+        self.dest = os.path.join(self.root, "public")
+        self.write(os.path.join(self.source, "index.css"), "body {}")
+        self.write(os.path.join(self.source, "images", "a.png"), "png a")
+        self.write(os.path.join(self.source, "images", "icons", "b.png"), "png b")
+
+    def test_first_sync_copies_everything(self):
+        result = sync_tree(self.source, self.dest)
+        self.assertEqual(3, len(result.copied))
+        self.assertEqual(
+            "png b", self.read(os.path.join(self.dest, "images", "icons", "b.png"))
+        )
+
+    def test_second_sync_copies_nothing(self):
+        first = sync_tree(self.source, self.dest)
+        second = sync_tree(self.source, self.dest, previous=first.files)
+        self.assertEqual([], second.copied)
+        self.assertEqual(3, len(second.unchanged))
+
+    def test_changed_file_is_copied(self):
+        first = sync_tree(self.source, self.dest)
+        self.write(os.path.join(self.source, "index.css"), "body { margin: 0 }")
+        second = sync_tree(self.source, self.dest, previous=first.files)
+        self.assertEqual(["index.css"], second.copied)
+        self.assertEqual(
+            "body { margin: 0 }", self.read(os.path.join(self.dest, "index.css"))
+        )
+
+    def test_touched_file_with_same_content_is_not_copied(self):
+        first = sync_tree(self.source, self.dest)
+        os.utime(os.path.join(self.source, "index.css"), ns=(0, 0))
+        second = sync_tree(self.source, self.dest, previous=first.files)
+        self.assertEqual([], second.copied)
+        self.assertEqual(0, os.stat(os.path.join(self.dest, "index.css")).st_mtime_ns)
+
+    def test_stale_files_are_pruned(self):
+        first = sync_tree(self.source, self.dest)
+        self.write(os.path.join(self.dest, "page.html"), "generated page")
+        os.remove(os.path.join(self.source, "images", "icons", "b.png"))
+        os.rmdir(os.path.join(self.source, "images", "icons"))
+        second = sync_tree(self.source, self.dest, previous=first.files)
+        self.assertEqual([os.path.join("images", "icons", "b.png")], second.pruned)
+        self.assertFalse(os.path.exists(os.path.join(self.dest, "images", "icons")))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "images", "a.png")))
+        self.assertTrue(os.path.exists(os.path.join(self.dest, "page.html")))
+
+    def test_hardlink(self):
+        sync_tree(self.source, self.dest, link=True)
+        self.assertTrue(
+            os.path.samefile(
+                os.path.join(self.source, "index.css"),
+                os.path.join(self.dest, "index.css"),
+            )
+        )
+
+    def test_parallel_copy(self):
+        for i in range(sync.PARALLEL_COPY_THRESHOLD * 2):
+            self.write(os.path.join(self.source, "many", f"{i}.txt"), str(i))
+        result = sync_tree(self.source, self.dest, jobs=4)
+        self.assertEqual(sync.PARALLEL_COPY_THRESHOLD * 2 + 3, len(result.copied))
+        self.assertEqual("7", self.read(os.path.join(self.dest, "many", "7.txt")))
+
+    def test_copy_file_preserves_mtime(self):
+        source = os.path.join(self.source, "index.css")
+        dest = os.path.join(self.root, "copy.css")
+        os.utime(source, ns=(1_000_000_000, 1_000_000_000))
+        copy_file(source, dest)
+        self.assertEqual("body {}", self.read(dest))
+        self.assertEqual(1_000_000_000, os.stat(dest).st_mtime_ns)
+
+    def test_missing_source(self):
+        self.assertRaises(
+            Exception, sync_tree, os.path.join(self.root, "missing"), self.dest
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
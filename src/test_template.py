@@ -0,0 +1,118 @@
+import unittest, io, os
+from template import Template, load_template, find_template
+from htmlnode import LeafNode, ParentNode
+from utils import generate_pages_recursive, discover_work
+from fixtures import TreeTestCase
+
+
+class TestTemplate(unittest.TestCase):
+    def test_parse(self):
+        template = Template("<title>{{ Title }}</title><p>{{ Content }}</p>")
+        self.assertEqual(
+            ["<title>", "Title", "</title><p>", "Content", "</p>"], template.parts
+        )
+        self.assertEqual({"Title", "Content"}, template.slots)
+
+    def test_render(self):
+        template = Template("<title>{{ Title }}</title>{{ Content }}{{ Title }}")
+        self.assertEqual(
+            "<title>Home</title><p>Hi</p>Home",
+            template.render({"Title": "Home", "Content": "<p>Hi</p>"}),
+        )
+
+    def test_values_are_not_expanded(self):
+        template = Template("{{ Title }}|{{ Content }}")
+        self.assertEqual(
+            "{{ Content }}|{{ Title }}",
+            template.render({"Title": "{{ Content }}", "Content": "{{ Title }}"}),
+        )
+
+    def test_missing_slot_is_left_unchanged(self):
+        template = Template("{{ Title }} {{Author}}")
+        self.assertEqual("Home {{Author}}", template.render({"Title": "Home"}))
+
+    def test_callable_value_streams_into_sink(self):
+        template = Template("<article>{{ Content }}</article>")
+        node = ParentNode("p", [LeafNode("b", "bold"), LeafNode(None, " text")])
+        sink = io.StringIO()
+        template.render_to(sink, {"Content": node.write_html})
+        self.assertEqual("<article><p><b>bold</b> text</p></article>", sink.getvalue())
+
+    def test_no_slots(self):
+        self.assertEqual("static", Template("static").render({"Title": "x"}))
+
+
+class TestTemplateFiles(TreeTestCase):
+    def test_load_template_is_cached_until_changed(self):
+        path = os.path.join(self.root, "template.html")
+        self.write(path, "{{ Title }}")
+        template = load_template(path)
+        self.assertIs(template, load_template(path))
+
+        self.write(path, "<h1>{{ Title }}</h1>")
+        os.utime(path, ns=(0, 0))
+        self.assertEqual("<h1>x</h1>", load_template(path).render({"Title": "x"}))
+
+    def test_find_template(self):
+        content = os.path.join(self.root, "content")
+        nested = os.path.join(content, "blog", "2024")
+        os.makedirs(nested)
+        self.assertEqual("default.html", find_template(nested, content, "default.html"))
+
+        blog_template = os.path.join(content, "blog", "template.html")
+        self.write(blog_template, "{{ Content }}")
+        found = {}
+        self.assertEqual(
+            blog_template, find_template(nested, content, "default.html", found)
+        )
+        self.assertEqual(blog_template, found[os.path.join(content, "blog")])
+        self.assertEqual(
+            "default.html", find_template(content, content, "default.html")
+        )
+
+    def test_per_directory_templates(self):
+        content = os.path.join(self.root, "content")
+        public = os.path.join(self.root, "public")
+        default = os.path.join(self.root, "template.html")
+        self.write(default, "default:{{ Title }}")
+        self.write(os.path.join(content, "index.md"), "# Home")
+        self.write(os.path.join(content, "blog", "post.md"), "# Post")
+        self.write(os.path.join(content, "blog", "template.html"), "blog:{{ Title }}")
+
+        generate_pages_recursive(content, default, public)
+        with open(os.path.join(public, "index.html")) as f:
+            self.assertEqual("default:Home", f.read())
+        with open(os.path.join(public, "blog", "post.html")) as f:
+            self.assertEqual("blog:Post", f.read())
+        self.assertFalse(os.path.exists(os.path.join(public, "blog", "template.html")))
+
+    def test_discover_work_matches_find_template(self):
+        content = os.path.join(self.root, "content")
+        for path in [
+            "index.md",
+            "template.html",
+            os.path.join("blog", "post.md"),
+            os.path.join("blog", "2024", "template.html"),
+            os.path.join("blog", "2024", "jan", "post.md"),
+            os.path.join("docs", "guide.md"),
+        ]:
+            self.write(os.path.join(content, path), "# Page")
+        # A directory named like a template is neither a template nor a page
+        os.makedirs(os.path.join(content, "docs", "template.html"))
+
+        work = discover_work(content, "public", "default.html")
+        self.assertEqual(4, len(work))
+        for source, template, dest, size in work:
+            self.assertEqual(os.path.getsize(source), size)
+            directory = os.path.dirname(source)
+            self.assertEqual(
+                find_template(directory, content, "default.html"), template
+            )
+            relative = os.path.relpath(source, content)
+            self.assertEqual(
+                os.path.join("public", os.path.splitext(relative)[0] + ".html"), dest
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
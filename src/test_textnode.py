@@ -37,6 +37,11 @@ class TestTextNode(unittest.TestCase):
         node2 = TextNode("Very much different", TextType.BOLD)
         self.assertNotEqual(node, node2)
 
+    def test_text_type_is_stored_as_value(self):
+        node = TextNode("This is a text node", TextType.ITALIC)
+        self.assertEqual("italic", node.text_type)
+        self.assertFalse(hasattr(node, "__dict__"))
+
 
 if __name__ == "__main__":
     unittest.main()
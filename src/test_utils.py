@@ -1,7 +1,10 @@
-import unittest
+import unittest, random, os, io
+from unittest import mock
+import utils
 from textnode import TextNode, TextType
 from htmlnode import LeafNode
 from utils import *
+from fixtures import TreeTestCase
 
 
 class TestHTMLNode(unittest.TestCase):
@@ -12,6 +15,11 @@ class TestHTMLNode(unittest.TestCase):
             text_node = TextNode("Iterating over TextTypes", text_type, url=None)
             self.assertIsInstance(text_node_to_html_node(text_node), LeafNode)
 
+    def test_convert_invalid_text_type(self):
+        textnode = TextNode("Hello world", TextType.TEXT)
+        textnode.text_type = "underline"
+        self.assertRaises(ValueError, text_node_to_html_node, textnode)
+
     def test_convert_text(self):
         textnode = TextNode("Hello world", TextType.TEXT, url=None)
         leafnode = LeafNode(tag=None, value="Hello world", props=None)
@@ -217,6 +225,30 @@ def hello_world():
         ]
         self.assertEqual(text_nodes, expected_split)
 
+    def test_split_multiple_nodes_with_delimiter(self):
+        # The delimiter must only be escaped once, not again for every node
+        nodes = [
+            TextNode("*a* b", TextType.TEXT),
+            TextNode("bold", TextType.BOLD),
+            TextNode("c *d*", TextType.TEXT),
+        ]
+        self.assertEqual(
+            [
+                TextNode("", TextType.TEXT),
+                TextNode("a", TextType.ITALIC),
+                TextNode(" b", TextType.TEXT),
+                TextNode("bold", TextType.BOLD),
+                TextNode("c ", TextType.TEXT),
+                TextNode("d", TextType.ITALIC),
+                TextNode("", TextType.TEXT),
+            ],
+            split_nodes_delimiter(nodes, "*", TextType.ITALIC),
+        )
+
+    def test_delimiter_pattern_is_cached(self):
+        self.assertIs(delimiter_pattern("**"), delimiter_pattern("**"))
+        self.assertEqual(["a ", "b", " c"], delimiter_pattern("**").split("a **b** c"))
+        self.assertEqual(["a ***b"], delimiter_pattern("**").split("a ***b"))
 
 class TestExtractMarkdownImages(unittest.TestCase):
     def test_extract_markdown_images(self):
@@ -337,6 +369,67 @@ class TestTextToTextNodes(unittest.TestCase):
         self.assertEqual(nodes, text_to_textnodes(text))
 
 
+class TestTextToTextNodesScanner(unittest.TestCase):
+    def test_matches_reference_pipeline(self):
+        texts = [
+            "Plain text only",
+            "",
+            "**bold** at the start",
+            "ends in *italic*",
+            "Hello **world** it's me and *you*",
+            "deities (the `Valar` and `Maiar`)",
+            "```\ndef hello_world():\n    print(\"Hello, world!\")\n```",
+            "an ![image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)",
+            "[link](/first) then [another](/second)",
+            "[ ] An unchecked box (not a link)",
+            "This is **text** with an *italic* word and a ```code block``` and an ![obi wan image](https://i.imgur.com/fJRm4Vk.jpeg) and a [link](https://boot.dev)",
+        ]
+        for text in texts:
+            self.assertEqual(text_to_textnodes_reference(text), text_to_textnodes(text))
+
+    def test_matches_reference_pipeline_on_generated_text(self):
+        rng = random.Random(5)
+        spans = [
+            lambda w: w,
+            lambda w: f"**{w}**",
+            lambda w: f"*{w}*",
+            lambda w: f"`{w}`",
+            lambda w: f"```{w}```",
+            lambda w: f"![{w}](/images/{w}.png)",
+            lambda w: f"[{w}](/{w})",
+        ]
+        words = ["alpha", "beta gamma", "delta.", "(epsilon)", "zeta\neta"]
+        for _ in range(500):
+            text = " ".join(
+                rng.choice(spans)(rng.choice(words)) for _ in range(rng.randint(1, 8))
+            )
+            self.assertEqual(text_to_textnodes_reference(text), text_to_textnodes(text))
+
+    def test_delimiters_span_lines(self):
+        text = "a **bold\nword** here"
+        self.assertEqual(
+            [
+                TextNode("a ", TextType.TEXT),
+                TextNode("bold\nword", TextType.BOLD),
+                TextNode(" here", TextType.TEXT),
+            ],
+            text_to_textnodes(text),
+        )
+
+    def test_links_do_not_span_lines(self):
+        text = "[a\nb](c)"
+        self.assertEqual([TextNode(text, TextType.TEXT)], text_to_textnodes(text))
+
+    def test_markers_that_start_nothing(self):
+        for text in ["Wow! a ! [b] c", "a *** b", "![a] [b] (c)"]:
+            self.assertEqual([TextNode(text, TextType.TEXT)], text_to_textnodes(text))
+            self.assertEqual(text_to_textnodes_reference(text), text_to_textnodes(text))
+
+    def test_unpaired_delimiter(self):
+        for text in ["a ** b", "a * b", "a ` b", "**a** and *b"]:
+            self.assertRaises(NotImplementedError, text_to_textnodes, text)
+            self.assertRaises(NotImplementedError, text_to_textnodes_reference, text)
+
 class TestMarkdownToBlocks(unittest.TestCase):
     def test_markdown_to_blocks(self):
         text = """# This is a H1 heading
@@ -361,6 +454,25 @@ This is a paragraph of text. It has some **bold** and *italic* words inside of i
         )
 
 
+class TestIterBlocks(unittest.TestCase):
+    def assertSameBlocks(self, markdown, chunk_size):
+        self.assertEqual(
+            list(iter_blocks(io.StringIO(markdown), chunk_size)),
+            markdown_to_blocks(markdown),
+        )
+
+    def test_blank_lines_across_chunks(self):
+        for markdown in ["", "\n", "\n\n", "a\n\nb", "a\n\n\nb", "a\n\n\n\nb\n\n"]:
+            for chunk_size in range(1, 6):
+                self.assertSameBlocks(markdown, chunk_size)
+
+    def test_generated_text(self):
+        rng = random.Random(14)
+        for _ in range(200):
+            markdown = "".join(rng.choice(["a", "b ", "\n"]) for _ in range(60))
+            self.assertSameBlocks(markdown, rng.randint(1, 20))
+
+
 class TestBlockToBlockType(unittest.TestCase):
     def test_block_to_block_type_paragraph(self):
         text = "This is a normal\nparagraph with some\nnew linesof text.\n"
@@ -387,6 +499,58 @@ class TestBlockToBlockType(unittest.TestCase):
         self.assertEqual(BlockType.ORDERED_LIST, block_to_blocktype(text))
 
 
+class TestScanBlock(unittest.TestCase):
+    def assertSameScan(self, block):
+        blocktype = block_to_blocktype(block)
+        stripped = strip_block_markers(block, map_blocktype_to_tag(blocktype))
+        if blocktype in (BlockType.UNORDERED_LIST, BlockType.ORDERED_LIST):
+            lines = stripped.split("\n")
+        else:
+            lines = [stripped]
+        self.assertEqual(scan_block(block), (blocktype, lines), repr(block))
+
+    def test_block_types(self):
+        for block in [
+            "",
+            "#",
+            "# Title",
+            "###### Six",
+            "####### Seven",
+            "#foo",
+            "#\nfoo bar",
+            "```\ncode\n```",
+            "```\nunclosed",
+            "> quote\n>> nested\n>",
+            "> quote\nnot",
+            "- one\n* two\n- three",
+            "* one\n- two",
+            "- one\n-two",
+            "1. one\n2. two\n3. three",
+            "1. one\n3. three",
+            "2. two",
+            "plain\ntext",
+        ]:
+            self.assertSameScan(block)
+
+    def test_generated_blocks(self):
+        rng = random.Random(15)
+        starts = ["", "#", "# ", "## ", "> ", ">", "- ", "* ", "-", "1. ", "2. ", "```"]
+        for _ in range(500):
+            lines = [
+                rng.choice(starts) + rng.choice(["a", "- b", "> c", "#", ""])
+                for _ in range(rng.randint(1, 4))
+            ]
+            if rng.random() < 0.3:
+                lines = [f"{i}. {line}" for i, line in enumerate(lines, 1)]
+            self.assertSameScan("\n".join(lines))
+
+    def test_block_title(self):
+        self.assertEqual(block_title("# The Title "), "The Title")
+        self.assertIsNone(block_title("## Not a title"))
+        self.assertIsNone(block_title("#hashtag"))
+        self.assertIsNone(block_title("Paragraph"))
+
+
 class TestBlockToHtmlNode(unittest.TestCase):
     def test_block_to_html_node_h1(self):
         text = """# This is a H1 heading"""
@@ -536,6 +700,72 @@ def hello_world():
         self.assertEqual(target, html.to_html())
 
 
+class TestMarkdownToHtml(unittest.TestCase):
+    def assertSameHtml(self, markdown: str):
+        self.assertEqual(
+            markdown_to_html_node(markdown).to_html(), markdown_to_html(markdown)
+        )
+
+    def test_blocks(self):
+        for markdown in [
+            "# This is a H1 heading",
+            "###### This is a H6 heading with *italic* text",
+            "- Here is an unordered list\n- With **multiple** items",
+            "* A list\n* with stars",
+            "1. And here is an ordered list\n2. With [a link](/there)",
+            "> This is a blockquote.\n> It has multiple lines",
+            "![Alt text for an image](https://example.com/image.jpg)",
+            "```\ndef hello_world():\n    print(\"Hello, world!\")\n```",
+            "deities (the `Valar` and `Maiar`)",
+            "",
+        ]:
+            self.assertSameHtml(markdown)
+
+    def test_site_content(self):
+        root = os.path.join(os.path.dirname(__file__), "..", "content")
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                with open(os.path.join(dirpath, filename)) as f:
+                    self.assertSameHtml(f.read())
+
+    def test_generated_documents(self):
+        rng = random.Random(12)
+        blocks = [
+            lambda: "# Title with **bold**",
+            lambda: "## A *heading*",
+            lambda: "Paragraph with `code` and\na [link](/x) on two lines",
+            lambda: "- item **one**\n- item ![two](/2.png)",
+            lambda: "1. first\n2. second\n3. *third*",
+            lambda: "> quoted\n> text",
+            lambda: "```\nsome code\n```",
+        ]
+        for _ in range(100):
+            markdown = "\n\n".join(
+                rng.choice(blocks)() for _ in range(rng.randint(1, 12))
+            )
+            self.assertSameHtml(markdown)
+
+    def test_invalid_heading(self):
+        self.assertRaises(ValueError, markdown_to_html_node("#hashtag").to_html)
+        self.assertRaises(ValueError, markdown_to_html, "#hashtag")
+
+    def test_render_blocks_finds_title(self):
+        markdown = "Intro\n\n## Section\n\n# The Title\n\n# Another"
+        out = []
+        title = render_blocks(markdown_to_blocks(markdown), out)
+        self.assertEqual(title, extract_title(markdown))
+        self.assertEqual("".join(out), markdown_to_html(markdown)[5:-6])
+        self.assertIsNone(render_blocks(["No title"], []))
+
+    def test_render_blocks_finds_cached_title(self):
+        from blockcache import BlockCache
+
+        cache = BlockCache()
+        blocks = ["Intro", "# The Title"]
+        for _ in range(2):
+            self.assertEqual(render_blocks(blocks, [], cache), "The Title")
+        self.assertEqual(cache.stats()["hits"], 2)
+
 class TestExtractTitle(unittest.TestCase):
     def test_extract_title(self):
         text = """# This is a H1 heading"""
@@ -547,5 +777,55 @@ class TestExtractTitle(unittest.TestCase):
         self.assertRaises(Exception, extract_title, text)
 
 
+class TestGeneratePageStreaming(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        self.template = self.write(
+            "template.html", "<title>{{ Title }}</title>\n<body>{{ Content }}</body>\n"
+        )
+
+    def write_page(self, markdown):
+        return self.write("page.md", markdown)
+
+    def test_same_output_as_generate_page(self):
+        source = self.write_page(
+            "Intro with **bold**\n\n# The Title\n\n- one\n- two\n\n```\ncode\n```"
+        )
+        plain = os.path.join(self.root, "plain.html")
+        streamed = os.path.join(self.root, "out", "streamed.html")
+        generate_page(source, self.template, plain)
+        generate_page_streaming(source, self.template, streamed)
+        self.assertEqual(self.read(streamed), self.read(plain))
+
+    def test_large_pages_stream(self):
+        source = self.write_page("# Title\n\n" + "Some *words*\n\n" * 50)
+        plain = os.path.join(self.root, "plain.html")
+        generate_page(source, self.template, plain)
+        streamed = os.path.join(self.root, "streamed.html")
+        streaming = mock.patch.object(
+            utils, "generate_page_streaming", wraps=utils.generate_page_streaming
+        )
+        with mock.patch.object(utils, "STREAM_THRESHOLD", 0), streaming as spy:
+            generate_page(source, self.template, streamed)
+        spy.assert_called_once()
+        self.assertEqual(self.read(streamed), self.read(plain))
+
+    def test_failed_page_is_removed(self):
+        source = self.write_page("# Title\n\nfine\n\n#broken")
+        dest = os.path.join(self.root, "page.html")
+        self.assertRaises(
+            ValueError, generate_page_streaming, source, self.template, dest
+        )
+        self.assertFalse(os.path.exists(dest))
+
+    def test_missing_title(self):
+        source = self.write_page("No heading here")
+        dest = os.path.join(self.root, "page.html")
+        self.assertRaises(
+            Exception, generate_page_streaming, source, self.template, dest
+        )
+        self.assertFalse(os.path.exists(dest))
+
+
 if __name__ == "__main__":
     unittest.main()
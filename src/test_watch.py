@@ -0,0 +1,189 @@
+import unittest, os, gzip, tempfile, urllib.request
+from assets import fingerprint_assets
+from manifest import BuildManifest
+from sync import sync_tree
+from utils import generate_pages_recursive
+from watch import snapshot, changed_paths, SiteWatcher, serve
+from fixtures import TreeTestCase
+
+
+class TestSnapshot(unittest.TestCase):
+    def test_changed_paths(self):
+        old = {"a": (1, 1), "b": (1, 1), "c": (1, 1)}
+        new = {"a": (1, 1), "b": (2, 1), "d": (1, 1)}
+        self.assertEqual({"b", "c", "d"}, changed_paths(old, new))
+
+    def test_snapshot_missing_root(self):
+        self.assertEqual({}, snapshot(os.path.join(tempfile.gettempdir(), "nope")))
+
+
+class TestSiteWatcher(TreeTestCase):
+    def setUp(self):
+        super().setUp()
+        root = self.root
+        self.content = os.path.join(root, "content")
+        self.static = os.path.join(root, "static")
+        self.public = os.path.join(root, "public")
+        self.template = os.path.join(root, "template.html")
+        self.write(self.template, "{{ Title }}|{{ Content }}")
+        self.write(os.path.join(self.content, "index.md"), "# Home")
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Post")
+        self.write(os.path.join(self.static, "index.css"), "body {}")
+
+        self.manifest = BuildManifest(os.path.join(root, "manifest.json"), "test")
+        generate_pages_recursive(
+            self.content, self.template, self.public, manifest=self.manifest
+        )
+        self.watcher = SiteWatcher(
+            self.content, self.static, self.template, self.public, self.manifest
+        )
+
+    def write(self, path: str, text: str):
+        path = super().write(path, text)
+        # Make every write visible to the next poll, however coarse the clock
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    def read(self, *parts):
+        return super().read(self.public, *parts)
+
+    def test_no_changes(self):
+        self.assertEqual({"rebuilt": 0, "removed": 0, "assets": 0}, self.watcher.poll())
+
+    def test_changed_page_is_rebuilt(self):
+        self.write(os.path.join(self.content, "blog", "post.md"), "# Edited")
+        self.assertEqual(1, self.watcher.poll()["rebuilt"])
+        self.assertEqual(
+            "Edited|<div><div><h1>Edited</h1></div></div>",
+            self.read("blog", "post.html"),
+        )
+
+    def test_added_and_removed_pages(self):
+        self.write(os.path.join(self.content, "new.md"), "# New")
+        os.remove(os.path.join(self.content, "index.md"))
+        summary = self.watcher.poll()
+        self.assertEqual((1, 1), (summary["rebuilt"], summary["removed"]))
+        self.assertTrue(os.path.exists(os.path.join(self.public, "new.html")))
+        self.assertFalse(os.path.exists(os.path.join(self.public, "index.html")))
+        self.assertNotIn(os.path.join(self.content, "index.md"), self.manifest.pages)
+
+    def test_template_change_rebuilds_every_page(self):
+        self.write(self.template, "<h1>{{ Title }}</h1>")
+        self.assertEqual(2, self.watcher.poll()["rebuilt"])
+        self.assertEqual("<h1>Post</h1>", self.read("blog", "post.html"))
+
+    def test_directory_template_rebuilds_its_pages(self):
+        self.write(os.path.join(self.content, "blog", "template.html"), "blog")
+        self.assertEqual(1, self.watcher.poll()["rebuilt"])
+        self.assertEqual("blog", self.read("blog", "post.html"))
+
+    def test_broken_page_does_not_stop_watching(self):
+        self.write(os.path.join(self.content, "index.md"), "No title")
+        self.assertEqual(0, self.watcher.poll()["rebuilt"])
+        self.write(os.path.join(self.content, "index.md"), "# Fixed")
+        self.assertEqual(1, self.watcher.poll()["rebuilt"])
+
+    def test_static_change_is_synced(self):
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        self.assertEqual(1, self.watcher.poll()["assets"])
+        self.assertEqual("body { margin: 0 }", self.read("index.css"))
+
+    def test_asset_change_rebuilds_dependent_page(self):
+        self.write(os.path.join(self.static, "ring.png"), "one ring")
+        page = os.path.join(self.content, "ring.md")
+        self.write(page, "# Ring\n\n![ring](/ring.png)")
+        self.assertEqual(1, self.watcher.poll()["rebuilt"])
+        self.write(os.path.join(self.static, "ring.png"), "two rings")
+        summary = self.watcher.poll()
+        self.assertEqual((1, 1), (summary["rebuilt"], summary["assets"]))
+        self.assertEqual(
+            [f"dependency {os.path.join(self.static, 'ring.png')} changed"],
+            self.manifest.rebuilt[page],
+        )
+
+    def test_linked_page_edit_rebuilds_only_that_page(self):
+        index = os.path.join(self.content, "index.md")
+        post = os.path.join(self.content, "blog", "post.md")
+        self.write(index, "# Home\n\n[post](/blog/post)")
+        self.assertEqual(1, self.watcher.poll()["rebuilt"])
+        self.write(post, "# Edited")
+        self.assertEqual(1, self.watcher.poll()["rebuilt"])
+        os.remove(post)
+        summary = self.watcher.poll()
+        self.assertEqual((1, 1), (summary["rebuilt"], summary["removed"]))
+        self.assertEqual([f"dependency {post} changed"], self.manifest.rebuilt[index])
+
+    def test_fingerprinted_assets_follow_static_changes(self):
+        self.write(self.template, '<link href="/index.css">{{ Content }}')
+        self.write(os.path.join(self.static, "ring.png"), "one ring")
+        page = os.path.join(self.content, "ring.md")
+        self.write(page, "# Ring\n\n![ring](/ring.png)")
+        sync_tree(self.static, self.public)
+        assets = fingerprint_assets(self.static, self.public)
+        self.manifest = BuildManifest(self.manifest.path, "test")
+        self.manifest.fingerprints = assets.files
+        generate_pages_recursive(
+            self.content, self.template, self.public, self.manifest, assets=assets
+        )
+        self.watcher = SiteWatcher(
+            self.content,
+            self.static,
+            self.template,
+            self.public,
+            self.manifest,
+            assets=assets,
+        )
+        self.watcher.poll()
+        old_css = assets.url("/index.css")
+        self.assertIn(old_css, self.read("index.html"))
+
+        # The stylesheet only appears in the template: every page links to it
+        self.write(os.path.join(self.static, "index.css"), "body { margin: 0 }")
+        self.assertEqual(3, self.watcher.poll()["rebuilt"])
+        new_css = self.watcher.assets.url("/index.css")
+        self.assertNotEqual(old_css, new_css)
+        self.assertIn(new_css, self.read("blog", "post.html"))
+        self.assertFalse(os.path.exists(os.path.join(self.public, old_css[1:])))
+        self.assertEqual(self.watcher.assets.files, self.manifest.fingerprints)
+
+        # The image only appears in one page
+        self.write(os.path.join(self.static, "ring.png"), "two rings")
+        self.assertEqual(1, self.watcher.poll()["rebuilt"])
+        self.assertIn(self.watcher.assets.url("/ring.png"), self.read("ring.html"))
+
+    def test_siblings_follow_rebuilt_pages(self):
+        post = os.path.join(self.content, "blog", "post.md")
+        self.write(post, "# Post\n\n" + "All that is gold does not glitter. " * 50)
+        self.watcher.gzip = True
+        self.watcher.poll()
+        sibling = os.path.join(self.public, "blog", "post.html.gz")
+        with gzip.open(sibling, "rt") as f:
+            self.assertEqual(self.read("blog", "post.html"), f.read())
+
+        self.write(post, "# Post\n\n" + "Not all those who wander are lost. " * 50)
+        self.watcher.poll()
+        with gzip.open(sibling, "rt") as f:
+            self.assertEqual(self.read("blog", "post.html"), f.read())
+
+        # A watcher that doesn't precompress drops the recorded siblings
+        self.watcher.gzip = False
+        self.write(post, "# Post")
+        self.watcher.poll()
+        self.assertFalse(os.path.exists(sibling))
+        self.assertEqual({}, self.manifest.compressed)
+
+    def test_serve(self):
+        server = serve(self.public, 0)
+        try:
+            port = server.server_address[1]
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/index.html") as r:
+                self.assertEqual(
+                    b"Home|<div><div><h1>Home</h1></div></div>", r.read()
+                )
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -11,6 +11,10 @@ class TextType(Enum):
 
 
 class TextNode:
+    # text_type holds the TextType's value, so it can be used directly as a
+    # dispatch key without an enum lookup
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text: str, text_type: TextType, url: str = None):
         self.text = text
         self.text_type = text_type.value
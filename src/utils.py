@@ -1,30 +1,118 @@
 from textnode import TextType, TextNode
-from htmlnode import LeafNode, ParentNode
+from htmlnode import LeafNode, ParentNode, OPEN_TAGS, CLOSE_TAGS
 from blocktypes import BlockType
-import re, os, logging
-
-
-def text_node_to_html_node(text_node: "TextNode"):
-    match TextType(text_node.text_type):
-        case TextType.TEXT:
-            return LeafNode(tag=None, value=text_node.text)
-        case TextType.BOLD:
-            return LeafNode(tag="b", value=text_node.text)
-        case TextType.ITALIC:
-            return LeafNode(tag="i", value=text_node.text)
-        case TextType.CODE:
-            return LeafNode(tag="code", value=text_node.text)
-        case TextType.LINK:
-            return LeafNode(
-                tag="a", value=text_node.text, props={"href": text_node.url}
-            )
-        case TextType.IMAGE:
-            return LeafNode(
-                tag="img", value="", props={"src": text_node.url, "alt": text_node.text}
-            )
-        case _:
-            print(text_node.__repr__())
-            raise ValueError(f"Invalid TextType value: {text_node.text_type}")
+from template import load_template, TEMPLATE_NAME
+from output import WriteResult, AtomicOutput, write_if_changed
+from depgraph import reference_dependencies
+from minify import HTMLMinifier
+import io, re, os, sys, logging, functools
+
+# Bump whenever a parser change alters the rendered HTML, so that incremental
+# builds re-render every page. 2: the single-pass inline tokenizer, which
+# closes delimiters that the old splitter left as literal text
+PARSER_VERSION = "2"
+
+# Pages at least this large are rendered block by block with
+# generate_page_streaming, so that memory is bounded by the largest block rather
+# than the whole document
+STREAM_THRESHOLD = 4 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# Compiled patterns for the inline parsers, built once at import rather than on
+# every call
+IMAGE_ALT_PATTERN = re.compile(r"!\[(.*?)\]")
+LINK_TEXT_PATTERN = re.compile(r"\[(.*?)\]")
+URL_PATTERN = re.compile(r"\((.*?)\)")
+IMAGE_SPLIT_PATTERN = re.compile(r"!\[(.*?\]\(.*?)\)")
+LINK_SPLIT_PATTERN = re.compile(r"\[(.*?\]\(.*?)\)")
+
+# A single regex alternation covering every inline element, tried only where
+# one can start, so that the text is scanned once from left to right. Each
+# alternative mirrors one pass of the reference pipeline: the delimiters use the
+# same lookarounds as split_nodes_delimiter (and may span lines), while images
+# and links use the same single-line patterns as split_nodes_image and
+# split_nodes_link
+INLINE_PATTERN = re.compile(
+    r"(?<!\*)\*\*(?!\*)(?P<bold>(?s:.*?))(?<!\*)\*\*(?!\*)"
+    r"|(?<!\*)\*(?!\*)(?P<italic>(?s:.*?))(?<!\*)\*(?!\*)"
+    r"|(?<!`)```(?!`)(?P<code_block>(?s:.*?))(?<!`)```(?!`)"
+    r"|(?<!`)`(?!`)(?P<code>(?s:.*?))(?<!`)`(?!`)"
+    r"|!\[(?P<alt>.*?)\]\((?P<src>.*?)\)"
+    r"|\[(?P<anchor>.*?)\]\((?P<href>.*?)\)"
+)
+
+# The characters an inline element can start with. Everywhere else the
+# alternation above can't match, so the scanner jumps from one to the next
+INLINE_MARKER_PATTERN = re.compile(r"[*`!\[]")
+
+# A delimiter that starts no inline element has no partner
+UNPAIRED_DELIMITER_PATTERN = re.compile(
+    r"(?<!\*)\*\*(?!\*)|(?<!\*)\*(?!\*)|(?<!`)```(?!`)|(?<!`)`(?!`)"
+)
+
+
+@functools.lru_cache(maxsize=None)
+def delimiter_pattern(delimiter: str):
+    # Construct a regex match using negative lookbehind and negative lookahead
+    # to avoid matching on adjacent delimiters
+    # This will exclude text containing empty delimiter pairs: i.e., ``````
+    # It will also prevent matching on italics "*" from also matching bold "**" delimeters
+    # Because the asterisk character is a wildcard for regex expressions, escape all characters of
+    # the delimiter string. Each delimiter is escaped and compiled once, then cached
+    escaped = re.escape(delimiter)
+    return re.compile(f"(?<![{escaped}]){escaped}(?![{escaped}])")
+
+
+# Converters from TextNodes to LeafNodes, keyed directly on the TextType value
+# that TextNode stores
+TEXT_NODE_CONVERTERS = {
+    TextType.TEXT.value: lambda node: LeafNode(None, node.text),
+    TextType.BOLD.value: lambda node: LeafNode("b", node.text),
+    TextType.ITALIC.value: lambda node: LeafNode("i", node.text),
+    TextType.CODE.value: lambda node: LeafNode("code", node.text),
+    TextType.LINK.value: lambda node: LeafNode("a", node.text, {"href": node.url}),
+    TextType.IMAGE.value: lambda node: LeafNode(
+        "img", "", {"src": node.url, "alt": node.text}
+    ),
+}
+
+
+# The inline elements whose URLs a page depends on, and whether each is an image
+REFERENCE_TYPES = {TextType.LINK.value: False, TextType.IMAGE.value: True}
+
+
+def image_props(url: str, alt: str, assets=None):
+    # The attributes of an image. With an AssetManifest, the source is its
+    # fingerprinted URL, and the width and height are added when it knows them
+    props = {"src": url, "alt": alt}
+    if assets is not None:
+        size = assets.size(url)
+        props["src"] = assets.url(url)
+        if size is not None:
+            props["width"], props["height"] = str(size[0]), str(size[1])
+    return props
+
+
+def page_template(template_path: str, loaded: dict = None, assets=None):
+    # The parsed template of a page, with its URLs rewritten when given an
+    # AssetManifest. See load_template for loaded
+    template = load_template(template_path, loaded)
+    if assets is not None:
+        return assets.template(template)
+    return template
+
+
+def text_node_to_html_node(text_node: "TextNode", assets=None):
+    # With an AssetManifest, links and images point at fingerprinted assets
+    if assets is not None and text_node.text_type in REFERENCE_TYPES:
+        if text_node.text_type == TextType.LINK.value:
+            return LeafNode("a", text_node.text, {"href": assets.url(text_node.url)})
+        return LeafNode("img", "", image_props(text_node.url, text_node.text, assets))
+    converter = TEXT_NODE_CONVERTERS.get(text_node.text_type)
+    if converter is None:
+        print(text_node.__repr__())
+        raise ValueError(f"Invalid TextType value: {text_node.text_type}")
+    return converter(text_node)
 
 
 def split_nodes_delimiter(old_nodes: list, delimiter: str, text_type: TextType):
@@ -37,15 +125,8 @@ def split_nodes_delimiter(old_nodes: list, delimiter: str, text_type: TextType):
             new_nodes.append(node)
             continue
 
-        # Construct a regex match using negative lookbehind and negative lookahead
-        # to avoid matching on adjacent delimiters
-        # This will exclude text containing empty delimiter pairs: i.e., ``````
-        # It will also prevent matching on italics "*" from also matching bold "**" delimeters
-        # Because the asterisk character is a wildcard for regex expressions, escape all characters of
-        # the delimiter string:
-        delimiter = re.escape(delimiter)
-        regex = f"(?<![{delimiter}]){delimiter}(?![{delimiter}])"
-        fields = re.split(regex, node_text)
+        # Split on the delimiter, ignoring runs of adjacent delimiter characters
+        fields = delimiter_pattern(delimiter).split(node_text)
 
         # Only split text with delimiter pairs, which will always produce an odd number of text fields
         if len(fields) % 2 == 0:
@@ -68,15 +149,15 @@ def split_nodes_delimiter(old_nodes: list, delimiter: str, text_type: TextType):
 
 
 def extract_markdown_images(text: str):
-    alt_texts = re.findall("\!\[(.*?)\]", text)
-    urls = re.findall("\((.*?)\)", text)
+    alt_texts = IMAGE_ALT_PATTERN.findall(text)
+    urls = URL_PATTERN.findall(text)
     extracted = [(i, j) for i, j in zip(alt_texts, urls)]
     return extracted
 
 
 def extract_markdown_links(text: str):
-    links = re.findall("\[(.*?)\]", text)
-    urls = re.findall("\((.*?)\)", text)
+    links = LINK_TEXT_PATTERN.findall(text)
+    urls = URL_PATTERN.findall(text)
     extracted = [(i, j) for i, j in zip(links, urls)]
     return extracted
 
@@ -94,7 +175,7 @@ def split_nodes_image(old_nodes: list):
         # Python will keeep the matched text when capture groups are used in the regex pattern
         # This means we don't actually need to extract any fields, we can just process the node text
         # with a rotating filter for how to handle each element
-        text_fields = re.split("\!\[(.*?\]\(.*?)\)", node.text)
+        text_fields = IMAGE_SPLIT_PATTERN.split(node.text)
 
         # The first element will always be the normal text, because the split regex will return
         # an empty string as the first element if the text begins with a matching field
@@ -126,7 +207,7 @@ def split_nodes_link(old_nodes: list):
         # Python will keeep the matched text when capture groups are used in the regex pattern
         # This means we don't actually need to extract any fields, we can just process the node text
         # with a rotating filter for how to handle each element
-        text_fields = re.split("\[(.*?\]\(.*?)\)", node.text)
+        text_fields = LINK_SPLIT_PATTERN.split(node.text)
 
         # The first element will always be the normal text, because the split regex will return
         # an empty string as the first element if the text begins with a matching field
@@ -145,7 +226,9 @@ def split_nodes_link(old_nodes: list):
     return new_nodes
 
 
-def text_to_textnodes(text: str):
+def text_to_textnodes_reference(text: str):
+    # The original multi-pass pipeline: every pass rebuilds the node list and
+    # rescans every text fragment. Kept as the reference for text_to_textnodes
     node = [TextNode(text, TextType.TEXT, url=None)]
     delims = {
         "**": TextType.BOLD,
@@ -162,11 +245,129 @@ def text_to_textnodes(text: str):
     return node
 
 
+# The TextType for each TextType value yielded by scan_inline
+TEXT_TYPES = {text_type.value: text_type for text_type in TextType}
+
+# The TextType value of each delimited group of INLINE_PATTERN
+INLINE_GROUP_TYPES = {
+    "bold": TextType.BOLD.value,
+    "italic": TextType.ITALIC.value,
+    "code_block": TextType.CODE.value,
+    "code": TextType.CODE.value,
+}
+
+
+def scan_inline(text: str):
+    # Yield (TextType value, text, url) for every inline element, in one left to
+    # right scan of the text. Like the reference pipeline, every inline element
+    # is surrounded by TEXT elements, which may be empty. Most text has no
+    # markup at all, and is a single TEXT element
+    if "*" not in text and "`" not in text and "[" not in text:
+        yield TextType.TEXT.value, text, None
+        return
+
+    position = 0
+    marker = INLINE_MARKER_PATTERN.search(text)
+    while marker is not None:
+        start = marker.start()
+        match = INLINE_PATTERN.match(text, start)
+        if match is None:
+            unpaired = UNPAIRED_DELIMITER_PATTERN.match(text, start)
+            if unpaired is not None:
+                raise NotImplementedError(
+                    f"Unpaired delimiter '{unpaired.group()}' found in input "
+                    f"text: {text}"
+                )
+            marker = INLINE_MARKER_PATTERN.search(text, start + 1)
+            continue
+        yield TextType.TEXT.value, text[position:start], None
+
+        kind = match.lastgroup
+        if kind == "src":
+            yield TextType.IMAGE.value, match.group("alt"), match.group("src")
+        elif kind == "href":
+            yield TextType.LINK.value, match.group("anchor"), match.group("href")
+        else:
+            yield INLINE_GROUP_TYPES[kind], match.group(kind), None
+        position = match.end()
+        marker = INLINE_MARKER_PATTERN.search(text, position)
+
+    yield TextType.TEXT.value, text[position:], None
+
+
+def text_to_textnodes(text: str):
+    # For input without nested inline elements, this produces the same TextNode
+    # sequence as text_to_textnodes_reference
+    return [
+        TextNode(text, TEXT_TYPES[text_type], url=url)
+        for text_type, text, url in scan_inline(text)
+    ]
+
+
+# The HTML of each inline element, keyed on its TextType value. These match
+# what text_node_to_html_node(...).to_html() produces
+INLINE_HTML = {
+    TextType.TEXT.value: lambda text, url: text,
+    TextType.BOLD.value: lambda text, url: "<b>" + text + "</b>",
+    TextType.ITALIC.value: lambda text, url: "<i>" + text + "</i>",
+    TextType.CODE.value: lambda text, url: "<code>" + text + "</code>",
+    TextType.LINK.value: lambda text, url: f'<a href="{url}">{text}</a>',
+    TextType.IMAGE.value: lambda text, url: f'<img src="{url}" alt="{text}"></img>',
+}
+
+
+def _asset_inline_html(text_type: str, text: str, url: str, assets):
+    # The HTML of a link or image pointing at a fingerprinted asset
+    if text_type == TextType.LINK.value:
+        return f'<a href="{assets.url(url)}">{text}</a>'
+    props = image_props(url, text, assets)
+    attributes = "".join(f' {key}="{value}"' for key, value in props.items())
+    return f"<img{attributes}></img>"
+
+
+def inline_to_html(text: str, out: list, references: list = None, assets=None):
+    # Append the HTML of the inline elements of text to out, without creating
+    # any nodes. When given a list, (url, is_image) is appended to it for every
+    # link and image on the way. With an AssetManifest, links and images point
+    # at fingerprinted assets
+    for text_type, text, url in scan_inline(text):
+        if text_type in REFERENCE_TYPES:
+            if references is not None:
+                references.append((url, REFERENCE_TYPES[text_type]))
+            if assets is not None:
+                out.append(_asset_inline_html(text_type, text, url, assets))
+                continue
+        out.append(INLINE_HTML[text_type](text, url))
+
+
 def markdown_to_blocks(markdown: str):
     blocks = markdown.split("\n\n")
     return blocks
 
 
+def iter_blocks(f, chunk_size: int = STREAM_CHUNK_SIZE):
+    # Yield the same blocks as markdown_to_blocks(f.read()), reading the file a
+    # chunk at a time. Only the pieces of the current block are kept, so a
+    # block is never copied more than once however many chunks it spans
+    parts = []
+    for chunk in iter(lambda: f.read(chunk_size), ""):
+        # A blank line split across two chunks
+        if parts and parts[-1].endswith("\n") and chunk.startswith("\n"):
+            parts[-1] = parts[-1][:-1]
+            yield "".join(parts)
+            parts = []
+            chunk = chunk[1:]
+        pieces = chunk.split("\n\n")
+        for piece in pieces[:-1]:
+            parts.append(piece)
+            yield "".join(parts)
+            parts = []
+        parts.append(pieces[-1])
+    yield "".join(parts)
+
+
+# block_to_blocktype and strip_block_markers are the reference for scan_block,
+# which the renderers use instead
 def block_to_blocktype(text: str):
     if text.startswith("#"):
         header = text.split(" ")[0]
@@ -229,25 +430,7 @@ def map_blocktype_to_tag(blocktype: BlockType):
             return "ol"
 
 
-def block_to_html_node(block: str):
-    blocktype = block_to_blocktype(block)
-    tag = map_blocktype_to_tag(blocktype)
-
-    # The block type determines how the text should be packaged
-    # The TextNodes represent inline text elements,
-    # which the block needs to arrange depending on the block type:
-    # A BlockType.PARAGRAPH block should wrap all of its TextNodes in a <p> tag
-    # A BlockType.H1 block should wrap all of its TextNodes in a <h1> tag
-    # A BlockType.H2 block should wrap all of its TextNodes in a <h2> tag
-    # A BlockType.H3 block should wrap all of its TextNodes in a <h3> tag
-    # A BlockType.H4 block should wrap all of its TextNodes in a <h4> tag
-    # A BlockType.H5 block should wrap all of its TextNodes in a <h5> tag
-    # A BlockType.H6 block should wrap all of its TextNodes in a <h6> tag
-    # A BlockType.CODE block should wrap all of its TextNodes in a <pre> tag
-    # A BlockType.QUOTE block should wrap all of its TextNodes in a <blockquote> tag
-    # A BlockType.UNORDERED_LIST block should wrap all of its TextNodes in an <ul> tag
-    # A BlockType.ORDERED_LIST block should wrap all of its TextNodes in an <ol> tag
-
+def strip_block_markers(block: str, tag: str):
     # Depending on the block type, we need to strip the MarkDown formatting characters
     # out of the text before converting the text to TextNodes
     if tag in ["h1", "h2", "h3", "h4", "h5", "h6"]:
@@ -272,83 +455,590 @@ def block_to_html_node(block: str):
     if tag == "ol":
         block = "\n".join([x.lstrip("1234567890. ") for x in block.split("\n")])
 
+    return block
+
+
+# Heading markers and the BlockType they give a block
+HEADING_TYPES = {"#" * level: BlockType[f"H{level}"] for level in range(1, 7)}
+
+
+def scan_block(block: str):
+    # Classify a block and strip its markdown markers in a single pass over its
+    # lines, with the same results as block_to_blocktype and strip_block_markers.
+    # Returns the BlockType (None for a broken heading such as "#foo") and the
+    # text to parse for inline elements: one line per item for lists, otherwise
+    # the whole stripped block as a single line
+    if block.startswith("#"):
+        blocktype = HEADING_TYPES.get(block.partition(" ")[0])
+        if blocktype is None:
+            return None, [block]
+        return blocktype, [block.lstrip("# ")]
+    if block.startswith("```") and block.endswith("```"):
+        return BlockType.CODE, [block]
+
+    # The start of the first line decides which of the line-based types the
+    # block can be. The block is a paragraph as soon as one line doesn't fit
+    if block.startswith(">"):
+        stripped = []
+        for line in block.split("\n"):
+            if not line.startswith(">"):
+                return BlockType.PARAGRAPH, [block]
+            stripped.append(line.lstrip("> "))
+        return BlockType.QUOTE, ["\n".join(stripped)]
+    if block.startswith("- ") or block.startswith("* "):
+        # Only the marker of the first item is stripped from every line
+        marker = block[:2]
+        stripped = []
+        for line in block.split("\n"):
+            if not (line.startswith("- ") or line.startswith("* ")):
+                return BlockType.PARAGRAPH, [block]
+            stripped.append(line.lstrip(marker))
+        return BlockType.UNORDERED_LIST, stripped
+    if block.startswith("1. "):
+        stripped = []
+        for i, line in enumerate(block.split("\n"), 1):
+            if not line.startswith(f"{i}. "):
+                return BlockType.PARAGRAPH, [block]
+            stripped.append(line.lstrip("1234567890. "))
+        return BlockType.ORDERED_LIST, stripped
+    return BlockType.PARAGRAPH, [block]
+
+
+def block_title(block: str):
+    # The page title an H1 block gives, or None for any other block
+    if block.startswith("#") and block.partition(" ")[0] == "#":
+        return block.strip("# ")
+    return None
+
+
+def block_to_html_node(block: str, stats=None, assets=None):
+    # When a BuildStats is given, the time spent in each stage is recorded
+    if stats is not None:
+        block_start = start = stats.start()
+    blocktype, lines = scan_block(block)
+    tag = map_blocktype_to_tag(blocktype)
+    if stats is not None:
+        start = stats.stop("block_classification", start)
+
+    # The block type determines how the text should be packaged
+    # The TextNodes represent inline text elements,
+    # which the block needs to arrange depending on the block type:
+    # A BlockType.PARAGRAPH block should wrap all of its TextNodes in a <p> tag
+    # A BlockType.H1 block should wrap all of its TextNodes in a <h1> tag
+    # A BlockType.H2 block should wrap all of its TextNodes in a <h2> tag
+    # A BlockType.H3 block should wrap all of its TextNodes in a <h3> tag
+    # A BlockType.H4 block should wrap all of its TextNodes in a <h4> tag
+    # A BlockType.H5 block should wrap all of its TextNodes in a <h5> tag
+    # A BlockType.H6 block should wrap all of its TextNodes in a <h6> tag
+    # A BlockType.CODE block should wrap all of its TextNodes in a <pre> tag
+    # A BlockType.QUOTE block should wrap all of its TextNodes in a <blockquote> tag
+    # A BlockType.UNORDERED_LIST block should wrap all of its TextNodes in an <ul> tag
+    # A BlockType.ORDERED_LIST block should wrap all of its TextNodes in an <ol> tag
+
+    # Parse the inline elements first: for lists, each line is parsed separately
+    lines = [text_to_textnodes(line) for line in lines]
+    if stats is not None:
+        start = stats.stop("inline_parse", start, count=len(lines))
+
     # Depending on the BlockType, we may need to wrap each line of the block in a tag
     # For lists, we need to wrap each line in a <li> tag
     htmlnode = ParentNode(tag, children=[], props=None)
 
     if tag in ["ul", "ol"]:
-        for line in block.split("\n"):
-            textnodes = text_to_textnodes(line)
+        for textnodes in lines:
             node_to_add = ParentNode("li", children=[], props=None)
             for textnode in textnodes:
-                node_to_add.children.append(text_node_to_html_node(textnode))
+                node_to_add.children.append(text_node_to_html_node(textnode, assets))
             htmlnode.children.append(node_to_add)
 
     # For non-list BlockTypes, we do not need to wrap each line of the block text
     else:
-        textnodes = text_to_textnodes(block)
-        for textnode in textnodes:
-            htmlnode.children.append(text_node_to_html_node(textnode))
+        for textnode in lines[0]:
+            htmlnode.children.append(text_node_to_html_node(textnode, assets))
 
-    return ParentNode(tag="div", children=[htmlnode], props=None)
+    wrapper = ParentNode(tag="div", children=[htmlnode], props=None)
+    if stats is not None:
+        end = stats.stop("tree_build", start)
+        stats.add_block(blocktype.value if blocktype else "invalid", end - block_start)
+    return wrapper
 
 
-def markdown_to_html_node(markdown: str):
+def markdown_to_html_node(markdown: str, stats=None, cache=None, assets=None):
+    # With a BlockCache, blocks already rendered on this or an earlier page are
+    # taken from the cache, and every block becomes a LeafNode holding its
+    # rendered HTML rather than a subtree. With an AssetManifest, links and
+    # images point at fingerprinted assets
     htmlnodes = []
+    if stats is not None:
+        start = stats.start()
     blocks = markdown_to_blocks(markdown)
+    if stats is not None:
+        stats.stop("block_split", start)
     for block in blocks:
-        htmlnodes.append(block_to_html_node(block))
+        if cache is None:
+            htmlnodes.append(block_to_html_node(block, stats, assets))
+            continue
+        key = _block_key(cache, block, assets)
+        cached = cache.get(key)
+        if cached is None:
+            # The same entry as render_blocks caches, which may share the cache.
+            # The block only becomes HTML, so it is rendered without a tree
+            rendered, references = [], []
+            block_to_html(block, rendered, stats, references, assets)
+            html = "".join(rendered)
+            cached = (html, tuple(references))
+            cache.put(key, cached, size=sys.getsizeof(html))
+        htmlnodes.append(LeafNode(None, cached[0]))
 
     return ParentNode("div", children=htmlnodes, props=None)
 
 
-def extract_title(markdown: str):
+def block_to_html(
+    block: str, out: list, stats=None, references: list = None, assets=None
+):
+    # Append the HTML of a block to out, without building an HTMLNode tree, and
+    # return its BlockType. The output is identical to
+    # block_to_html_node(block).to_html(). When a BuildStats is given, the
+    # inline_parse stage covers writing the HTML too, as there is no tree to
+    # serialize
+    if stats is not None:
+        block_start = start = stats.start()
+    blocktype, lines = scan_block(block)
+    tag = map_blocktype_to_tag(blocktype)
+    if tag is None:
+        raise ValueError("ParentNode must have a tag.")
+    if stats is not None:
+        start = stats.stop("block_classification", start)
+
+    out.append("<div>")
+    out.append(OPEN_TAGS[tag])
+    if tag in ["ul", "ol"]:
+        for line in lines:
+            out.append("<li>")
+            inline_to_html(line, out, references, assets)
+            out.append("</li>")
+    else:
+        inline_to_html(lines[0], out, references, assets)
+    out.append(CLOSE_TAGS[tag])
+    out.append("</div>")
+    if stats is not None:
+        end = stats.stop("inline_parse", start, count=len(lines))
+        stats.add_block(blocktype.value, end - block_start)
+    return blocktype
+
+
+def _block_key(cache, block: str, assets=None):
+    # Blocks rendered with an AssetManifest hold its URLs, so they are cached
+    # apart from those rendered with any other manifest or none
+    return cache.key(block, assets.digest if assets is not None else b"")
+
+
+def render_blocks(
+    blocks, out: list, cache=None, stats=None, references: list = None, assets=None
+):
+    # Append the HTML of each block to out, and return the page title found on
+    # the way: the text of the first H1 block, or None. With a BlockCache,
+    # blocks rendered before are taken from the cache, along with the
+    # (url, is_image) pairs of their links and images that are added to
+    # references, if given. With an AssetManifest, links and images point at
+    # fingerprinted assets
     title = None
+    for block in blocks:
+        if cache is None:
+            blocktype = block_to_html(block, out, stats, references, assets)
+            if title is None and blocktype == BlockType.H1:
+                title = block.strip("# ")
+            continue
+        key = _block_key(cache, block, assets)
+        cached = cache.get(key)
+        if cached is None:
+            rendered, found = [], []
+            block_to_html(block, rendered, stats, found, assets)
+            html = "".join(rendered)
+            cached = (html, tuple(found))
+            cache.put(key, cached, size=sys.getsizeof(html))
+        if title is None:
+            title = block_title(block)
+        out.append(cached[0])
+        if references is not None:
+            references.extend(cached[1])
+    return title
+
+
+def markdown_to_html(markdown: str, cache=None, assets=None):
+    # The same HTML as markdown_to_html_node(markdown).to_html(), written straight
+    # from the block and inline scanners for callers that never need the tree
+    out = ["<div>"]
+    render_blocks(markdown_to_blocks(markdown), out, cache, assets=assets)
+    out.append("</div>")
+    return "".join(out)
+
+
+def render_markdown(
+    markdown: str, cache=None, references: list = None, assets=None
+):
+    # Render a page body and pick up its title, and optionally its links and
+    # images, on the same pass over the blocks
+    out = ["<div>"]
     blocks = markdown_to_blocks(markdown)
+    title = render_blocks(blocks, out, cache, None, references, assets)
+    if title is None:
+        raise Exception("No title found in markdown.")
+    out.append("</div>")
+    return "".join(out), title
+
+
+def extract_title(markdown: str):
+    return extract_title_from_blocks(markdown_to_blocks(markdown))
+
+
+def extract_title_from_blocks(blocks):
+    title = None
     for block in blocks:
-        block_type = block_to_blocktype(block)
-        if block_type == BlockType.H1:
-            title = block.strip("# ")
+        title = block_title(block)
+        if title is not None:
             break
     if title == None:
         raise Exception("No title found in markdown.")
     return title
 
 
-def generate_page(from_path: str, template_path: str, dest_path: str):
+def fill_template(template, values: dict, minify=None):
+    # Fill a page template, minifying the output as the template streams it
+    # when given a MinifyResult, which also receives the savings
+    if minify is None:
+        return template.render(values)
+    buffer = io.StringIO()
+    minifier = HTMLMinifier(buffer, minify.drop_wrappers)
+    template.render_to(minifier, values)
+    minifier.finish()
+    minify.add(minifier)
+    return buffer.getvalue()
+
+
+def generate_page(
+    from_path: str,
+    template_path: str,
+    dest_path: str,
+    *,
+    stats=None,
+    cache=None,
+    minify=None,
+    references: list = None,
+    size: int = None,
+    templates: dict = None,
+    assets=None,
+):
+    # Returns True if the page was written, or False if the existing file
+    # already held exactly the rendered page and was left alone. When given a
+    # list, the (url, is_image) pairs of the page's links and images are
+    # appended to it as they are rendered. Builds pass the source size they
+    # listed in discover_work, and the templates they loaded (see
+    # load_template), so neither file is stat'ed again here. With an
+    # AssetManifest, the page links to fingerprinted assets
     logging.info(
         f"Generating page from {from_path} to {dest_path} using template {template_path}"
     )
+    if size is None:
+        size = os.path.getsize(from_path)
+    if size >= STREAM_THRESHOLD:
+        return generate_page_streaming(
+            from_path,
+            template_path,
+            dest_path,
+            stats=stats,
+            cache=cache,
+            minify=minify,
+            references=references,
+            templates=templates,
+            assets=assets,
+        )
+
+    if stats is not None:
+        return _generate_page_instrumented(
+            from_path,
+            template_path,
+            dest_path,
+            stats=stats,
+            cache=cache,
+            minify=minify,
+            references=references,
+            templates=templates,
+            assets=assets,
+        )
+
     with open(from_path, "r") as f:
         markdown = "".join(f.readlines())
-    with open(template_path, "r") as f:
-        template = "".join(f.readlines())
+    template = page_template(template_path, templates, assets)
+
+    html, title = render_markdown(markdown, cache, references, assets)
+    page = fill_template(template, {"Title": title, "Content": html}, minify)
+    return write_if_changed(dest_path, page)
+
+
+def generate_page_streaming(
+    from_path: str,
+    template_path: str,
+    dest_path: str,
+    *,
+    stats=None,
+    cache=None,
+    minify=None,
+    references: list = None,
+    templates: dict = None,
+    assets=None,
+):
+    # Render a page without ever holding the whole document: one pass over the
+    # file finds the title, which the template needs before the content, and a
+    # second renders each block and writes it out before reading the next. The
+    # title is usually in the first block, so the first pass reads very little.
+    # When a BuildStats is given, each block is timed as it is rendered;
+    # reading and writing are interleaved with rendering, so they are only
+    # part of the page's total time
+    if stats is not None:
+        page_start = start = stats.start()
+    with open(from_path, "r") as f:
+        title = extract_title_from_blocks(iter_blocks(f))
+    if stats is not None:
+        stats.stop("title_extraction", start)
+    template = page_template(template_path, templates, assets)
+
+    def write_content(sink):
+        sink.write("<div>")
+        with open(from_path, "r") as f:
+            for block in iter_blocks(f):
+                out = []
+                render_blocks((block,), out, cache, stats, references, assets)
+                sink.writelines(out)
+        sink.write("</div>")
+
+    # If a block fails to render, the previous page (if any) is left in place
+    output = AtomicOutput(dest_path)
+    with output as f:
+        sink = f if minify is None else HTMLMinifier(f, minify.drop_wrappers)
+        template.render_to(sink, {"Title": title, "Content": write_content})
+        if minify is not None:
+            sink.finish()
+            minify.add(sink)
+    if stats is not None:
+        if minify is not None:
+            stats.add_stage("minify", sink.seconds)
+        stats.add_page(from_path, stats.start() - page_start)
+    return output.written
+
+
+def _generate_page_instrumented(
+    from_path: str,
+    template_path: str,
+    dest_path: str,
+    *,
+    stats,
+    cache=None,
+    minify=None,
+    references: list = None,
+    templates: dict = None,
+    assets=None,
+):
+    # The same steps as generate_page, timed one after the other. The blocks
+    # are rendered on the same tree-free path, which times each one
+    page_start = start = stats.start()
+    with open(from_path, "r") as f:
+        markdown = "".join(f.readlines())
+    start = stats.stop("read", start)
+
+    blocks = markdown_to_blocks(markdown)
+    stats.stop("block_split", start)
+    out = ["<div>"]
+    title = render_blocks(blocks, out, cache, stats, references, assets)
+    if title is None:
+        raise Exception("No title found in markdown.")
+    out.append("</div>")
+    html = "".join(out)
+
+    start = stats.start()
+    template = page_template(template_path, templates, assets)
+    if minify is None:
+        page = template.render({"Title": title, "Content": html})
+        start = stats.stop("template_fill", start)
+    else:
+        # Minifying happens while the template is filled, and is timed by the
+        # minifier itself
+        before = minify.seconds
+        page = fill_template(template, {"Title": title, "Content": html}, minify)
+        end = stats.start()
+        seconds = minify.seconds - before
+        stats.add_stage("template_fill", end - start - seconds)
+        stats.add_stage("minify", seconds)
+        start = end
+
+    written = write_if_changed(dest_path, page)
+    end = stats.stop("write", start)
+    stats.add_page(from_path, end - page_start)
+    return written
 
-    html = markdown_to_html_node(markdown).to_html()
-    title = extract_title(markdown)
-    template = template.replace("{{ Title }}", title)
-    template = template.replace("{{ Content }}", html)
 
-    if not os.path.exists(os.path.dirname(dest_path)):
-        os.makedirs(os.path.dirname(dest_path))
+def discover_work(dir_path_content: str, dest_dir_path: str, template_path: str):
+    # Walk the content tree once with os.scandir and list every page as a
+    # (source, template, dest, size) tuple. The file types come from the
+    # directory listing itself, and each page gets the nearest per-directory
+    # template (see find_template) from the same listings, so no extra stat
+    # calls are needed. The source size is stat'ed once here, through the
+    # DirEntry, for everything later in the build that needs it. Per-directory
+    # templates are not pages themselves
+    work = []
 
-    with open(dest_path, "w") as f:
-        f.write(template)
+    def walk(directory: str, dest_directory: str, template: str):
+        with os.scandir(directory) as it:
+            entries = list(it)
+        for entry in entries:
+            if entry.name == TEMPLATE_NAME and entry.is_file():
+                template = entry.path
+        for entry in entries:
+            if entry.name == TEMPLATE_NAME:
+                continue
+            if entry.is_file():
+                dest = os.path.splitext(entry.name)[0] + ".html"
+                work.append(
+                    (
+                        entry.path,
+                        template,
+                        os.path.join(dest_directory, dest),
+                        entry.stat().st_size,
+                    )
+                )
+            elif entry.is_dir():
+                walk(entry.path, os.path.join(dest_directory, entry.name), template)
+
+    walk(dir_path_content, dest_dir_path, template_path)
+    return work
+
+
+def page_destination(source: str, dir_path_content: str, dest_dir_path: str):
+    # The output path discover_work gives a source file
+    relative = os.path.relpath(source, dir_path_content)
+    return os.path.join(dest_dir_path, os.path.splitext(relative)[0] + ".html")
 
 
 def generate_pages_recursive(
-    dir_path_content: str, template_path: str, dest_dir_path: str
+    dir_path_content: str,
+    template_path: str,
+    dest_dir_path: str,
+    manifest=None,
+    jobs: int = 1,
+    stats=None,
+    cache=None,
+    pipeline: bool = False,
+    static_path: str = None,
+    assets=None,
+    minify=None,
+    shard: tuple = None,
 ):
-    for item in os.listdir(dir_path_content):
-        if os.path.isfile(os.path.join(dir_path_content, item)):
-            generate_page(
-                os.path.join(dir_path_content, item),
-                template_path,
-                os.path.join(dest_dir_path, os.path.splitext(item)[0] + ".html"),
-            )
-        elif os.path.isdir(os.path.join(dir_path_content, item)):
-            generate_pages_recursive(
-                os.path.join(dir_path_content, item),
-                template_path,
-                os.path.join(dest_dir_path, item),
+    # Each page uses the nearest per-directory template, falling back to
+    # template_path. When a BuildManifest is given, pages whose inputs are
+    # unchanged since the previous build are skipped, and the assets under
+    # static_path and the pages each page refers to are recorded as its
+    # dependencies. With pipeline, reads, renders and writes overlap on an
+    # asyncio pipeline (see pipeline.py). With an AssetManifest, pages link to
+    # fingerprinted assets, and with a MinifyResult
+    # they are minified, which adds up the savings in it. With shard, a
+    # (1-based index, count) pair, only that shard's pages are rendered (see
+    # shard.py). Returns a WriteResult of the pages rendered
+    work = discover_work(dir_path_content, dest_dir_path, template_path)
+    if shard is not None:
+        from shard import select_shard
+
+        work = select_shard(work, dir_path_content, *shard)
+
+    pending = []
+    reasons = {}
+    for source, template, dest, size in work:
+        entry = None
+        if manifest is not None:
+            entry = manifest.entry_for(source, template, dest)
+            reasons[source] = manifest.changes(entry)
+            if not reasons[source]:
+                logging.info(f"Skipping unchanged page {source}")
+                continue
+        pending.append((source, template, dest, size, entry))
+
+    # Create each output directory once, rather than checking it for every page
+    for directory in sorted({os.path.dirname(dest) for _, _, dest, _, _ in pending}):
+        os.makedirs(directory, exist_ok=True)
+
+    # Load each distinct template once for the whole build. Worker processes
+    # are forked with the loaded templates, so they never check them either
+    templates = {}
+    for template in sorted({template for _, template, _, _, _ in pending}):
+        load_template(template, templates)
+    pages = [
+        (source, template, dest, size) for source, template, dest, size, _ in pending
+    ]
+
+    # With more than one job, the pages are rendered on a pool of worker processes.
+    # With a manifest, the renderers collect each page's links and images, from
+    # which its dependencies are recorded without reading it again
+    result = WriteResult()
+    references = {} if manifest is not None else None
+    if pipeline:
+        from pipeline import generate_pages_pipelined
+
+        failures = generate_pages_pipelined(
+            pages,
+            jobs,
+            stats=stats,
+            cache=cache,
+            result=result,
+            assets=assets,
+            minify=minify,
+            references=references,
+            templates=templates,
+        )
+    elif jobs > 1:
+        from parallel import generate_pages_parallel
+
+        failures = generate_pages_parallel(
+            pages,
+            jobs,
+            stats=stats,
+            cache=cache,
+            result=result,
+            assets=assets,
+            minify=minify,
+            references=references,
+            templates=templates,
+        )
+    else:
+        failures = {}
+        for source, template, dest, size in pages:
+            found = [] if references is not None else None
+            written = generate_page(
+                source,
+                template,
+                dest,
+                stats=stats,
+                cache=cache,
+                minify=minify,
+                references=found,
+                size=size,
+                templates=templates,
+                assets=assets,
             )
+            result.add(dest, written)
+            if references is not None:
+                references[source] = found
+
+    # Only record pages that rendered, so that failed pages are retried next build
+    if manifest is not None:
+        for source, _, _, _, entry in pending:
+            if source not in failures:
+                dependencies = reference_dependencies(
+                    references[source], source, dir_path_content, static_path
+                )
+                manifest.set_dependencies(entry, dependencies)
+                manifest.record(entry, reasons[source])
+
+    if failures:
+        raise Exception(
+            f"Failed to generate {len(failures)} page(s): {', '.join(sorted(failures))}"
+        )
+    return result
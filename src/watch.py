@@ -0,0 +1,304 @@
+import os, time, logging, threading, functools
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from utils import generate_page, page_destination
+from template import find_template, TEMPLATE_NAME
+from sync import sync_tree
+from depgraph import reference_dependencies
+
+
+def snapshot(root: str):
+    """
+    Records the modification time and size of every file below a directory,
+    or of a single file.
+
+    Returns
+    -------
+    dict
+        (mtime_ns, size) keyed by file path. Missing roots give an empty dict.
+    """
+    files = {}
+    if os.path.isfile(root):
+        stat = os.stat(root)
+        files[root] = (stat.st_mtime_ns, stat.st_size)
+        return files
+
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir():
+                    stack.append(entry.path)
+                elif entry.is_file():
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+def changed_paths(old: dict, new: dict):
+    # Paths that were added, removed or modified between two snapshots
+    changed = {path for path in new if old.get(path) != new[path]}
+    changed.update(path for path in old if path not in new)
+    return changed
+
+
+class SiteWatcher:
+    def __init__(
+        self,
+        content: str,
+        static: str,
+        template: str,
+        dest: str,
+        manifest=None,
+        minify=None,
+        gzip: bool = False,
+        assets=None,
+    ):
+        """
+        Initializes a SiteWatcher, which polls the site's inputs and rebuilds
+        only the pages and assets affected by each change.
+
+        Parameters
+        ----------
+        content : str
+            The content directory.
+        static : str
+            The static asset directory.
+        template : str
+            The default template.
+        dest : str
+            The output directory. It should hold an up-to-date build already.
+        manifest : BuildManifest, optional
+            The manifest of that build, kept up to date as pages are rebuilt.
+            The default is None.
+        minify : MinifyResult, optional
+            Minifies rebuilt pages, as that build did. The default is None.
+        gzip : bool, optional
+            Keep the .gz siblings of the outputs up to date, as a build with
+            --gzip does. Without it, any siblings the manifest records are
+            removed. The default is False.
+        assets : AssetManifest, optional
+            Rewrites the asset URLs of rebuilt pages to their fingerprinted
+            names, as that build did. Static assets are fingerprinted again
+            whenever they change. The default is None.
+        """
+        self.content = content
+        self.static = static
+        self.template = template
+        self.dest = dest
+        self.manifest = manifest
+        self.minify = minify
+        self.gzip = gzip
+        self.assets = assets
+        self._snapshots = {
+            root: snapshot(root) for root in [content, static, template]
+        }
+
+    def _rebuild_page(self, source: str):
+        template = find_template(os.path.dirname(source), self.content, self.template)
+        dest = page_destination(source, self.content, self.dest)
+        try:
+            entry = None
+            if self.manifest is not None:
+                entry = self.manifest.entry_for(source, template, dest)
+                reasons = self.manifest.changes(entry) or ["file changed"]
+            references = []
+            generate_page(
+                source,
+                template,
+                dest,
+                minify=self.minify,
+                references=references,
+                assets=self.assets,
+            )
+            if entry is not None:
+                dependencies = reference_dependencies(
+                    references, source, self.content, self.static
+                )
+                self.manifest.set_dependencies(entry, dependencies)
+        except Exception as e:
+            # Keep watching: the next save of the file will retry it
+            logging.error(f"Failed to rebuild {source}: {e}")
+            return False
+        if entry is not None:
+            self.manifest.record(entry, reasons)
+        return True
+
+    def _remove_page(self, source: str):
+        dest = page_destination(source, self.content, self.dest)
+        if self.manifest is not None:
+            dest = self.manifest.forget(source) or dest
+        if os.path.exists(dest):
+            logging.info(f"Removing '{dest}', its source '{source}' is gone")
+            os.remove(dest)
+
+    def _affected_pages(self, changed: set):
+        # Map changed content and template files to the pages to rebuild and
+        # the pages to remove
+        pages = self._snapshots[self.content]
+        rebuild, remove = set(), set()
+        if self.template in changed:
+            # The default template changed: only pages with a closer
+            # per-directory template are unaffected, so simply rebuild them all
+            rebuild.update(path for path in pages if not _is_template(path))
+        for path in changed:
+            if not path.startswith(os.path.join(self.content, "")):
+                continue
+            if _is_template(path):
+                prefix = os.path.join(os.path.dirname(path), "")
+                rebuild.update(
+                    page
+                    for page in pages
+                    if page.startswith(prefix) and not _is_template(page)
+                )
+            elif path in pages:
+                rebuild.add(path)
+            else:
+                remove.add(path)
+        # Pages whose images refer to a changed asset, or whose links refer to
+        # an added or removed page
+        if self.manifest is not None:
+            rebuild.update(self.manifest.outdated_dependents(changed))
+        return rebuild - remove, remove
+
+    def _fingerprint_static(self):
+        # Fingerprint the changed assets again and return the pages whose
+        # template refers to one whose name changed. Pages that refer to them
+        # are found through their dependency edges. assets.py imports this
+        # module, so it is imported here
+        from assets import fingerprint_assets
+
+        if self.manifest is not None:
+            previous = self.manifest.fingerprints
+        else:
+            previous = self.assets.files
+        self.assets = fingerprint_assets(self.static, self.dest, previous=previous)
+        if self.manifest is not None:
+            self.manifest.fingerprints = self.assets.files
+        rebuild, changed = set(), {}
+        for page in self._snapshots[self.content]:
+            if _is_template(page):
+                continue
+            template = find_template(os.path.dirname(page), self.content, self.template)
+            if template not in changed:
+                changed[template] = self.assets.references_changed(template)
+            if changed[template]:
+                rebuild.add(page)
+        return rebuild
+
+    def _update_siblings(self):
+        # Recompress rewritten outputs and drop the siblings of removed ones,
+        # or drop every sibling when not precompressing. compress.py imports
+        # this module, so it is imported here
+        from compress import compress_tree, remove_siblings
+
+        previous = self.manifest.compressed if self.manifest is not None else {}
+        if self.gzip:
+            files = compress_tree(self.dest, previous=previous).files
+        else:
+            remove_siblings(self.dest, previous)
+            files = {}
+        if self.manifest is not None:
+            self.manifest.compressed = files
+
+    def poll(self):
+        """
+        Takes new snapshots and rebuilds whatever changed since the last poll.
+
+        Returns
+        -------
+        dict
+            The number of rebuilt pages, removed pages and synced assets.
+        """
+        changed = set()
+        for root in self._snapshots:
+            new = snapshot(root)
+            changed |= changed_paths(self._snapshots[root], new)
+            self._snapshots[root] = new
+
+        summary = {"rebuilt": 0, "removed": 0, "assets": 0}
+        if not changed:
+            return summary
+        if self.manifest is not None:
+            self.manifest.reset_hashes()
+
+        start = time.perf_counter()
+        fingerprinted = set()
+        static_prefix = os.path.join(self.static, "")
+        if any(path.startswith(static_prefix) for path in changed):
+            previous = self.manifest.assets if self.manifest is not None else None
+            synced = sync_tree(self.static, self.dest, previous=previous)
+            if self.manifest is not None:
+                self.manifest.assets = synced.files
+            summary["assets"] = len(synced.copied) + len(synced.pruned)
+            if self.assets is not None:
+                fingerprinted = self._fingerprint_static()
+
+        rebuild, remove = self._affected_pages(changed)
+        if fingerprinted:
+            rebuild |= fingerprinted - remove
+        for source in sorted(remove):
+            self._remove_page(source)
+            summary["removed"] += 1
+        for source in sorted(rebuild):
+            if self._rebuild_page(source):
+                summary["rebuilt"] += 1
+        if self.gzip or (self.manifest is not None and self.manifest.compressed):
+            self._update_siblings()
+
+        if self.manifest is not None:
+            self.manifest.save()
+        logging.info(
+            f"Rebuilt {summary} in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        return summary
+
+
+def _is_template(path: str):
+    return os.path.basename(path) == TEMPLATE_NAME
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    # Send request logs to the build log instead of stderr
+    def log_message(self, format, *args):
+        logging.info(format % args)
+
+
+def serve(directory: str, port: int):
+    """
+    Serves a directory over HTTP from a background thread.
+
+    Returns
+    -------
+    ThreadingHTTPServer
+        The running server. Call `shutdown()` to stop it.
+    """
+    handler = functools.partial(QuietHandler, directory=directory)
+    server = ThreadingHTTPServer(("", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Serving '{directory}' on port {server.server_address[1]}")
+    return server
+
+
+def watch(watcher: SiteWatcher, port: int = 8888, interval: float = 0.05):
+    """
+    Serves the output directory and polls for changes until interrupted.
+    """
+    server = serve(watcher.dest, port)
+    print(f"Serving {watcher.dest} at http://localhost:{server.server_address[1]}/")
+    try:
+        while True:
+            summary = watcher.poll()
+            if any(summary.values()):
+                print(f"Rebuilt: {summary}")
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()